@@ -0,0 +1,223 @@
+"""
+Контроль допуска: ограничение числа одновременных запросов по классам маршрутов.
+
+Классы (ADMISSION_CONTROL['CLASSES']) определяются префиксом пути, у каждого
+свой лимит одновременных запросов в worker (MAX_IN_FLIGHT) и своя цель по
+ожиданию (MAX_WAIT). Запрос, который не получил слот за MAX_WAIT секунд,
+сразу получает 503 с Retry-After, а не висит в очереди до таймаута gunicorn.
+У заказов большой лимит и долгое ожидание, у каталога и профиля — короткие:
+наплыв на карту упирается в слоты каталога и отбрасывается, а оформление
+заказа получает свои слоты и свободные потоки worker (лимиты остальных
+классов должны быть меньше GUNICORN_THREADS).
+
+Лимиты имеют смысл только там, где worker обслуживает несколько запросов
+сразу: gthread (GUNICORN_THREADS > 1) или ASGI. Синхронный worker с одним
+потоком никогда не держит больше одного запроса, и лимиты не срабатывают —
+capacity_warnings() перечисляет такие классы, gunicorn пишет их в лог при старте.
+
+Очередь перед worker (backlog сокета, балансировщик) изнутри не видна. Если
+прокси ставит заголовок X-Request-Start (t=<время в секундах, мс или мкс>),
+запрос, уже прождавший дольше MAX_WAIT своего класса, отбрасывается сразу.
+
+Пакет /batch/ допускается один раз, как запрос своего класса (по умолчанию
+каталога): подзапросы помечены request.admitted и слотов не занимают, иначе
+пакет из MAX_REQUESTS подзапросов сам себе отказывал бы в допуске. Пути вне
+классов (/admin/, /metrics, /ready) не ограничиваются. Отброшенные запросы
+считает admission_shed_total, ожидание слота — admission_wait_seconds.
+"""
+import asyncio
+import threading
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from monitoring.metrics import registry
+
+DEFAULTS = {
+    'ENABLED': True,
+    'CLASSES': {},
+    'REQUEST_START_HEADER': 'HTTP_X_REQUEST_START',
+    'POLL_INTERVAL': 0.005,
+}
+# Workers gunicorn, в которых каждый запрос занимает поток
+THREADED_WORKERS = ('sync', 'gthread', 'gunicorn.workers.sync.SyncWorker', 'gunicorn.workers.gthread.ThreadWorker')
+WAIT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+
+def get_setting(name):
+    return getattr(settings, 'ADMISSION_CONTROL', {}).get(name, DEFAULTS[name])
+
+
+class Limiter:
+    """
+    Счетчик занятых слотов класса в процессе
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.in_flight = 0
+        self._condition = threading.Condition()
+
+    def try_acquire(self):
+        with self._condition:
+            if self.in_flight >= self.limit:
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self, timeout):
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            while self.in_flight >= self.limit:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+            self.in_flight += 1
+            return True
+
+    async def aacquire(self, timeout):
+        # Ожидание в event loop без потока: опрос каждые POLL_INTERVAL
+        deadline = time.monotonic() + timeout
+        while not self.try_acquire():
+            if time.monotonic() >= deadline:
+                return False
+            await asyncio.sleep(get_setting('POLL_INTERVAL'))
+        return True
+
+    def release(self):
+        with self._condition:
+            self.in_flight -= 1
+            self._condition.notify()
+
+
+_limiters = {}
+_lock = threading.Lock()
+
+
+def get_limiter(name, limit):
+    # Один набор слотов на процесс, в том числе для цепочки middleware /batch/
+    with _lock:
+        limiter = _limiters.get((name, limit))
+        if limiter is None:
+            limiter = _limiters[(name, limit)] = Limiter(limit)
+        return limiter
+
+
+def route_class(path):
+    """
+    (имя класса, его настройки) для пути или (None, None)
+    """
+    for name, options in get_setting('CLASSES').items():
+        if path.startswith(tuple(options['PREFIXES'])):
+            return name, options
+    return None, None
+
+
+def capacity_warnings(worker_class, threads):
+    """
+    Предупреждения о классах, лимит которых не ограничивает worker gunicorn
+    """
+    # Async workers (uvicorn, gevent) держат запросы без потоков — там лимиты работают
+    if not get_setting('ENABLED') or worker_class not in THREADED_WORKERS:
+        return []
+    if threads <= 1:
+        return [
+            f'Admission control has no effect with {threads} thread per worker: '
+            f'use GUNICORN_THREADS > 1 (gthread) or an ASGI worker class'
+        ]
+    return [
+        f'Admission class {name!r}: MAX_IN_FLIGHT {options["MAX_IN_FLIGHT"]} >= {threads} threads per worker, '
+        f'the limit is never reached'
+        for name, options in get_setting('CLASSES').items()
+        if options['MAX_IN_FLIGHT'] >= threads
+    ]
+
+
+def upstream_wait(request):
+    """
+    Сколько секунд запрос ждал до worker по заголовку X-Request-Start или None
+    """
+    value = request.META.get(get_setting('REQUEST_START_HEADER'))
+    if not value:
+        return None
+    try:
+        started = float(value.removeprefix('t='))
+    except ValueError:
+        return None
+    # Прокси пишут время в секундах, миллисекундах или микросекундах
+    if started > 1e14:
+        started /= 1e6
+    elif started > 1e11:
+        started /= 1e3
+    return max(0.0, time.time() - started)
+
+
+def shed(name, options, reason):
+    registry.inc('admission_shed_total', {'class': name, 'reason': reason})
+    response = JsonResponse({'detail': 'Service is overloaded. Please retry later.'}, status=503)
+    response['Retry-After'] = str(options.get('RETRY_AFTER', 1))
+    return response
+
+
+class AdmissionMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not get_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        name, options = route_class(request.path_info)
+        if name is None or getattr(request, 'admitted', False):
+            return self.get_response(request)
+        limiter = self.admit(request, name, options)
+        if limiter is None:
+            return shed(name, options, 'upstream')
+
+        started = time.monotonic()
+        if not limiter.acquire(options['MAX_WAIT']):
+            return shed(name, options, 'queue')
+        self.record_wait(name, started)
+        try:
+            return self.get_response(request)
+        finally:
+            limiter.release()
+
+    async def __acall__(self, request):
+        name, options = route_class(request.path_info)
+        if name is None or getattr(request, 'admitted', False):
+            return await self.get_response(request)
+        limiter = self.admit(request, name, options)
+        if limiter is None:
+            return shed(name, options, 'upstream')
+
+        started = time.monotonic()
+        if not await limiter.aacquire(options['MAX_WAIT']):
+            return shed(name, options, 'queue')
+        self.record_wait(name, started)
+        try:
+            return await self.get_response(request)
+        finally:
+            limiter.release()
+
+    def admit(self, request, name, options):
+        """
+        Слоты класса или None, если запрос уже опоздал в очереди перед worker
+        """
+        waited = upstream_wait(request)
+        if waited is not None and waited > options['MAX_WAIT']:
+            return None
+        return get_limiter(name, options['MAX_IN_FLIGHT'])
+
+    def record_wait(self, name, started):
+        registry.observe('admission_wait_seconds', {'class': name}, time.monotonic() - started, WAIT_BUCKETS)
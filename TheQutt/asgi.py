@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TheQutt.settings')
 
 application = get_asgi_application()
+
+# Прогрев и шина инвалидации вне gunicorn; импорт после настройки Django
+from TheQutt.warmup import start_process  # noqa: E402
+
+start_process()
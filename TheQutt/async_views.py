@@ -0,0 +1,111 @@
+"""
+Асинхронное чтение для ASGI.
+
+AsyncReadView отвечает на GET/HEAD в JSON через async ORM, не занимая поток
+на время ожидания базы и медленного клиента. Все остальное передается
+синхронному DRF-view (sync_view_class) в пуле потоков: изменяющие методы,
+OPTIONS, браузерный API (Accept: text/html или ?format=) и запросы без
+валидного JWT там, где нужна аутентификация или передан заголовок
+Authorization, — поэтому ошибки и проверки
+прав остаются ровно такими же, как у DRF.
+
+Под WSGI эти view тоже работают (Django выполняет их через async_to_sync),
+но выигрыш есть только под ASGI-сервером (uvicorn TheQutt.asgi:application).
+"""
+from asgiref.sync import sync_to_async
+from django.http import Http404, HttpResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+
+class AsyncReadView(View):
+    """
+    Подкласс задает sync_view_class (и sync_view_args для ViewSet), serializer_class
+    и реализует aget_data(request, **kwargs), возвращающий объект или список объектов.
+    """
+    sync_view_class = None
+    sync_view_args = ()
+    serializer_class = None
+    many = False
+    authentication_required = False
+    sync_view = None
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        sync_view = cls.sync_view_class.as_view(*cls.sync_view_args)
+        view = super().as_view(sync_view=sync_view, **initkwargs)
+        # Троттлинг и прочие атрибуты view берутся у синхронного DRF-view
+        view.cls = getattr(sync_view, 'cls', None)
+        view.csrf_exempt = True
+        return view
+
+    async def get(self, request, *args, **kwargs):
+        if self.wants_browsable_api(request):
+            return await self.delegate(request, *args, **kwargs)
+        # С заголовком Authorization токен проверяется и на открытых view: невалидный получает 401 от DRF
+        if self.authentication_required or 'Authorization' in request.headers:
+            user = await self.authenticate(request)
+            if user is None:
+                return await self.delegate(request, *args, **kwargs)
+            request.user = user
+
+        response = self.cached_response(**kwargs)
+        if response is not None:
+            return response
+
+        try:
+            return await self.aget_response(request, **kwargs)
+        except Http404 as e:
+            return self.render({'detail': str(e)}, status=404)
+
+    async def aget_response(self, request, **kwargs):
+        instance = await self.aget_data(request, **kwargs)
+        # Сериализация в event loop: связи должны быть загружены заранее, иначе будет SynchronousOnlyOperation
+        return self.render(self.serializer_class(instance, many=self.many, context={'request': request}).data)
+
+    async def delegate(self, request, *args, **kwargs):
+        return await sync_to_async(self.sync_view)(request, *args, **kwargs)
+
+    post = put = patch = delete = options = delegate
+
+    async def aget_data(self, request, **kwargs):
+        raise NotImplementedError
+
+    def cached_response(self, **kwargs):
+        """
+        Готовый ответ без обращения к базе (например, из снимка каталога) или None
+        """
+        return None
+
+    async def authenticate(self, request):
+        """
+        Пользователь из JWT или None, если токена нет или он невалиден
+        """
+        # Подзапрос /batch/ приходит с уже проверенным пользователем
+        if getattr(request, '_force_auth_user', None) is not None:
+            return request._force_auth_user
+        try:
+            result = await sync_to_async(JWTAuthentication().authenticate)(request)
+        except (AuthenticationFailed, InvalidToken, TokenError):
+            return None
+        return result[0] if result else None
+
+    @staticmethod
+    def wants_browsable_api(request):
+        return api_settings.URL_FORMAT_OVERRIDE in request.GET or 'text/html' in request.headers.get('Accept', '')
+
+    @staticmethod
+    def render(data, status=200):
+        return HttpResponse(JSONRenderer().render(data), status=status, content_type='application/json')
+
+
+async def aget_object_or_404(queryset, **kwargs):
+    try:
+        return await queryset.aget(**kwargs)
+    except queryset.model.DoesNotExist:
+        raise Http404(f'No {queryset.model._meta.object_name} matches the given query.')
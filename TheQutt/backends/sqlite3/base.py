@@ -0,0 +1,109 @@
+"""
+SQLite для конкурентной нагрузки (профиль SQLITE_PROFILE=hardened, см. TheQutt/database.py).
+
+PRAGMA (WAL, synchronous=NORMAL, busy_timeout, mmap, cache) задаются через
+OPTIONS['init_command'] на каждом новом соединении, транзакции открываются
+BEGIN IMMEDIATE (OPTIONS['transaction_mode']). Этот backend добавляет очередь
+писателей: потоки процесса пишут в файл базы по одному, вместо того чтобы
+одновременно ждать блокировку внутри SQLite. Между процессами запись
+по-прежнему разводят BEGIN IMMEDIATE и busy_timeout. В WAL читатели вне
+транзакций не ждут ни очередь, ни писателей.
+"""
+import threading
+
+from django.db import OperationalError
+from django.db.backends.sqlite3 import base
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE')
+
+_queues = {}
+_queues_lock = threading.Lock()
+
+
+def writer_queue(name):
+    """
+    Очередь писателей файла базы, общая для всех соединений процесса
+    """
+    with _queues_lock:
+        return _queues.setdefault(str(name), threading.RLock())
+
+
+class QueuedCursorWrapper(base.SQLiteCursorWrapper):
+    """
+    Одиночные записи вне транзакции тоже проходят через очередь
+    """
+
+    def execute(self, query, params=None):
+        if self.wrapper.holds_writer_queue or not query.lstrip()[:7].upper().startswith(WRITE_STATEMENTS):
+            return super().execute(query, params)
+        with self.wrapper.writer_turn():
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        if self.wrapper.holds_writer_queue:
+            return super().executemany(query, param_list)
+        with self.wrapper.writer_turn():
+            return super().executemany(query, param_list)
+
+
+class WriterTurn:
+    def __init__(self, wrapper):
+        self.wrapper = wrapper
+
+    def __enter__(self):
+        self.wrapper.acquire_writer_queue()
+
+    def __exit__(self, *exc_info):
+        self.wrapper.release_writer_queue()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer_queue = writer_queue(self.settings_dict['NAME'])
+        self.holds_writer_queue = False
+
+    def writer_turn(self):
+        return WriterTurn(self)
+
+    def acquire_writer_queue(self):
+        # Ждем не дольше, чем ждал бы сам SQLite (OPTIONS['timeout'], по умолчанию 5 с)
+        if not self.writer_queue.acquire(timeout=self.settings_dict['OPTIONS'].get('timeout', 5)):
+            raise OperationalError('database is locked: writer queue timeout')
+        self.holds_writer_queue = True
+
+    def release_writer_queue(self):
+        if self.holds_writer_queue:
+            self.holds_writer_queue = False
+            self.writer_queue.release()
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=QueuedCursorWrapper)
+        cursor.wrapper = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        self.acquire_writer_queue()
+        try:
+            super()._start_transaction_under_autocommit()
+        except Exception:
+            self.release_writer_queue()
+            raise
+
+    def _commit(self):
+        try:
+            return super()._commit()
+        finally:
+            self.release_writer_queue()
+
+    def _rollback(self):
+        try:
+            return super()._rollback()
+        finally:
+            self.release_writer_queue()
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self.release_writer_queue()
@@ -0,0 +1,137 @@
+"""
+Пакетный запрос: несколько GET к API за один HTTP-запрос.
+
+    POST /batch/
+    {"requests": [{"path": "/users/profile/"}, {"path": "/map/locations/?page=2"}]}
+
+    {"responses": [{"path": "/users/profile/", "status": 200, "body": {...}}, ...]}
+
+JWT проверяется один раз, подзапросы получают готового пользователя
+(принудительная аутентификация DRF) и проходят через обычный стек
+middleware — троттлинг, метрики, реплика работают как для отдельных
+запросов. Асинхронные view (AsyncReadView) выполняются параллельно,
+синхронные — по очереди в потоке, как и под ASGI. Подзапросы допускаются
+только к путям API (LEAN_API['API_PREFIXES']), кроме самого /batch/.
+"""
+import asyncio
+import json
+from io import BytesIO
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.base import BaseHandler
+from django.core.handlers.wsgi import WSGIRequest
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from . import routing
+
+DEFAULTS = {
+    'MAX_REQUESTS': 10,
+    'CONCURRENT': True,
+}
+# Заголовки внешнего запроса, которые не переходят в подзапросы
+DROPPED_META = ('CONTENT_LENGTH', 'CONTENT_TYPE', 'HTTP_COOKIE', 'QUERY_STRING', 'wsgi.input')
+
+_handler = None
+
+
+def get_setting(name):
+    return getattr(settings, 'BATCH', {}).get(name, DEFAULTS[name])
+
+
+def get_handler():
+    global _handler
+    if _handler is None:
+        handler = BaseHandler()
+        handler.load_middleware(is_async=True)
+        _handler = handler
+    return _handler
+
+
+class BatchError(Exception):
+    pass
+
+
+def parse_paths(request):
+    try:
+        items = json.loads(request.body)['requests']
+    except (ValueError, KeyError, TypeError):
+        raise BatchError('Expected a JSON object with a "requests" list.')
+    if not isinstance(items, list) or not items:
+        raise BatchError('"requests" must be a non-empty list.')
+    if len(items) > get_setting('MAX_REQUESTS'):
+        raise BatchError(f'At most {get_setting("MAX_REQUESTS")} requests per batch.')
+
+    batch_path = reverse('batch')
+    paths = []
+    for item in items:
+        path = item.get('path') if isinstance(item, dict) else None
+        if not isinstance(path, str):
+            raise BatchError('Each request must be an object with a "path" string.')
+        if item.get('method', 'GET').upper() != 'GET':
+            raise BatchError('Only GET requests can be batched.')
+        if path.startswith(batch_path) or not path.startswith(tuple(routing.get_setting('API_PREFIXES'))):
+            raise BatchError(f'Path is not allowed in a batch: {path}')
+        paths.append(path)
+    return paths
+
+
+def sub_request(request, path, auth):
+    path_info, _, query = path.partition('?')
+    environ = {key: value for key, value in request.META.items() if key not in DROPPED_META}
+    environ.update({
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': path_info,
+        'QUERY_STRING': query,
+        'HTTP_ACCEPT': 'application/json',
+        'wsgi.input': BytesIO(),
+        'wsgi.url_scheme': request.scheme,
+    })
+    sub = WSGIRequest(environ)
+    # Пакет уже прошел контроль допуска (TheQutt.admission) целиком
+    sub.admitted = True
+    if auth:
+        # Пользователь уже проверен: DRF возьмет его без повторного разбора JWT и запроса к базе
+        sub._force_auth_user, sub._force_auth_token = auth
+    return sub
+
+
+def response_body(response):
+    if response.get('Content-Type', '').startswith('application/json'):
+        return json.loads(response.content or b'null')
+    return response.content.decode(response.charset or 'utf-8', errors='replace')
+
+
+async def dispatch(request, path, auth):
+    response = await get_handler().get_response_async(sub_request(request, path, auth))
+    return {'path': path, 'status': response.status_code, 'body': response_body(response)}
+
+
+@csrf_exempt
+@require_POST
+async def batch(request):
+    try:
+        paths = parse_paths(request)
+    except BatchError as e:
+        return JsonResponse({'detail': str(e)}, status=400)
+
+    authentication = JWTAuthentication()
+    try:
+        auth = await sync_to_async(authentication.authenticate)(request)
+    except AuthenticationFailed as e:
+        # Тот же ответ, что дал бы DRF
+        detail = e.detail if isinstance(e.detail, dict) else {'detail': e.detail}
+        response = JsonResponse(detail, status=401)
+        response['WWW-Authenticate'] = authentication.authenticate_header(request)
+        return response
+
+    if get_setting('CONCURRENT'):
+        responses = await asyncio.gather(*(dispatch(request, path, auth) for path in paths))
+    else:
+        responses = [await dispatch(request, path, auth) for path in paths]
+    return JsonResponse({'responses': list(responses)})
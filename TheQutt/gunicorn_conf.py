@@ -0,0 +1,114 @@
+"""
+Конфигурация gunicorn для продакшена:
+
+    gunicorn -c python:TheQutt.gunicorn_conf TheQutt.wsgi:application
+
+Приложение загружается в master до fork (preload_app) и прогревается там же
+(TheQutt.warmup), после чего объекты переносятся в постоянное поколение GC,
+чтобы сборщик не трогал их страницы в workers и память оставалась общей.
+Каждый worker запускает опрос шины инвалидации кэшей (products.invalidation);
+соединения с базой открывают потоки запросов сами.
+Если задан CATALOG_SNAPSHOT_PATH, master собирает снимок каталога. Снимки
+метрик (METRICS_DIR) master удаляет при старте и при выходе каждого worker.
+Перед выходом worker записывает накопленные last_login (users.last_login).
+По умолчанию worker gthread с 16 потоками: контролю допуска (TheQutt.admission)
+нужны потоки или ASGI worker, иначе master пишет предупреждение в лог. Каждый
+поток держит свое соединение с базой — ограничьте их пулом (DB_POOL).
+Параметры переопределяются окружением:
+GUNICORN_BIND, WEB_CONCURRENCY, GUNICORN_THREADS, GUNICORN_WORKER_CLASS
+(например uvicorn.workers.UvicornWorker вместе с TheQutt.asgi:application),
+GUNICORN_TIMEOUT.
+"""
+import gc
+import multiprocessing
+import os
+
+bind = os.environ.get('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+# Потоки нужны контролю допуска: лимиты каталога и профиля меньше числа потоков
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+worker_class = os.environ.get('GUNICORN_WORKER_CLASS', 'gthread')
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+preload_app = True
+
+# Прогрев и шину запускают хуки ниже, а не загрузка TheQutt.wsgi в master (TheQutt.warmup.start_process)
+os.environ.setdefault('WARMUP_ON_LOAD', '0')
+
+
+def when_ready(server):
+    from django.db import connections
+
+    from TheQutt import admission
+    from TheQutt.warmup import warm_up
+
+    stats = warm_up()
+    server.log.info(
+        'Warm-up: %d URL patterns, %d models, %d serializers in %.1f ms',
+        stats['urls'], stats['models'], stats['serializers'], stats['elapsed_ms'],
+    )
+    if stats['failed']:
+        server.log.warning('Warm-up failed for: %s', ', '.join(stats['failed']))
+    for warning in admission.capacity_warnings(worker_class, threads):
+        server.log.warning(warning)
+    build_catalog_snapshot(server)
+    clear_metrics()
+    # Соединения, открытые в master, нельзя делить между процессами
+    connections.close_all()
+    gc.freeze()
+
+
+def build_catalog_snapshot(server):
+    """
+    Свежий снимок каталога до fork; дальше его обновляет manage.py catalog_snapshot --interval
+    """
+    from products import snapshot
+
+    if not snapshot.get_setting('PATH'):
+        return
+    try:
+        generation, size = snapshot.build_snapshot()
+    except Exception:
+        server.log.exception('Could not build the catalog snapshot, workers will read from the database')
+    else:
+        server.log.info('Catalog snapshot: generation %d, %d bytes', generation, size)
+
+
+def clear_metrics():
+    """
+    Снимки метрик воркеров прошлого запуска не должны попадать в /metrics
+    """
+    from monitoring.metrics import get_aggregator
+
+    aggregator = get_aggregator()
+    if aggregator is not None:
+        aggregator.clear()
+
+
+def child_exit(server, worker):
+    from monitoring.metrics import get_aggregator
+
+    aggregator = get_aggregator()
+    if aggregator is not None:
+        aggregator.remove(worker.pid)
+
+
+def worker_exit(server, worker):
+    """
+    Записывает накопленные last_login до выхода worker (LAST_LOGIN_UPDATE['MODE'] = 'batched')
+    """
+    from django.db import connections
+
+    from users.last_login import buffer
+
+    try:
+        buffer.flush()
+    finally:
+        connections.close_all()
+
+
+def post_worker_init(worker):
+    from products.invalidation import bus
+
+    bus.start()
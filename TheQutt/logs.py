@@ -0,0 +1,93 @@
+"""
+Помощники для LOGGING: JSON-формат, сэмплирование и очередь перед медленными handler'ами.
+"""
+import atexit
+import json
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from queue import SimpleQueue
+
+# Атрибуты LogRecord, которые не нужно дублировать в JSON как extra-поля
+RESERVED_ATTRS = frozenset(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        data = {
+            'time': datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+            'module': record.module,
+            'process': record.process,
+            'thread': record.thread,
+        }
+        for key, value in vars(record).items():
+            if key not in RESERVED_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc_info'] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str, ensure_ascii=False)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю `rates[prefix]` записей ниже WARNING от логгеров
+    с этим префиксом имени; WARNING и выше проходят всегда.
+    """
+
+    def __init__(self, rates=None):
+        super().__init__()
+        # Самый длинный префикс проверяется первым
+        self.rates = sorted((rates or {}).items(), key=lambda item: -len(item[0]))
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        for prefix, rate in self.rates:
+            if record.name == prefix or record.name.startswith(prefix + '.'):
+                return random.random() < rate
+        return True
+
+
+class QueueListenerHandler(QueueHandler):
+    """
+    Кладет записи в очередь, а фоновый QueueListener передает их handler'ам
+    `handlers` (имена из LOGGING['handlers']), так что поток запроса никогда
+    не ждет запись на диск.
+    """
+
+    def __init__(self, handlers, respect_handler_level=True):
+        super().__init__(SimpleQueue())
+        targets = []
+        for name in handlers:
+            handler = logging._handlers.get(name)
+            if handler is None:
+                # dictConfig перенастроит этот handler после остальных
+                raise ValueError(f'Handler {name!r} is not configured yet')
+            targets.append(handler)
+
+        self.respect_handler_level = respect_handler_level
+        self.listener = QueueListener(self.queue, *targets, respect_handler_level=respect_handler_level)
+        self.listener.start()
+        atexit.register(self.stop)
+        # Поток listener'а не переживает fork (gunicorn --preload), запускаем его заново в дочернем процессе
+        os.register_at_fork(after_in_child=self._restart_after_fork)
+
+    def _restart_after_fork(self):
+        self.queue = SimpleQueue()
+        self.listener = QueueListener(
+            self.queue, *self.listener.handlers, respect_handler_level=self.respect_handler_level
+        )
+        self.listener.start()
+
+    def stop(self):
+        if self.listener._thread is not None:
+            self.listener.stop()
+
+    def close(self):
+        self.stop()
+        super().close()
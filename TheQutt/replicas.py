@@ -0,0 +1,158 @@
+"""
+Чтение с реплики для безопасных API-запросов.
+
+ReplicaMiddleware разрешает чтение с реплики только на время GET/HEAD/OPTIONS
+запроса вне исключенных путей (админка). Все остальное — записи, запросы
+внутри транзакции, чтения после записи в том же запросе, management-команды —
+идет в основную базу. Модели из PRIMARY_MODELS (пользователи) всегда
+читаются из основной базы: JWT-аутентификация только что
+зарегистрированного пользователя не должна зависеть от отставания реплики.
+
+Read-your-writes: после успешного изменяющего запроса пользователь на
+PIN_SECONDS закрепляется за основной базой (метка в общем кэше), чтобы,
+например, только что оформленный заказ был виден в следующем GET /orders/,
+даже если реплика еще не догнала основную базу. Метка работает только с
+общим для процессов кэшем (REDIS_URL): в LocMemCache ее видит лишь worker,
+обработавший запись, и следующий запрос в другой worker читает с реплики.
+На такую настройку ReplicaMiddleware предупреждает в лог при старте.
+"""
+import logging
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from users.tokens import token_user_id
+
+DEFAULTS = {
+    'ALIAS': 'replica',
+    'PIN_SECONDS': 5,
+    'EXCLUDE_PATHS': ('/admin/',),
+    'PRIMARY_MODELS': ('users.CustomUser',),
+    # POST-запросы, которые ничего не пишут и не закрепляют пользователя за основной базой
+    'READ_ONLY_PATHS': ('/batch/',),
+}
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+# Кэши, которые не видны другим процессам: метка закрепления в них не работает между workers
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+logger = logging.getLogger(__name__)
+_warned = False
+
+# Состояние текущего запроса: {'replica': bool} или None вне ReplicaMiddleware
+_state = ContextVar('replica_state', default=None)
+
+
+def get_setting(name):
+    return getattr(settings, 'READ_REPLICA', {}).get(name, DEFAULTS[name])
+
+
+def pin_key(request):
+    """
+    Ключ закрепления за основной базой: пользователь из JWT или сессия
+    """
+    user_id = token_user_id(request)
+    if user_id is not None:
+        return f'replica:pin:user:{user_id}'
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return f'replica:pin:session:{session.session_key}'
+    return None
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if not state or not state['replica'] or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if model._meta.label in get_setting('PRIMARY_MODELS'):
+            return DEFAULT_DB_ALIAS
+        return get_setting('ALIAS')
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state:
+            # После записи запрос читает только из основной базы
+            state['replica'] = False
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, get_setting('ALIAS')}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика получает схему вместе с данными от основной базы
+        return db == DEFAULT_DB_ALIAS
+
+
+def warn_if_process_local_cache():
+    """
+    Предупреждает (один раз на процесс), если метка закрепления хранится в кэше своего процесса
+    """
+    global _warned
+    if _warned or settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND'] not in PROCESS_LOCAL_CACHES:
+        return
+    _warned = True
+    logger.warning(
+        'READ_REPLICA read-your-writes pinning needs a shared default cache (set REDIS_URL): '
+        'with %s a write pins the user only in the worker that handled it',
+        settings.CACHES[DEFAULT_CACHE_ALIAS]['BACKEND'],
+    )
+
+
+class ReplicaMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        warn_if_process_local_cache()
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = _state.set({'replica': self.use_replica(request)})
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        token = _state.set({'replica': self.use_replica(request)})
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        return self.pin(request, response)
+
+    @staticmethod
+    def use_replica(request):
+        key = pin_key(request)
+        return (
+            request.method in SAFE_METHODS
+            and not request.path.startswith(tuple(get_setting('EXCLUDE_PATHS')))
+            and not (key and cache.get(key))
+        )
+
+    @staticmethod
+    def pin(request, response):
+        if (
+            request.method not in SAFE_METHODS
+            and response.status_code < 400
+            and not request.path.startswith(tuple(get_setting('READ_ONLY_PATHS')))
+        ):
+            # Ключ берется заново: при входе в админку сессия меняется
+            key = pin_key(request)
+            if key:
+                cache.set(key, True, timeout=get_setting('PIN_SECONDS'))
+        return response
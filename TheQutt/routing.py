@@ -0,0 +1,69 @@
+"""
+Браузерные middleware только для браузерных путей.
+
+Мобильное приложение ходит в API с JWT, поэтому на API_PREFIXES сессии,
+CSRF, сообщения, session-аутентификация и X-Frame-Options лишь тратят
+время (на каждый запрос — чтение cookie, lazy-объекты, заголовки ответа).
+Классы ниже — подклассы стандартных middleware Django (проверки админки
+их принимают) и на API-путях сразу передают запрос дальше. Админка и
+остальные пути получают полный набор.
+
+На API-путях request.user до аутентификации DRF — AnonymousUser, затем
+DRF подставляет пользователя из JWT.
+"""
+from django.conf import settings
+from django.contrib.auth.middleware import AuthenticationMiddleware as BaseAuthenticationMiddleware
+from django.contrib.auth.models import AnonymousUser
+from django.contrib.messages.middleware import MessageMiddleware as BaseMessageMiddleware
+from django.contrib.sessions.middleware import SessionMiddleware as BaseSessionMiddleware
+from django.middleware.clickjacking import XFrameOptionsMiddleware as BaseXFrameOptionsMiddleware
+from django.middleware.csrf import CsrfViewMiddleware as BaseCsrfViewMiddleware
+
+DEFAULTS = {
+    'API_PREFIXES': ('/products/', '/orders/', '/map/', '/users/', '/batch/'),
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'LEAN_API', {}).get(name, DEFAULTS[name])
+
+
+def is_api_path(request):
+    return request.path_info.startswith(tuple(get_setting('API_PREFIXES')))
+
+
+class BrowserOnlyMixin:
+    def __call__(self, request):
+        if is_api_path(request):
+            self.skip(request)
+            # В async-режиме get_response возвращает корутину, ее дождется Django
+            return self.get_response(request)
+        return super().__call__(request)
+
+    def skip(self, request):
+        pass
+
+
+class SessionMiddleware(BrowserOnlyMixin, BaseSessionMiddleware):
+    pass
+
+
+class CsrfViewMiddleware(BrowserOnlyMixin, BaseCsrfViewMiddleware):
+    def process_view(self, request, callback, callback_args, callback_kwargs):
+        # process_view Django вызывает отдельно от __call__
+        if is_api_path(request):
+            return None
+        return super().process_view(request, callback, callback_args, callback_kwargs)
+
+
+class AuthenticationMiddleware(BrowserOnlyMixin, BaseAuthenticationMiddleware):
+    def skip(self, request):
+        request.user = AnonymousUser()
+
+
+class MessageMiddleware(BrowserOnlyMixin, BaseMessageMiddleware):
+    pass
+
+
+class XFrameOptionsMiddleware(BrowserOnlyMixin, BaseXFrameOptionsMiddleware):
+    pass
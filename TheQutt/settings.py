@@ -10,8 +10,11 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
+from .database import databases
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -22,7 +25,8 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 SECRET_KEY = 'django-insecure-dba*=)!q%2m4tc-nx*4z8c#739)xmt&mden0my=1@x$-on$#xh'
 
 # SECURITY WARNING: don't run with debug turned on in production!
-DEBUG = True
+# DJANGO_DEBUG=0 — продакшен: без DEBUG и без приложений для разработки
+DEBUG = os.environ.get('DJANGO_DEBUG', '1') == '1'
 
 ALLOWED_HOSTS = ['localhost', '127.0.0.1', '192.168.1.70','qutt.org','*']
 
@@ -39,23 +43,63 @@ INSTALLED_APPS = [
     'orders.apps.OrdersConfig',
     'products.apps.ProductsConfig',
     'users.apps.UsersConfig',
+    'monitoring.apps.MonitoringConfig',
     'rest_framework',
     'corsheaders',
     'rest_framework_simplejwt',
-    'django_extensions'
 ]
 
+# Приложения только для разработки: в продакшене их импорт лишь замедляет старт
+DEV_APPS = ['django_extensions']
+if DEBUG:
+    INSTALLED_APPS += DEV_APPS
+
 MIDDLEWARE = [
+    'monitoring.middleware.MetricsMiddleware',
+    'TheQutt.admission.AdmissionMiddleware',
+    'monitoring.middleware.SlowQueryMiddleware',
+    'monitoring.middleware.NPlusOneMiddleware',
+    'monitoring.middleware.ProfilingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
-    'django.contrib.sessions.middleware.SessionMiddleware',
+    'TheQutt.routing.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
-    'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'django.contrib.messages.middleware.MessageMiddleware',
-    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'TheQutt.throttling.ThrottleMiddleware',
+    'TheQutt.routing.CsrfViewMiddleware',
+    'TheQutt.routing.AuthenticationMiddleware',
+    'products.middleware.OwnedShopsMiddleware',
+    'TheQutt.routing.MessageMiddleware',
+    'TheQutt.routing.XFrameOptionsMiddleware',
 ]
 
+# Контроль допуска (TheQutt.admission): не больше MAX_IN_FLIGHT одновременных запросов класса в worker,
+# не получивший слот за MAX_WAIT секунд запрос — 503 с Retry-After. Заказы важнее каталога, каталог — профиля;
+# пакет /batch/ занимает один слот каталога на все подзапросы;
+# лимиты каталога и профиля держите меньше GUNICORN_THREADS, чтобы для заказов оставались потоки.
+# Работает с gthread (GUNICORN_THREADS > 1) или ASGI worker; у sync с одним потоком лимиты не срабатывают
+ADMISSION_CONTROL = {
+    'ENABLED': os.environ.get('ADMISSION_CONTROL', '1') == '1',
+    'CLASSES': {
+        'orders': {'PREFIXES': ('/orders/',), 'MAX_IN_FLIGHT': 12, 'MAX_WAIT': 2.0, 'RETRY_AFTER': 1},
+        'catalog': {'PREFIXES': ('/products/', '/map/', '/batch/'), 'MAX_IN_FLIGHT': 8, 'MAX_WAIT': 0.25, 'RETRY_AFTER': 2},
+        'profile': {'PREFIXES': ('/users/',), 'MAX_IN_FLIGHT': 4, 'MAX_WAIT': 0.1, 'RETRY_AFTER': 5},
+    },
+    'REQUEST_START_HEADER': 'HTTP_X_REQUEST_START',
+    'POLL_INTERVAL': 0.005,
+}
+
+# Сессии, CSRF, сообщения и X-Frame-Options (TheQutt.routing) не работают на путях API
+# с JWT-аутентификацией; админка и остальные пути получают полный набор
+LEAN_API = {
+    'API_PREFIXES': ('/products/', '/orders/', '/map/', '/users/', '/batch/'),
+}
+
+# POST /batch/ — несколько GET к API за один запрос (TheQutt/batch.py)
+BATCH = {
+    'MAX_REQUESTS': 10,
+    'CONCURRENT': True,
+}
+
 ROOT_URLCONF = 'TheQutt.urls'
 
 TEMPLATES = [
@@ -79,12 +123,41 @@ WSGI_APPLICATION = 'TheQutt.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',  # или 'db.sqlite3', если не используется путь с BASE_DIR
-    }
+# По умолчанию SQLite в db.sqlite3; DATABASE_URL и DATABASE_REPLICA_URL описаны в TheQutt/database.py
+DATABASES = databases(BASE_DIR, os.environ)
+
+# Безопасные API-запросы читают с реплики, если она задана; после записи
+# пользователь PIN_SECONDS секунд читает из основной базы (TheQutt/replicas.py).
+# Метка закрепления хранится в кэше default: с репликой нужен общий кэш (REDIS_URL)
+READ_REPLICA = {
+    'ALIAS': 'replica',
+    'PIN_SECONDS': int(os.environ.get('REPLICA_PIN_SECONDS', 5)),
+    'EXCLUDE_PATHS': ('/admin/',),
+    'PRIMARY_MODELS': ('users.CustomUser',),
+    'READ_ONLY_PATHS': ('/batch/',),
 }
+if READ_REPLICA['ALIAS'] in DATABASES:
+    DATABASE_ROUTERS = ['TheQutt.replicas.ReplicaRouter']
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('TheQutt.routing.SessionMiddleware') + 1,
+        'TheQutt.replicas.ReplicaMiddleware',
+    )
+
+# Cache
+# Локально — LocMemCache, в продакшене задайте REDIS_URL, чтобы кэш (и throttling) был общим для всех воркеров
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -169,11 +242,16 @@ CORS_ALLOW_HEADERS = [
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework_simplejwt.authentication.JWTAuthentication',
-        'rest_framework.authentication.SessionAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.AllowAny',  # Разрешаем доступ по умолчанию
     ],
+    # Token bucket для view с throttle_scope (TheQutt.throttling): '10/min' — 10 запросов с пополнением 10 в минуту
+    'DEFAULT_THROTTLE_RATES': {
+        'login': '10/min',
+        'register': '5/hour',
+        'orders': '30/min',
+    },
 }
 
 # JWT Settings
@@ -184,7 +262,7 @@ SIMPLE_JWT = {
     'REFRESH_TOKEN_LIFETIME': timedelta(days=7),  # Токен обновления живет 7 дней
     'ROTATE_REFRESH_TOKENS': True,  # При обновлении создается новый refresh токен
     'BLACKLIST_AFTER_ROTATION': True,  # Старые refresh токены блокируются
-    'UPDATE_LAST_LOGIN': True,  # Обновляем время последнего входа
+    'UPDATE_LAST_LOGIN': False,  # last_login обновляется через LAST_LOGIN_UPDATE
     
     'ALGORITHM': 'HS256',
     'SIGNING_KEY': SECRET_KEY,
@@ -203,6 +281,7 @@ SIMPLE_JWT = {
     'AUTH_TOKEN_CLASSES': ('rest_framework_simplejwt.tokens.AccessToken',),
     'TOKEN_TYPE_CLAIM': 'token_type',
     'TOKEN_USER_CLASS': 'rest_framework_simplejwt.models.TokenUser',
+    'TOKEN_REFRESH_SERIALIZER': 'users.serializers.CustomTokenRefreshSerializer',
     
     'JTI_CLAIM': 'jti',
     
@@ -211,7 +290,104 @@ SIMPLE_JWT = {
     'SLIDING_TOKEN_REFRESH_LIFETIME': timedelta(days=1),
 }
 
+# Обновление last_login при входе: 'immediate', 'batched' (одним UPDATE на пачку) или 'disabled'
+LAST_LOGIN_UPDATE = {
+    'MODE': 'batched',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': timedelta(seconds=30),
+}
+
+# Отозванные refresh-токены (users.revocation): Bloom-фильтр в памяти + таблица RevokedToken.
+# Истекшие записи удаляет `manage.py purge_revoked_tokens` (запускать по cron)
+TOKEN_REVOCATION = {
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': timedelta(seconds=5),
+    'GRACE': timedelta(seconds=5),
+    'REBUILD_INTERVAL': timedelta(hours=1),
+    'PURGE_BATCH_SIZE': 10_000,
+}
+
+# Алиас кэша для token-bucket throttling
+THROTTLE_CACHE = 'default'
+
+# Сколько секунд хранится в кэше список магазинов пользователя (request.owned_shop_ids)
+OWNED_SHOPS_CACHE_TIMEOUT = 300
+
+# Шина инвалидации локальных кэшей между workers (products.invalidation): события пишутся в таблицу
+# InvalidationEvent, фоновый поток каждого worker gunicorn применяет новые раз в POLL_INTERVAL.
+# Старые события удаляет `manage.py purge_invalidation_events` (запускать по cron)
+INVALIDATION_BUS = {
+    'ENABLED': True,
+    'POLL_INTERVAL': timedelta(seconds=1),
+    'GRACE': timedelta(seconds=5),
+    'RETENTION': timedelta(hours=1),
+    'PURGE_BATCH_SIZE': 10_000,
+}
+
+# Снимок каталога для чтения через mmap (products/snapshot.py). Собирается командой
+# catalog_snapshot (--interval для фонового процесса) и при старте gunicorn; без PATH выключен
+CATALOG_SNAPSHOT = {
+    'PATH': os.environ.get('CATALOG_SNAPSHOT_PATH'),
+    'MAX_AGE': 30,
+    'REFRESH': 5,
+}
+
+# Кэш JSON каталога (products.catalog_cache) для чтения из базы, когда снимок выключен или устарел.
+# STALE_TIMEOUT > 0 — еще столько секунд отдавать устаревшее значение, пока один запрос его пересчитывает
+CATALOG_CACHE = {
+    'TIMEOUT': 30,
+    'STALE_TIMEOUT': 0,
+}
+
+# Single-flight (TheQutt.singleflight): при промахе значение вычисляет один запрос, остальные ждут
+# не дольше WAIT_TIMEOUT секунд; между workers — через блокировку в кэше на LOCK_TIMEOUT секунд
+SINGLE_FLIGHT = {
+    'CACHE': 'default',
+    'WAIT_TIMEOUT': 5,
+    'LOCK_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+# Метрики для /metrics (monitoring). Под gunicorn укажите общий для воркеров METRICS_DIR,
+# чтобы /metrics суммировал данные всех воркеров
+METRICS = {
+    'ENABLED': True,
+    'DIR': os.environ.get('METRICS_DIR'),
+    'FLUSH_INTERVAL': 5,
+}
+
+# Журнал медленных SQL-запросов с EXPLAIN (monitoring), просмотр — /admin/slow-queries/
+SLOW_QUERY_LOG = {
+    'ENABLED': os.environ.get('SLOW_QUERY_LOG') == '1',
+    'THRESHOLD_MS': 100,
+    'CAPACITY': 200,
+    'EXPLAIN': True,
+    'STACK_DEPTH': 5,
+}
+
+# Поиск N+1 (monitoring): запросы одной формы, повторившиеся THRESHOLD раз за HTTP-запрос,
+# пишутся в лог вместе с полем сериализатора, из которого они пришли
+N_PLUS_ONE_DETECTION = {
+    'ENABLED': os.environ.get('N_PLUS_ONE_DETECTION') == '1',
+    'THRESHOLD': 3,
+}
+
+# Профилирование запросов (monitoring): staff отправляет заголовок X-Profile: 1 | pstats | speedscope,
+# id сохраненного профиля возвращается в X-Profile-Id. SAMPLE_RATE > 0 включает случайную выборку
+PROFILING = {
+    'DIR': BASE_DIR / 'profiles',
+    'FORMAT': 'pstats',
+    'SAMPLE_RATE': float(os.environ.get('PROFILE_SAMPLE_RATE', 0)),
+    'INTERVAL': 0.001,
+}
+
 # Logging configuration
+# Все логгеры пишут в handler 'queue': запись ставится в очередь, а на консоль и в файл
+# ее выводит фоновый поток (TheQutt.logs.QueueListenerHandler). Подробные DEBUG/INFO-записи
+# шумных логгеров сэмплируются фильтром 'sampling'.
+LOG_LEVEL = os.environ.get('DJANGO_LOG_LEVEL', 'INFO')
+
 LOGGING = {
     'version': 1,
     'disable_existing_loggers': False,
@@ -224,6 +400,19 @@ LOGGING = {
             'format': '{levelname} {message}',
             'style': '{',
         },
+        'json': {
+            '()': 'TheQutt.logs.JsonFormatter',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'TheQutt.logs.SamplingFilter',
+            'rates': {
+                'products.views': 0.1,
+                'orders.views': 0.1,
+                'orders.serializers': 0.1,
+            },
+        },
     },
     'handlers': {
         'console': {
@@ -231,29 +420,41 @@ LOGGING = {
             'formatter': 'verbose',
         },
         'file': {
-            'class': 'logging.FileHandler',
+            'class': 'logging.handlers.RotatingFileHandler',
             'filename': 'django.log',
-            'formatter': 'verbose',
+            'maxBytes': 10 * 1024 * 1024,
+            'backupCount': 5,
+            'formatter': 'json',
+        },
+        'queue': {
+            '()': 'TheQutt.logs.QueueListenerHandler',
+            'handlers': ['console', 'file'],
+            'filters': ['sampling'],
         },
     },
     'root': {
-        'handlers': ['console', 'file'],
-        'level': 'INFO',
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
     },
     'loggers': {
         'django': {
-            'handlers': ['console', 'file'],
-            'level': 'INFO',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'rest_framework': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
         'products': {
-            'handlers': ['console', 'file'],
-            'level': 'DEBUG',
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+        'orders': {
+            'handlers': ['queue'],
+            'level': LOG_LEVEL,
             'propagate': False,
         },
     },
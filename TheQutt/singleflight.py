@@ -0,0 +1,130 @@
+"""
+Single-flight для дорогих значений в кэше.
+
+get_or_compute(key, compute, timeout) отдает значение из кэша, а при промахе
+его вычисляет один запрос — остальные, пришедшие за тем же ключом, ждут
+результата:
+
+- в своем процессе — на threading.Event (потоки gthread, sync_to_async);
+- в других workers — пока держится блокировка cache.add('<key>:lock'),
+  они опрашивают кэш каждые POLL_INTERVAL.
+
+Ожидание ограничено WAIT_TIMEOUT: после него запрос вычисляет значение сам,
+а не падает. Блокировка истекает через LOCK_TIMEOUT, если worker умер во
+время вычисления.
+
+С stale_timeout > 0 значение лежит в кэше на stale_timeout секунд дольше.
+После истечения timeout его пересчитывает один запрос, а остальные, пока
+он считает, сразу получают устаревшее значение (stale-while-revalidate).
+"""
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+
+from monitoring.metrics import registry
+
+DEFAULTS = {
+    'CACHE': 'default',
+    'WAIT_TIMEOUT': 5,
+    'LOCK_TIMEOUT': 10,
+    'POLL_INTERVAL': 0.05,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'SINGLE_FLIGHT', {}).get(name, DEFAULTS[name])
+
+
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = None
+        self.failed = False
+
+
+_flights = {}
+_lock = threading.Lock()
+
+
+def record(outcome):
+    registry.inc('singleflight_total', {'outcome': outcome})
+
+
+def get_or_compute(key, compute, timeout, stale_timeout=0):
+    """
+    Значение key из кэша или результат compute(), который сохраняется на timeout секунд
+    """
+    cache = caches[get_setting('CACHE')]
+    # В кэше лежит (свежо до, значение)
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        record('hit')
+        return entry[1]
+
+    with _lock:
+        flight = _flights.get(key)
+        leader = flight is None
+        if leader:
+            flight = _flights[key] = Flight()
+
+    if not leader:
+        if entry is not None:
+            record('stale')
+            return entry[1]
+        if flight.done.wait(get_setting('WAIT_TIMEOUT')) and not flight.failed:
+            record('coalesced')
+            return flight.value
+        record('fallback')
+        return compute()
+
+    try:
+        flight.value = lead(cache, key, compute, timeout, stale_timeout, entry)
+    except BaseException:
+        flight.failed = True
+        raise
+    finally:
+        with _lock:
+            if _flights.get(key) is flight:
+                del _flights[key]
+        flight.done.set()
+    return flight.value
+
+
+def lead(cache, key, compute, timeout, stale_timeout, entry):
+    """
+    Вычисляет значение под блокировкой в кэше или ждет, пока его вычислит другой worker
+    """
+    lock_key, token = f'{key}:lock', uuid.uuid4().hex
+    if not cache.add(lock_key, token, get_setting('LOCK_TIMEOUT')):
+        if entry is not None:
+            record('stale')
+            return entry[1]
+        deadline = time.monotonic() + get_setting('WAIT_TIMEOUT')
+        while time.monotonic() < deadline:
+            time.sleep(get_setting('POLL_INTERVAL'))
+            entry = cache.get(key)
+            if entry is not None and entry[0] > time.time():
+                record('coalesced')
+                return entry[1]
+            # Блокировки нет, а значения нет — тот worker упал с ошибкой
+            if cache.get(lock_key) is None:
+                break
+        record('fallback')
+        return store(cache, key, compute(), timeout, stale_timeout)
+
+    try:
+        record('computed')
+        return store(cache, key, compute(), timeout, stale_timeout)
+    finally:
+        # get и delete не атомарны: если наша блокировка истекла во время вычисления,
+        # в узком окне можно снять чужую — тогда значение просто посчитают дважды
+        if cache.get(lock_key) == token:
+            cache.delete(lock_key)
+
+
+def store(cache, key, value, timeout, stale_timeout):
+    cache.set(key, (time.time() + timeout, value), timeout + stale_timeout)
+    return value
@@ -0,0 +1,567 @@
+import importlib
+import json
+import logging
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+from unittest import mock
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import OperationalError, connection, transaction
+from django.db.utils import ConnectionHandler, load_backend
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from map.models import Location
+from orders.models import Order
+from users.models import CustomUser
+from monitoring.metrics import registry
+from . import admission, singleflight, warmup
+from .database import databases, parse_database_url
+from .logs import JsonFormatter, QueueListenerHandler, SamplingFilter
+from .replicas import ReplicaMiddleware, ReplicaRouter
+
+
+class ListHandler(logging.Handler):
+    def __init__(self):
+        super().__init__()
+        self.records = []
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingPipelineTest(SimpleTestCase):
+    def make_record(self, name, level, msg='message', args=()):
+        return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+    def test_json_formatter_includes_extra(self):
+        """Тест: JSON-формат содержит сообщение и extra-поля"""
+        record = self.make_record('orders.views', logging.INFO, 'Order %s', ('abc',))
+        record.order_id = 'abc'
+        data = json.loads(JsonFormatter().format(record))
+
+        self.assertEqual(data['message'], 'Order abc')
+        self.assertEqual(data['logger'], 'orders.views')
+        self.assertEqual(data['order_id'], 'abc')
+
+    def test_sampling_filter(self):
+        """Тест: сэмплируются только подробные записи логгеров с заданным префиксом"""
+        sampling = SamplingFilter({'products': 0.0, 'products.views': 1.0})
+
+        self.assertFalse(sampling.filter(self.make_record('products.models', logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.make_record('products.views', logging.DEBUG)))
+        self.assertTrue(sampling.filter(self.make_record('products.models', logging.WARNING)))
+        self.assertTrue(sampling.filter(self.make_record('orders.views', logging.DEBUG)))
+
+    def test_queue_handler_delivers_records(self):
+        """Тест: записи из очереди доходят до целевого handler'а"""
+        target = ListHandler()
+        target.set_name('test-target')
+        handler = QueueListenerHandler(['test-target'])
+        try:
+            handler.handle(self.make_record('orders.views', logging.INFO, 'queued'))
+        finally:
+            handler.close()
+            target.close()
+
+        self.assertEqual([record.getMessage() for record in target.records], ['queued'])
+
+
+class DatabaseConfigTest(SimpleTestCase):
+    def test_sqlite_paths(self):
+        """Тест: относительный путь SQLite считается от BASE_DIR, абсолютный остается как есть"""
+        self.assertEqual(parse_database_url('sqlite:///db.sqlite3', '/app')['NAME'], Path('/app/db.sqlite3'))
+        self.assertEqual(parse_database_url('sqlite:////data/qutt.db', '/app')['NAME'], Path('/data/qutt.db'))
+
+    def test_postgres_persistent_connections(self):
+        """Тест: PostgreSQL без пула использует постоянные соединения с проверкой"""
+        config = databases('/app', {'DATABASE_URL': 'postgres://qutt:p%40ss@db:5433/qutt?sslmode=require'})['default']
+
+        self.assertEqual(config['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual((config['USER'], config['PASSWORD'], config['HOST'], config['PORT']), ('qutt', 'p@ss', 'db', '5433'))
+        self.assertEqual(config['OPTIONS'], {'sslmode': 'require'})
+        self.assertEqual(config['CONN_MAX_AGE'], 60)
+        self.assertTrue(config['CONN_HEALTH_CHECKS'])
+
+    def test_postgres_pool(self):
+        """Тест: DB_POOL=1 включает пул psycopg3 и выключает постоянные соединения"""
+        config = databases('/app', {
+            'DATABASE_URL': 'postgres://qutt@db/qutt', 'DB_POOL': '1', 'DB_POOL_MAX_SIZE': '20',
+        })['default']
+
+        self.assertEqual(config['OPTIONS']['pool'], {'min_size': 2, 'max_size': 20, 'timeout': 10.0})
+        self.assertEqual(config['CONN_MAX_AGE'], 0)
+
+    def test_replica(self):
+        """Тест: реплика появляется только с DATABASE_REPLICA_URL и в тестах зеркалит основную базу"""
+        self.assertEqual(set(databases('/app', {})), {'default'})
+
+        config = databases('/app', {'DATABASE_REPLICA_URL': 'sqlite:///replica.sqlite3'})
+        self.assertEqual(config['replica']['NAME'], Path('/app/replica.sqlite3'))
+        self.assertEqual(config['replica']['TEST'], {'MIRROR': 'default'})
+
+    def test_hardened_sqlite_profile(self):
+        """Тест: профиль hardened включает свой backend, BEGIN IMMEDIATE и PRAGMA на каждом соединении"""
+        config = databases('/app', {'SQLITE_PROFILE': 'hardened', 'SQLITE_BUSY_TIMEOUT_MS': '2000'})['default']
+
+        self.assertEqual(config['ENGINE'], 'TheQutt.backends.sqlite3')
+        self.assertEqual(config['OPTIONS']['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(config['OPTIONS']['timeout'], 2)
+        self.assertIn('PRAGMA journal_mode=WAL', config['OPTIONS']['init_command'])
+        self.assertIn('PRAGMA busy_timeout=2000', config['OPTIONS']['init_command'])
+
+    def test_unsupported_scheme(self):
+        """Тест: неизвестная схема URL — ошибка конфигурации"""
+        with self.assertRaises(ValueError):
+            parse_database_url('mysql://db/qutt', '/app')
+
+
+class ReplicaRoutingTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def auth(self, user_id):
+        token = AccessToken()
+        token['user_id'] = user_id
+        return {'HTTP_AUTHORIZATION': f'Bearer {token}'}
+
+    def call(self, request, write=False, status=200, model=Order):
+        """
+        Пропускает запрос через ReplicaMiddleware; возвращает базы, выбранные для чтения до и после записи
+        """
+        reads = []
+
+        def view(request):
+            reads.append(self.router.db_for_read(model))
+            if write:
+                self.router.db_for_write(model)
+                reads.append(self.router.db_for_read(model))
+            return HttpResponse(status=status)
+
+        ReplicaMiddleware(view)(request)
+        return reads
+
+    def test_safe_requests_read_from_replica(self):
+        """Тест: GET читает с реплики, запись в том же запросе переключает чтение на основную базу"""
+        self.assertEqual(self.call(self.factory.get('/orders/')), ['replica'])
+        self.assertEqual(self.call(self.factory.get('/orders/'), write=True), ['replica', 'default'])
+
+    def test_primary_outside_safe_requests(self):
+        """Тест: изменяющие запросы, админка, пользователи и код вне запроса читают из основной базы"""
+        self.assertEqual(self.call(self.factory.post('/orders/')), ['default'])
+        self.assertEqual(self.call(self.factory.get('/admin/orders/order/')), ['default'])
+        self.assertEqual(self.call(self.factory.get('/orders/'), model=CustomUser), ['default'])
+        self.assertEqual(self.router.db_for_read(Order), 'default')
+
+    def test_read_your_writes(self):
+        """Тест: после успешной записи пользователь читает из основной базы, другие — с реплики"""
+        self.call(self.factory.post('/orders/', **self.auth(1)), status=400)
+        self.assertEqual(self.call(self.factory.get('/orders/', **self.auth(1))), ['replica'])
+
+        self.call(self.factory.post('/orders/', **self.auth(1)), status=201)
+        self.assertEqual(self.call(self.factory.get('/orders/', **self.auth(1))), ['default'])
+        self.assertEqual(self.call(self.factory.get('/orders/', **self.auth(2))), ['replica'])
+
+        cache.clear()
+        self.assertEqual(self.call(self.factory.get('/orders/', **self.auth(1))), ['replica'])
+
+    def test_batch_does_not_pin(self):
+        """Тест: POST /batch/ только читает и не закрепляет пользователя за основной базой"""
+        self.call(self.factory.post('/batch/', **self.auth(1)))
+        self.assertEqual(self.call(self.factory.get('/orders/', **self.auth(1))), ['replica'])
+
+
+    def test_process_local_cache_warning(self):
+        """Тест: с LocMemCache ReplicaMiddleware предупреждает, что закрепление не работает между workers"""
+        with mock.patch('TheQutt.replicas._warned', False), self.assertLogs('TheQutt.replicas', 'WARNING') as logs:
+            ReplicaMiddleware(lambda request: HttpResponse())
+            ReplicaMiddleware(lambda request: HttpResponse())
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn('REDIS_URL', logs.output[0])
+
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://localhost'}}
+        with mock.patch('TheQutt.replicas._warned', False), override_settings(CACHES=redis), \
+                mock.patch('TheQutt.replicas.logger') as logger:
+            ReplicaMiddleware(lambda request: HttpResponse())
+        logger.warning.assert_not_called()
+
+
+class ReplicaTransactionTest(TestCase):
+    def test_transaction_reads_from_primary(self):
+        """Тест: внутри транзакции GET читает из основной базы"""
+        reads = []
+        with transaction.atomic():
+            ReplicaMiddleware(lambda request: reads.append(ReplicaRouter().db_for_read(Order)) or HttpResponse())(
+                RequestFactory().get('/orders/')
+            )
+        self.assertEqual(reads, ['default'])
+
+
+class HardenedSQLiteTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        config = databases(directory, {
+            'DATABASE_URL': 'sqlite:///hardened.sqlite3', 'SQLITE_PROFILE': 'hardened', 'SQLITE_BUSY_TIMEOUT_MS': '100',
+        })
+        self.settings_dict = ConnectionHandler(config).settings['default']
+        self.connection = self.connect()
+        self.addCleanup(self.connection.close)
+        with self.connection.cursor() as cursor:
+            cursor.execute('CREATE TABLE item (id INTEGER PRIMARY KEY)')
+
+    def connect(self):
+        # Отдельный алиас: SimpleTestCase запрещает соединения с 'default'
+        return load_backend(self.settings_dict['ENGINE']).DatabaseWrapper(self.settings_dict, alias='hardened')
+
+    def pragma(self, name):
+        with self.connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_pragmas(self):
+        """Тест: новое соединение работает в WAL с synchronous=NORMAL и заданным busy_timeout"""
+        self.assertEqual(self.pragma('journal_mode'), 'wal')
+        self.assertEqual(self.pragma('synchronous'), 1)
+        self.assertEqual(self.pragma('busy_timeout'), 100)
+
+    def test_transaction_holds_writer_queue(self):
+        """Тест: транзакция занимает очередь писателей до коммита, чужая запись ждет и получает таймаут"""
+        errors = []
+
+        def write():
+            other = self.connect()
+            try:
+                with other.cursor() as cursor:
+                    cursor.execute('INSERT INTO item DEFAULT VALUES')
+            except OperationalError as e:
+                errors.append(e)
+            finally:
+                other.close()
+
+        self.connection.set_autocommit(False)
+        self.connection._start_transaction_under_autocommit()
+        self.assertTrue(self.connection.holds_writer_queue)
+        thread = threading.Thread(target=write)
+        thread.start()
+        thread.join()
+        self.connection.commit()
+
+        self.assertFalse(self.connection.holds_writer_queue)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('writer queue', str(errors[0]))
+
+
+class WarmUpTest(TestCase):
+    def setUp(self):
+        warmup._warm.clear()
+        self.addCleanup(warmup._warm.clear)
+
+    def test_ready_after_warm_up(self):
+        """Тест: /ready отвечает 503 до прогрева и 200 после него"""
+        response = self.client.get('/ready')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['reason'], 'warming up')
+
+        stats = warmup.warm_up()
+        self.assertGreater(stats['urls'], 20)
+        self.assertEqual(stats['models'], len(apps.get_models()))
+        self.assertIn('related_objects', Order._meta.__dict__)
+        self.assertGreater(stats['serializers'], 5)
+        self.assertEqual(stats['failed'], [])
+        self.assertEqual(self.client.get('/ready').status_code, 200)
+
+    def test_database_unavailable(self):
+        """Тест: прогретый процесс без базы не готов"""
+        warmup.warm_up()
+        with mock.patch.object(warmup, 'open_connections', side_effect=OperationalError('down')):
+            self.assertEqual(warmup.readiness(), (False, 'database unavailable'))
+
+    def test_ready_outside_gunicorn(self):
+        """Тест: под uvicorn и runserver процесс прогревается и запускает шину при загрузке приложения"""
+        for name in ('TheQutt.asgi', 'TheQutt.wsgi'):
+            with self.subTest(module=name):
+                warmup._warm.clear()
+                with mock.patch.dict('os.environ', {'WARMUP_ON_LOAD': '1'}), \
+                        mock.patch('products.invalidation.bus.start') as start:
+                    if name in sys.modules:
+                        importlib.reload(sys.modules[name])
+                    else:
+                        importlib.import_module(name)
+                start.assert_called_once()
+                self.assertEqual(self.client.get('/ready').status_code, 200)
+
+        # Под gunicorn в master ничего не запускается: это делают хуки
+        warmup._warm.clear()
+        with mock.patch.dict('os.environ', {'WARMUP_ON_LOAD': '0'}), \
+                mock.patch('products.invalidation.bus.start') as start:
+            warmup.start_process()
+        start.assert_not_called()
+        self.assertFalse(warmup.is_warm())
+
+    def test_gunicorn_config(self):
+        """Тест: gunicorn грузит приложение до fork и прогревает его в master"""
+        from . import gunicorn_conf
+
+        self.assertTrue(gunicorn_conf.preload_app)
+        server = mock.Mock()
+        with mock.patch('gc.freeze') as freeze, mock.patch('django.db.connections.close_all') as close_all:
+            gunicorn_conf.when_ready(server)
+        close_all.assert_called_once()
+        freeze.assert_called_once()
+        self.assertTrue(warmup.is_warm())
+        server.log.warning.assert_not_called()
+
+
+class LeanMiddlewareTest(TestCase):
+    def setUp(self):
+        self.user = CustomUser.objects.create_user(email='lean@test.com', password='testpass123', is_staff=True, is_superuser=True)
+
+    def test_api_skips_browser_middleware(self):
+        """Тест: API-ответ без cookie сессии/CSRF и X-Frame-Options, админка — с ними"""
+        response = self.client.get('/map/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Frame-Options', response.headers)
+        self.assertEqual(response.cookies, {})
+
+        response = self.client.get('/admin/login/')
+        self.assertEqual(response.headers['X-Frame-Options'], 'DENY')
+        self.assertIn('csrftoken', response.cookies)
+
+    def test_session_does_not_authenticate_api(self):
+        """Тест: сессия админки не аутентифицирует API, JWT — аутентифицирует"""
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get('/admin/').status_code, 200)
+        self.assertEqual(self.client.get('/orders/').status_code, 401)
+
+        token = AccessToken.for_user(self.user)
+        self.assertEqual(self.client.get('/orders/', HTTP_AUTHORIZATION=f'Bearer {token}').status_code, 200)
+
+    def test_admin_post_requires_csrf(self):
+        """Тест: POST в админку без CSRF-токена отклоняется, POST в API — нет"""
+        client = self.client_class(enforce_csrf_checks=True)
+        self.assertEqual(client.post('/admin/login/', {'username': 'lean@test.com'}).status_code, 403)
+        self.assertEqual(client.post('/users/token/', {'email': 'lean@test.com', 'password': 'testpass123'}).status_code, 200)
+
+
+class BatchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(email='batch@test.com', password='testpass123')
+        self.order = Order.objects.create(user=self.user)
+        Location.objects.create(name='Batch Location', latitude=1.0, longitude=2.0)
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def batch(self, *paths, **extra):
+        body = {'requests': [{'path': path} for path in paths]}
+        return self.client.post('/batch/', body, content_type='application/json', **extra)
+
+    def test_matches_individual_responses(self):
+        """Тест: ответы пакета совпадают с отдельными запросами и идут в порядке запроса"""
+        paths = ['/users/profile/', '/map/locations/', '/orders/', f'/orders/{self.order.order_id}/', '/products/my-shops/']
+        response = self.batch(*paths, **self.auth)
+
+        self.assertEqual(response.status_code, 200)
+        results = response.json()['responses']
+        self.assertEqual([result['path'] for result in results], paths)
+        for path, result in zip(paths, results):
+            single = self.client.get(path, **self.auth)
+            self.assertEqual(result['status'], single.status_code, path)
+            self.assertEqual(result['body'], single.json(), path)
+
+    def test_authenticates_once(self):
+        """Тест: пользователь из JWT загружается один раз на весь пакет"""
+        with CaptureQueriesContext(connection) as queries:
+            self.batch('/users/profile/', '/orders/', f'/orders/{self.order.order_id}/', **self.auth)
+        user_queries = [q for q in queries.captured_queries if 'FROM "users_customuser"' in q['sql']]
+        self.assertEqual(len(user_queries), 1)
+
+    def test_anonymous_and_invalid_token(self):
+        """Тест: без токена подзапросы анонимные, с невалидным токеном весь пакет — 401"""
+        results = self.batch('/map/locations/', '/orders/').json()['responses']
+        self.assertEqual([result['status'] for result in results], [200, 401])
+
+        response = self.batch('/map/locations/', HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(response.status_code, 401)
+        self.assertIn('WWW-Authenticate', response.headers)
+
+    def test_rejects_invalid_batches(self):
+        """Тест: лишние подзапросы, не-GET, пути вне API и вложенный /batch/ отклоняются"""
+        self.assertEqual(self.batch(*['/map/locations/'] * 11).status_code, 400)
+        self.assertEqual(self.batch('/admin/').status_code, 400)
+        self.assertEqual(self.batch('/batch/').status_code, 400)
+        body = {'requests': [{'path': '/orders/', 'method': 'POST'}]}
+        self.assertEqual(self.client.post('/batch/', body, content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.post('/batch/', 'nope', content_type='application/json').status_code, 400)
+        self.assertEqual(self.client.get('/batch/').status_code, 405)
+
+
+@override_settings(SINGLE_FLIGHT={'WAIT_TIMEOUT': 1, 'POLL_INTERVAL': 0.01})
+class SingleFlightTest(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = 0
+
+    def compute(self, value='fresh', delay=0):
+        def compute():
+            self.calls += 1
+            time.sleep(delay)
+            return value
+        return compute
+
+    def test_concurrent_misses_compute_once(self):
+        """Тест: одновременные промахи по одному ключу вычисляют значение один раз"""
+        results = []
+        compute = self.compute(delay=0.2)
+        threads = [
+            threading.Thread(target=lambda: results.append(singleflight.get_or_compute('key', compute, 30)))
+            for _ in range(5)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['fresh'] * 5)
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(singleflight.get_or_compute('key', compute, 30), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_waits_for_other_worker(self):
+        """Тест: пока другой worker держит блокировку, значение берется из кэша после его записи"""
+        cache.add('key:lock', 'other', 10)
+        timer = threading.Timer(0.1, singleflight.store, args=(cache, 'key', 'from other', 30, 0))
+        timer.start()
+        self.assertEqual(singleflight.get_or_compute('key', self.compute(), 30), 'from other')
+        timer.join()
+        self.assertEqual(self.calls, 0)
+
+    def test_stale_while_revalidate(self):
+        """Тест: устаревшее значение отдается сразу, пока его пересчитывает другой worker"""
+        cache.set('key', (time.time() - 1, 'stale'), 60)
+        cache.add('key:lock', 'other', 10)
+        self.assertEqual(singleflight.get_or_compute('key', self.compute(), 30, stale_timeout=60), 'stale')
+        self.assertEqual(self.calls, 0)
+
+        cache.delete('key:lock')
+        self.assertEqual(singleflight.get_or_compute('key', self.compute(), 30, stale_timeout=60), 'fresh')
+
+    def test_wait_timeout(self):
+        """Тест: не дождавшись другого worker за WAIT_TIMEOUT, запрос вычисляет значение сам"""
+        cache.add('key:lock', 'other', 10)
+        with override_settings(SINGLE_FLIGHT={'WAIT_TIMEOUT': 0.05, 'POLL_INTERVAL': 0.01}):
+            self.assertEqual(singleflight.get_or_compute('key', self.compute(), 30), 'fresh')
+        self.assertEqual(self.calls, 1)
+
+    def test_leader_error(self):
+        """Тест: ошибка вычисления не кэшируется и снимает блокировку"""
+        def fail():
+            raise ValueError('boom')
+
+        with self.assertRaises(ValueError):
+            singleflight.get_or_compute('key', fail, 30)
+        self.assertIsNone(cache.get('key:lock'))
+        self.assertEqual(singleflight.get_or_compute('key', self.compute(), 30), 'fresh')
+
+
+ADMISSION_TEST_CLASSES = {
+    'orders': {'PREFIXES': ('/orders/',), 'MAX_IN_FLIGHT': 4, 'MAX_WAIT': 1.0, 'RETRY_AFTER': 1},
+    'catalog': {'PREFIXES': ('/products/', '/map/', '/batch/'), 'MAX_IN_FLIGHT': 2, 'MAX_WAIT': 0.05, 'RETRY_AFTER': 2},
+}
+
+
+@override_settings(ADMISSION_CONTROL={'CLASSES': ADMISSION_TEST_CLASSES})
+class AdmissionControlTest(TestCase):
+    def setUp(self):
+        registry.clear()
+        self.user = CustomUser.objects.create_user(email='buyer@test.com', password='testpass123')
+        self.auth = {'HTTP_AUTHORIZATION': f'Bearer {AccessToken.for_user(self.user)}'}
+        self.catalog = admission.get_limiter('catalog', 2)
+
+    def occupy_catalog(self):
+        for _ in range(self.catalog.limit):
+            self.assertTrue(self.catalog.try_acquire())
+        self.addCleanup(lambda: [self.catalog.release() for _ in range(self.catalog.limit)])
+
+    def shed_count(self, **labels):
+        return sum(
+            value for name, key, value in registry.snapshot()['counters']
+            if name == 'admission_shed_total' and all((k, v) in key for k, v in labels.items())
+        )
+
+    def test_checkout_survives_catalog_surge(self):
+        """Тест: при занятых слотах каталога карта получает 503 с Retry-After, а заказы работают"""
+        self.occupy_catalog()
+
+        response = self.client.get('/map/locations/')
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertEqual(self.shed_count(**{'class': 'catalog', 'reason': 'queue'}), 1)
+
+        self.assertEqual(self.client.get('/orders/', **self.auth).status_code, 200)
+        # Пути вне классов не ограничиваются
+        self.assertEqual(self.client.get('/admin/login/').status_code, 200)
+
+    def test_waits_for_slot(self):
+        """Тест: запрос ждет освободившийся слот в пределах MAX_WAIT"""
+        self.assertTrue(self.catalog.try_acquire())
+        self.assertTrue(self.catalog.try_acquire())
+        timer = threading.Timer(0.01, self.catalog.release)
+        timer.start()
+        try:
+            with override_settings(ADMISSION_CONTROL={'CLASSES': dict(
+                ADMISSION_TEST_CLASSES, catalog=dict(ADMISSION_TEST_CLASSES['catalog'], MAX_WAIT=1.0),
+            )}):
+                self.assertEqual(self.client.get('/map/locations/').status_code, 200)
+        finally:
+            timer.join()
+            self.catalog.release()
+        self.assertEqual(self.catalog.in_flight, 0)
+
+    def test_upstream_queue_time(self):
+        """Тест: запрос, прождавший перед worker дольше MAX_WAIT (X-Request-Start), отбрасывается сразу"""
+        late = self.client.get('/map/locations/', HTTP_X_REQUEST_START=f't={(time.time() - 5) * 1000:.0f}')
+        self.assertEqual(late.status_code, 503)
+        self.assertEqual(self.shed_count(reason='upstream'), 1)
+
+        fresh = self.client.get('/map/locations/', HTTP_X_REQUEST_START=f't={time.time() * 1_000_000:.0f}')
+        self.assertEqual(fresh.status_code, 200)
+
+    def test_slot_released_after_error(self):
+        """Тест: слот освобождается и после ответа с ошибкой"""
+        self.assertEqual(self.client.get('/orders/').status_code, 401)
+        self.assertEqual(admission.get_limiter('orders', 4).in_flight, 0)
+
+    def test_batch_admitted_once(self):
+        """Тест: пакет занимает один слот, его подзапросы сверх лимита класса не отбрасываются"""
+        paths = ['/map/locations/'] * 4
+        # Свободен один слот каталога — его берет сам пакет
+        self.assertTrue(self.catalog.try_acquire())
+        try:
+            response = self.client.post('/batch/', {'requests': [{'path': path} for path in paths]}, 'application/json')
+        finally:
+            self.catalog.release()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([result['status'] for result in response.json()['responses']], [200] * 4)
+        self.assertEqual(self.catalog.in_flight, 0)
+
+        self.occupy_catalog()
+        response = self.client.post('/batch/', {'requests': [{'path': path} for path in paths]}, 'application/json')
+        self.assertEqual(response.status_code, 503)
+
+    def test_capacity_warnings(self):
+        """Тест: предупреждение, если лимиты не меньше числа потоков worker"""
+        self.assertEqual(len(admission.capacity_warnings('sync', 1)), 1)
+        warnings = admission.capacity_warnings('gthread', 3)
+        self.assertEqual(len(warnings), 1)
+        self.assertIn("'orders'", warnings[0])
+        self.assertEqual(admission.capacity_warnings('gthread', 8), [])
+        self.assertEqual(admission.capacity_warnings('uvicorn.workers.UvicornWorker', 1), [])
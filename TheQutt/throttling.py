@@ -0,0 +1,123 @@
+"""
+Token-bucket throttling, выполняемый до аутентификации и разбора тела запроса.
+
+View включает его атрибутом ``throttle_scope`` (и, при необходимости,
+``throttle_methods``), а емкость и скорость пополнения берутся из
+``REST_FRAMEWORK['DEFAULT_THROTTLE_RATES']``: '10/min' означает ведро на 10
+запросов, которое пополняется на 10 токенов в минуту.
+"""
+import math
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+from users.tokens import token_user_id
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Ведро хранится в общем кэше двумя ключами: время начала отсчета и счетчик
+    израсходованных токенов, который увеличивается атомарным cache.incr().
+    Доступно токенов: capacity - consumed + (now - start) * refill_rate.
+    """
+    timer = time.time
+
+    def __init__(self, scope):
+        self.scope = scope
+        self.capacity, self.refill_rate = self.parse_rate(api_settings.DEFAULT_THROTTLE_RATES[scope])
+        self.cache = caches[getattr(settings, 'THROTTLE_CACHE', 'default')]
+        self._wait = None
+
+    @staticmethod
+    def parse_rate(rate):
+        num, period = rate.split('/')
+        capacity = int(num)
+        return capacity, capacity / PERIODS[period[0]]
+
+    def get_ident(self, request):
+        """
+        id пользователя из JWT (только проверка подписи, без запроса к БД) или IP
+        """
+        user_id = token_user_id(request)
+        if user_id is not None:
+            return f'user:{user_id}'
+        return f'ip:{super().get_ident(request)}'
+
+    def allow_request(self, request, view):
+        key = f'throttle:{self.scope}:{self.get_ident(request)}'
+        start_key, count_key = f'{key}:start', f'{key}:count'
+        timeout = math.ceil(2 * self.capacity / self.refill_rate)
+        now = self.timer()
+
+        start = self.cache.get_or_set(start_key, now, timeout=timeout)
+        self.cache.add(count_key, 0, timeout=timeout)
+        try:
+            consumed = self.cache.incr(count_key)
+        except ValueError:
+            # Ключ истек между add() и incr()
+            self.cache.set(count_key, 1, timeout=timeout)
+            consumed = 1
+        # Оба ключа живут, пока клиент активен, и истекают вместе после простоя
+        self.cache.touch(start_key, timeout=timeout)
+        self.cache.touch(count_key, timeout=timeout)
+
+        tokens = self.capacity - consumed + (now - start) * self.refill_rate
+        if tokens + 1 > self.capacity:
+            # Ведро было полным: переносим начало отсчета, чтобы простой не копил токены сверх емкости
+            self.cache.set_many({start_key: now, count_key: 1}, timeout=timeout)
+            return True
+        if tokens >= 0:
+            return True
+
+        self.cache.decr(count_key)
+        self._wait = (-tokens) / self.refill_rate
+        return False
+
+    def wait(self):
+        return self._wait
+
+
+class ThrottleMiddleware:
+    """
+    Проверяет throttle_scope view в process_view — до того, как DRF
+    аутентифицирует пользователя и разберет тело запроса.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None) or getattr(view_func, 'view_class', None)
+        scope = getattr(view_class, 'throttle_scope', None)
+        if not scope:
+            return None
+
+        methods = getattr(view_class, 'throttle_methods', None)
+        if methods and request.method not in methods:
+            return None
+
+        throttle = TokenBucketThrottle(scope)
+        if throttle.allow_request(request, view_class):
+            return None
+
+        wait = math.ceil(throttle.wait())
+        response = JsonResponse(
+            {'detail': f'Request was throttled. Expected available in {wait} seconds.'},
+            status=429
+        )
+        response['Retry-After'] = str(wait)
+        return response
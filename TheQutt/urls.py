@@ -3,16 +3,31 @@ from django.conf.urls.static import static
 from django.contrib import admin
 from django.urls import path, include
 from django.http import JsonResponse
+from django.utils import timezone
+
+from monitoring.views import metrics, slow_queries
+from .batch import batch
+from .warmup import readiness
 
 def health_check(request):
     return JsonResponse({
         'status': 'ok',
         'message': 'Django server is running',
-        'timestamp': '2025-08-13'
+        'timestamp': timezone.now().isoformat()
     })
 
+def readiness_check(request):
+    ready, reason = readiness()
+    if not ready:
+        return JsonResponse({'status': 'unavailable', 'reason': reason}, status=503)
+    return JsonResponse({'status': 'ready'})
+
 urlpatterns = [
     path('', health_check, name='health_check'),
+    path('ready', readiness_check, name='readiness_check'),
+    path('metrics', metrics, name='metrics'),
+    path('batch/', batch, name='batch'),
+    path('admin/slow-queries/', slow_queries, name='slow-queries'),
     path('admin/', admin.site.urls),
     path('users/',include("users.urls")),
     path('map/', include('map.urls')),
@@ -0,0 +1,155 @@
+"""
+Прогрев процесса перед приемом трафика.
+
+warm_up() компилирует регулярные выражения всех URL-паттернов, заполняет
+таблицы reverse() и кэши _meta всех моделей (get_fields(), обратные связи,
+validators полей), которые DRF читает при каждом построении полей
+сериализатора. Поля самих сериализаторов строятся заново на каждый
+экземпляр, поэтому их построение при прогреве только проверяет, что
+сериализаторы собираются, и выполняет ленивые импорты DRF. Под gunicorn с
+preload_app это делается в master до fork (см. TheQutt/gunicorn_conf.py),
+и workers получают готовое состояние через copy-on-write; под uvicorn и
+runserver — при загрузке TheQutt.asgi / TheQutt.wsgi (start_process()). Соединения с
+базой каждый worker открывает сам. /ready отвечает 503, пока процесс не
+прогрет или база недоступна.
+"""
+import importlib
+import inspect
+import logging
+import os
+import threading
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections
+from django.urls import URLResolver, get_resolver
+from rest_framework.serializers import BaseSerializer
+
+logger = logging.getLogger(__name__)
+
+_warm = threading.Event()
+
+
+def resolve_urls():
+    """
+    Компилирует все URL-паттерны; возвращает их число
+    """
+    def walk(patterns):
+        count = 0
+        for pattern in patterns:
+            pattern.pattern.regex
+            if isinstance(pattern, URLResolver):
+                count += walk(pattern.url_patterns)
+            else:
+                count += 1
+        return count
+
+    resolver = get_resolver()
+    count = walk(resolver.url_patterns)
+    # reverse_dict заполняет _populate() для всего дерева
+    resolver.reverse_dict
+    return count
+
+
+def warm_models():
+    """
+    Заполняет кэши _meta моделей, общие для всех запросов; возвращает число моделей
+    """
+    count = 0
+    for model in apps.get_models():
+        meta = model._meta
+        meta.get_fields()
+        meta.fields_map
+        meta.related_objects
+        for field in meta.fields:
+            field.validators
+        count += 1
+    return count
+
+
+def project_serializers():
+    """
+    Классы сериализаторов из модулей <app>.serializers приложений проекта
+    """
+    for app_config in apps.get_app_configs():
+        if not app_config.path.startswith(str(settings.BASE_DIR)):
+            continue
+        try:
+            module = importlib.import_module(f'{app_config.name}.serializers')
+        except ModuleNotFoundError:
+            continue
+        for _, cls in inspect.getmembers(module, inspect.isclass):
+            if issubclass(cls, BaseSerializer) and cls.__module__ == module.__name__:
+                yield cls
+
+
+def build_serializers():
+    """
+    Один раз строит поля каждого сериализатора (ленивые импорты DRF, проверка сборки);
+    возвращает (число, список неудачных)
+    """
+    built, failed = 0, []
+    for cls in project_serializers():
+        try:
+            cls(context={}).fields
+        except Exception:
+            logger.warning('Warm-up could not build %s.%s', cls.__module__, cls.__name__, exc_info=True)
+            failed.append(f'{cls.__module__}.{cls.__name__}')
+        else:
+            built += 1
+    return built, failed
+
+
+def open_connections():
+    for alias in connections:
+        connections[alias].ensure_connection()
+
+
+def warm_up():
+    start = time.perf_counter()
+    urls = resolve_urls()
+    models = warm_models()
+    serializers, failed = build_serializers()
+    stats = {
+        'urls': urls,
+        'models': models,
+        'serializers': serializers,
+        'failed': failed,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 1),
+    }
+    logger.info('Warm-up done', extra=stats)
+    _warm.set()
+    return stats
+
+
+def start_process():
+    """
+    Прогрев и шина инвалидации при загрузке приложения (uvicorn, runserver).
+    Под gunicorn это делают хуки TheQutt.gunicorn_conf: прогрев в master до fork,
+    шину — в каждом worker, поэтому там WARMUP_ON_LOAD=0
+    """
+    from products.invalidation import bus
+
+    if os.environ.get('WARMUP_ON_LOAD', '1') != '1':
+        return
+    if not is_warm():
+        warm_up()
+    bus.start()
+
+
+def is_warm():
+    return _warm.is_set()
+
+
+def readiness():
+    """
+    (готов ли процесс, причина если нет)
+    """
+    if not is_warm():
+        return False, 'warming up'
+    try:
+        open_connections()
+    except Exception:
+        return False, 'database unavailable'
+    return True, None
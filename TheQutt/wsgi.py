@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TheQutt.settings')
 
 application = get_wsgi_application()
+
+# Прогрев и шина инвалидации вне gunicorn; импорт после настройки Django
+from TheQutt.warmup import start_process  # noqa: E402
+
+start_process()
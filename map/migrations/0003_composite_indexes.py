@@ -0,0 +1,17 @@
+# Generated by Django 5.2.4 on 2026-10-18 22:50
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('map', '0002_alter_location_latitude_alter_location_longitude'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='location',
+            index=models.Index(fields=['-created_at'], name='location_created_idx'),
+        ),
+    ]
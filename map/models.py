@@ -12,3 +12,6 @@ class Location(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at'], name='location_created_idx'),
+        ]
@@ -1,3 +1,44 @@
 from django.test import TestCase
+from django.urls import reverse
+from rest_framework.test import APITestCase
 
-# Create your tests here.
+from monitoring.testing import CatalogDataset, QueryBudgetMixin, QueryPlanMixin
+
+from .models import Location
+
+
+class MapQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    urls_module = 'map.urls'
+    budgets = {
+        'api-root': 0,
+        'location-list': 1,
+        'location-detail': 1,
+    }
+
+    def request_api_root(self):
+        return self.client.get('/map/')
+
+    def request_location_list(self):
+        return self.client.get(reverse('location-list'))
+
+    def request_location_detail(self):
+        return self.client.get(reverse('location-detail', args=[self.data.location.id]))
+
+
+class LocationQueryPlanTest(QueryPlanMixin, TestCase):
+    def test_locations_ordered_by_index(self):
+        """Тест: список локаций отдается в порядке индекса по -created_at без сортировки"""
+        CatalogDataset().grow_to(3)
+        self.assertUsesIndexes(Location.objects.all(), ordered=True)
+
+
+class AsyncLocationViewTest(APITestCase):
+    def test_async_matches_drf(self):
+        """Тест: асинхронные список и деталь локаций совпадают с ответами ViewSet"""
+        data = CatalogDataset()
+        data.grow_to(3)
+        for url in [reverse('location-list'), reverse('location-detail', args=[data.location.id])]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.json(), self.client.get(url, {'format': 'json'}).json())
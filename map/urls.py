@@ -1,10 +1,13 @@
-from django.urls import path, include
+from django.urls import path
 from rest_framework.routers import DefaultRouter
-from .views import LocationViewSet
+from .views import AsyncLocationDetailView, AsyncLocationListView, LocationViewSet
 
 router = DefaultRouter()
 router.register(r'locations', LocationViewSet)
 
+# Корень API остается от роутера, списки и детали локаций читаются асинхронно
 urlpatterns = [
-    path('', include(router.urls)),
-]
\ No newline at end of file
+    path('', router.get_api_root_view(), name=router.root_view_name),
+    path('locations/', AsyncLocationListView.as_view(), name='location-list'),
+    path('locations/<int:pk>/', AsyncLocationDetailView.as_view(), name='location-detail'),
+]
@@ -1,7 +1,31 @@
 from rest_framework import viewsets
+
+from products.snapshot import SnapshotMixin
+from TheQutt.async_views import AsyncReadView, aget_object_or_404
 from .models import Location
 from .serializers import LocationSerializer
 
 class LocationViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Location.objects.all()
     serializer_class = LocationSerializer
+
+
+class AsyncLocationListView(SnapshotMixin, AsyncReadView):
+    sync_view_class = LocationViewSet
+    snapshot_section = 'location_list'
+    sync_view_args = ({'get': 'list'},)
+    serializer_class = LocationSerializer
+    many = True
+
+    async def aget_data(self, request):
+        return [location async for location in Location.objects.all()]
+
+
+class AsyncLocationDetailView(SnapshotMixin, AsyncReadView):
+    sync_view_class = LocationViewSet
+    snapshot_section = 'location'
+    sync_view_args = ({'get': 'retrieve'},)
+    serializer_class = LocationSerializer
+
+    async def aget_data(self, request, pk):
+        return await aget_object_or_404(Location.objects.all(), pk=pk)
@@ -0,0 +1,14 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        from django.db.backends.signals import connection_created
+
+        from .instrumentation import instrument_serializers, install_query_recorder
+
+        instrument_serializers()
+        connection_created.connect(install_query_recorder, dispatch_uid='monitoring.query_recorder')
@@ -0,0 +1,383 @@
+"""
+Бенчмарки: микробенчмарки сериализаторов и классов прав на данных разного
+размера и HTTP-сценарий покупателя и владельца внутри процесса.
+
+Отдельно сравнивается вставка заказов с uuid4 и UUIDv7 в первичном ключе:
+скорость вставки и размер индекса первичного ключа после нее, а также
+накладные расходы браузерных middleware на API-запрос (TheQutt.routing).
+
+Результат — словарь, который manage.py benchmark пишет в JSON с
+отсортированными ключами, чтобы файлы разных коммитов удобно сравнивать.
+"""
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import ExitStack, contextmanager
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.color import no_style
+from django.db import DatabaseError, connection, connections
+from django.db.models import Count, F
+from django.test.utils import override_settings, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from map.models import Location
+from orders.ids import uuid7
+from orders.models import Order, OrderItem
+from orders.serializers import OrderReadSerializer, ShopOwnerOrderSerializer
+from orders.views import IsShopOwner
+from products.models import Product, Shop, ShopCategory
+from products.ownership import get_owned_shop_ids
+from products.permissions import IsAdminOrReadOnly, IsProductOwnerOrReadOnly, IsShopOwnerForProduct, IsShopOwnerOrReadOnly
+from products.serializers import ProductSerializer, ShopSerializer
+from users.models import CustomUser
+from users.tokens import RevocableRefreshToken
+
+PERMISSIONS = [IsShopOwnerOrReadOnly, IsProductOwnerOrReadOnly, IsShopOwnerForProduct, IsAdminOrReadOnly, IsShopOwner]
+ORDER_ID_GENERATORS = {'uuid4': uuid.uuid4, 'uuid7': uuid7}
+
+
+@contextmanager
+def scratch_database(shared=False, quiet=True):
+    """
+    Временная тестовая база для бенчмарков, без троттлинга и логов ниже ERROR.
+    shared=True для SQLite создает базу в файле, а не в памяти, чтобы ее
+    видели другие потоки и процессы.
+    """
+    test_settings = connection.settings_dict['TEST']
+    old_test_name = test_settings.get('NAME')
+    directory = None
+    if shared and connection.vendor == 'sqlite' and not old_test_name:
+        directory = tempfile.mkdtemp()
+        test_settings['NAME'] = os.path.join(directory, 'scratch.sqlite3')
+
+    # Сценарии шлют много запросов от одних и тех же пользователей
+    rates = {scope: '1000000/min' for scope in settings.REST_FRAMEWORK.get('DEFAULT_THROTTLE_RATES', {})}
+    if quiet:
+        logging.disable(logging.WARNING)
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with override_settings(REST_FRAMEWORK=dict(settings.REST_FRAMEWORK, DEFAULT_THROTTLE_RATES=rates)):
+            yield
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+        logging.disable(logging.NOTSET)
+        test_settings['NAME'] = old_test_name
+        if directory:
+            shutil.rmtree(directory, ignore_errors=True)
+
+
+def percentile(values, q):
+    """
+    Процентиль с линейной интерполяцией (как numpy.percentile по умолчанию)
+    """
+    values = sorted(values)
+    if not values:
+        return 0.0
+    position = (len(values) - 1) * q / 100
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
+
+
+def summarize(timings, queries=None):
+    """
+    p50/p95/p99 в миллисекундах, пропускная способность и число SQL-запросов
+    """
+    total = sum(timings)
+    summary = {
+        'count': len(timings),
+        'p50_ms': round(percentile(timings, 50) * 1000, 3),
+        'p95_ms': round(percentile(timings, 95) * 1000, 3),
+        'p99_ms': round(percentile(timings, 99) * 1000, 3),
+        'throughput_per_s': round(len(timings) / total, 1) if total else 0.0,
+    }
+    if queries is not None:
+        summary['queries_max'] = max(queries, default=0)
+        summary['queries_mean'] = round(sum(queries) / len(queries), 2) if queries else 0.0
+    return summary
+
+
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+def timed(func):
+    """
+    Выполняет func и возвращает (результат, секунды, число SQL-запросов)
+    """
+    counter = QueryCounter()
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(counter))
+        start = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - start
+    return result, elapsed, counter.count
+
+
+def measure(func, repeat):
+    timings, queries = [], []
+    func()  # прогрев
+    for _ in range(repeat):
+        _, elapsed, count = timed(func)
+        timings.append(elapsed)
+        queries.append(count)
+    return summarize(timings, queries)
+
+
+def reset_data():
+    for model in (Order, Product, Shop, ShopCategory, Location, CustomUser):
+        model.objects.all().delete()
+
+
+def seed(size, seed_value):
+    """
+    Заполняет базу каталогом из size магазинов
+    """
+    reset_data()
+    call_command(
+        'seed_scale', shops=size, products_per_shop=10, users=max(size * 2, 10), orders=size * 5,
+        seed=seed_value, stdout=StringIO(),
+    )
+
+
+def busiest_owner():
+    return CustomUser.objects.annotate(shop_count=Count('shops')).order_by('-shop_count', 'pk').first()
+
+
+def benchmark_serializers(size, repeat):
+    """
+    Время сериализации size объектов, уже загруженных из базы вместе со связями
+    """
+    owner = busiest_owner()
+    cases = {
+        'ShopSerializer': (ShopSerializer, Shop.objects.for_serializer()),
+        'ProductSerializer': (ProductSerializer, Product.objects.select_related('shop')),
+        'OrderReadSerializer': (OrderReadSerializer, Order.objects.for_read_serializer()),
+        'ShopOwnerOrderSerializer': (
+            ShopOwnerOrderSerializer,
+            Order.objects.filter(orderitem_set__shop__owner=owner).distinct().for_shop_owner_serializer(),
+        ),
+    }
+    results = {}
+    for name, (serializer_class, queryset) in cases.items():
+        instances = list(queryset.order_by('pk')[:size])
+        results[name] = dict(
+            measure(lambda: serializer_class(instances, many=True).data, repeat), objects=len(instances)
+        )
+    return results
+
+
+def benchmark_permissions(repeat):
+    """
+    has_permission + has_object_permission на PATCH владельца магазина.
+    request.owned_shop_ids создается заново на каждой итерации, как в OwnedShopsMiddleware.
+    """
+    owner = busiest_owner()
+    product = Product.objects.filter(shop__owner=owner).first()
+    factory = APIRequestFactory()
+    results = {}
+    for permission_class in PERMISSIONS:
+        permission = permission_class()
+
+        def check():
+            request = Request(factory.patch('/', {'shop': product.shop_id}, format='json'), parsers=[JSONParser()])
+            request.user = owner
+            request.owned_shop_ids = SimpleLazyObject(lambda: get_owned_shop_ids(owner))
+            return permission.has_permission(request, None) and permission.has_object_permission(request, None, product)
+
+        results[permission_class.__name__] = measure(check, repeat)
+    return results
+
+
+def authenticate(client, user):
+    token = RevocableRefreshToken.for_user(user).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+
+
+def run_scenario(iterations, seed_value):
+    """
+    Сценарий: карта -> магазин с товарами -> заказ -> владелец подтверждает заказ.
+    Возвращает статистику по каждому шагу и общую пропускную способность.
+    """
+    rng = random.Random(seed_value)
+    # Пополняем остатки, чтобы заказы сценария не упирались в нехватку товара
+    Product.objects.update(quantity=F('quantity') + iterations * 3)
+    product_ids = {}
+    for product_id, shop_id in Product.objects.values_list('id', 'shop_id'):
+        product_ids.setdefault(shop_id, []).append(product_id)
+    shops = list(Shop.objects.filter(id__in=product_ids).exclude(owner=None).values_list('id', 'owner_id'))
+    customers = list(CustomUser.objects.values_list('id', flat=True))
+    users = CustomUser.objects.in_bulk(set(customers) | {owner_id for _, owner_id in shops})
+
+    customer_client, owner_client = APIClient(), APIClient()
+    steps = {}
+
+    def step(name, func):
+        response, elapsed, count = timed(func)
+        data = steps.setdefault(name, {'timings': [], 'queries': [], 'errors': 0})
+        data['timings'].append(elapsed)
+        data['queries'].append(count)
+        if response.status_code >= 400:
+            data['errors'] += 1
+        return response
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        shop_id, owner_id = rng.choice(shops)
+        authenticate(customer_client, users[rng.choice(customers)])
+        authenticate(owner_client, users[owner_id])
+
+        step('GET /map/locations/', lambda: customer_client.get(reverse('location-list')))
+        step('GET /products/shops/{id}/with-products/',
+             lambda: customer_client.get(reverse('shop-with-products', args=[shop_id])))
+        items = [
+            {'product_id': product_id, 'shop_id': shop_id, 'quantity': rng.randint(1, 3)}
+            for product_id in rng.sample(product_ids[shop_id], min(2, len(product_ids[shop_id])))
+        ]
+        response = step('POST /orders/',
+                        lambda: customer_client.post(reverse('order-list-create'), {'items': items}, format='json'))
+        if response.status_code < 400:
+            order_id = response.data['order_id']
+            step('PUT /orders/{id}/update/',
+                 lambda: owner_client.put(reverse('order-update', args=[order_id]), {'status': 'confirmed'},
+                                          format='json'))
+    elapsed = time.perf_counter() - started
+
+    results = {
+        name: dict(summarize(data['timings'], data['queries']), errors=data['errors'])
+        for name, data in steps.items()
+    }
+    total_requests = sum(len(data['timings']) for data in steps.values())
+    return {'steps': results, 'requests': total_requests, 'throughput_rps': round(total_requests / elapsed, 1)}
+
+
+def run_suite(sizes, repeat, iterations, seed_value):
+    results = {'serializers': {}, 'permissions': {}, 'scenario': {}}
+    for size in sizes:
+        seed(size, seed_value)
+        key = str(size)
+        results['serializers'][key] = benchmark_serializers(size, repeat)
+        results['permissions'][key] = benchmark_permissions(repeat)
+        results['scenario'][key] = run_scenario(iterations, seed_value)
+    return results
+
+
+def primary_key_index_size(table):
+    """
+    Размер индекса первичного ключа в байтах или None, если база не умеет его посчитать
+    """
+    if connection.vendor == 'sqlite':
+        # Для первичного ключа не-INTEGER типа SQLite создает индекс sqlite_autoindex_<таблица>_N
+        sql = (
+            "SELECT SUM(pgsize) FROM dbstat WHERE name IN "
+            "(SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = %s AND name LIKE 'sqlite_autoindex%%')"
+        )
+    elif connection.vendor == 'postgresql':
+        sql = 'SELECT pg_relation_size(indexrelid) FROM pg_index WHERE indrelid = %s::regclass AND indisprimary'
+    else:
+        return None
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [table])
+            row = cursor.fetchone()
+    except DatabaseError:
+        # SQLite собран без dbstat
+        return None
+    return row[0] if row else None
+
+
+def clear_orders():
+    tables = [OrderItem._meta.db_table, Order._meta.db_table]
+    connection.ops.execute_sql_flush(connection.ops.sql_flush(no_style(), tables))
+
+
+def benchmark_order_ids(rows, batch_size=500):
+    """
+    Вставка rows заказов пачками по batch_size с id каждого генератора на пустую таблицу.
+    Время — на одну пачку (отдельная транзакция), генерация id в него не входит.
+    """
+    results = {}
+    for name, generator in ORDER_ID_GENERATORS.items():
+        clear_orders()
+        timings = []
+        for start in range(0, rows, batch_size):
+            batch = [Order(order_id=generator()) for _ in range(min(batch_size, rows - start))]
+            _, elapsed, _ = timed(lambda: Order.objects.bulk_create(batch))
+            timings.append(elapsed)
+        results[name] = dict(
+            summarize(timings),
+            rows=rows,
+            rows_per_s=round(rows / sum(timings)) if timings else 0,
+            pk_index_bytes=primary_key_index_size(Order._meta.db_table),
+        )
+    clear_orders()
+    return results
+
+
+def benchmark_middleware(repeat):
+    """
+    Дешевые API-запросы (корень /map/ и товары одного магазина) с полным набором
+    middleware (LEAN_API без префиксов) и с облегченным. Замеры чередуются, чтобы
+    оба варианта шли в одинаковых условиях.
+    """
+    client = APIClient()
+    variants = {'full': {'API_PREFIXES': ()}, 'lean': settings.LEAN_API}
+    shop_id = Shop.objects.values_list('pk', flat=True).first() or 0
+    results = {}
+    for path in ('/map/', f'/products/shops/{shop_id}/products/'):
+        timings = {name: [] for name in variants}
+        for i in range(repeat + 1):
+            for name, lean_api in variants.items():
+                with override_settings(LEAN_API=lean_api):
+                    _, elapsed, _ = timed(lambda: client.get(path))
+                if i:  # первый проход — прогрев
+                    timings[name].append(elapsed)
+        results[path] = {name: summarize(values) for name, values in timings.items()}
+        results[path]['saved_us'] = round(
+            (sum(timings['full']) - sum(timings['lean'])) / repeat * 1_000_000, 1
+        ) if repeat else 0.0
+    return results
+
+
+def compare(baseline, current, threshold):
+    """
+    Сравнивает два результата. Возвращает список (путь, было, стало, изменение в %)
+    для метрик p50/p95/p99 и числа запросов, которые выросли больше чем на threshold %.
+    """
+    regressions = []
+
+    def walk(path, old, new):
+        if isinstance(old, dict) and isinstance(new, dict):
+            for key in sorted(old.keys() & new.keys()):
+                walk(f'{path}.{key}' if path else key, old[key], new[key])
+            return
+        name = path.rsplit('.', 1)[-1]
+        if name not in ('p50_ms', 'p95_ms', 'p99_ms', 'queries_max') or not isinstance(old, (int, float)):
+            return
+        if name == 'queries_max':
+            if new > old:
+                regressions.append((path, old, new, None))
+        elif old > 0 and (new - old) / old * 100 > threshold:
+            regressions.append((path, old, new, round((new - old) / old * 100, 1)))
+
+    walk('', baseline, current)
+    return regressions
@@ -0,0 +1,133 @@
+"""
+Нагрузка по HTTP на настоящий сервер (gunicorn/uvicorn) в отдельном процессе.
+
+Клиент на asyncio открывает concurrency соединений, на каждом по очереди
+шлет GET-запросы. В латентность попадают только ответы 2xx, остальные
+считаются ошибками. slow_ms имитирует медленного клиента: строка запроса
+уходит сразу, а заголовки — через slow_ms миллисекунд. Синхронный worker
+все это время держит поток занятым, ASGI-сервер — нет.
+"""
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+from .benchmarks import summarize
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class Server:
+    """
+    Сервер в дочернем процессе; запуск ждет, пока '/' не ответит 200
+    """
+
+    def __init__(self, command, env=None, cwd=None, startup_timeout=60):
+        self.command = command
+        self.env = env
+        self.cwd = cwd
+        self.startup_timeout = startup_timeout
+        self.port = free_port()
+        self.process = None
+
+    def __enter__(self):
+        command = [part.format(port=self.port) for part in self.command]
+        self.process = subprocess.Popen(
+            command, env=self.env, cwd=self.cwd, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        deadline = time.monotonic() + self.startup_timeout
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                raise RuntimeError(f'{command[0]} exited:\n{self.process.stderr.read()}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{self.port}/', timeout=1) as response:
+                    if response.status == 200:
+                        return self
+            except OSError:
+                time.sleep(0.2)
+        self.__exit__()
+        raise RuntimeError(f'{command[0]} did not start in {self.startup_timeout}s')
+
+    def __exit__(self, *exc_info):
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stderr.close()
+
+
+async def fetch(port, path, slow_ms, timeout):
+    """
+    Один GET на новом соединении; возвращает статус ответа
+    """
+    reader, writer = await asyncio.wait_for(asyncio.open_connection('127.0.0.1', port), timeout)
+    try:
+        writer.write(f'GET {path} HTTP/1.1\r\n'.encode())
+        await writer.drain()
+        if slow_ms:
+            await asyncio.sleep(slow_ms / 1000)
+        writer.write(b'Host: localhost\r\nAccept: application/json\r\nConnection: close\r\n\r\n')
+        await writer.drain()
+        status_line = await asyncio.wait_for(reader.readline(), timeout)
+        await asyncio.wait_for(reader.read(), timeout)
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+async def _run_level(port, paths, concurrency, requests_per_client, slow_ms, timeout):
+    latencies, errors = [], 0
+
+    async def client(index):
+        nonlocal errors
+        for i in range(requests_per_client):
+            start = time.perf_counter()
+            try:
+                status = await fetch(port, paths[(index + i) % len(paths)], slow_ms, timeout)
+            except (OSError, asyncio.TimeoutError, ValueError, IndexError):
+                errors += 1
+                continue
+            # Быстрые 503 (контроль допуска) и прочие ошибки не должны занижать латентность
+            if not 200 <= status < 300:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client(index) for index in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return dict(
+        summarize(latencies), requests=concurrency * requests_per_client, errors=errors,
+        requests_per_s=round(len(latencies) / elapsed, 1),
+    )
+
+
+def run_level(port, paths, concurrency, requests_per_client, slow_ms=0, timeout=30):
+    return asyncio.run(_run_level(port, paths, concurrency, requests_per_client, slow_ms, timeout))
+
+
+def python_module(module, *args):
+    return [sys.executable, '-m', module, *args]
+
+
+def error_rate(result):
+    """
+    Доля запросов уровня, не получивших 2xx
+    """
+    return result['errors'] / result['requests'] if result['requests'] else 0.0
+
+
+def server_env(**overrides):
+    """
+    Окружение сервера: контроль допуска выключен, иначе под нагрузкой измеряются 503, а не views
+    """
+    return dict(os.environ, **dict({'ADMISSION_CONTROL': '0'}, **overrides))
@@ -0,0 +1,62 @@
+import time
+
+from rest_framework.serializers import ListSerializer, Serializer
+
+from .metrics import current_request
+
+
+class QueryRecorder:
+    """
+    execute_wrapper, постоянно стоящий на соединении: считает запросы и время в БД
+    запроса из current_request. Контекст копируется в потоки sync_to_async, поэтому
+    считаются и запросы async ORM, выполняемые не в потоке event loop
+    """
+
+    def __call__(self, execute, sql, params, many, context):
+        metrics = current_request.get()
+        if metrics is None:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            metrics.queries += 1
+            metrics.db_time += time.perf_counter() - start
+
+
+def install_query_recorder(sender, connection, **kwargs):
+    """
+    Обработчик connection_created: один QueryRecorder на соединение каждого потока
+    """
+    if not any(isinstance(wrapper, QueryRecorder) for wrapper in connection.execute_wrappers):
+        # В начало списка: execute_wrapper() снимает свою обертку через pop()
+        connection.execute_wrappers.insert(0, QueryRecorder())
+
+
+def _timed_data(fget):
+    def data(self):
+        metrics = current_request.get()
+        # Вложенные сериализаторы (например, ShopCreateSerializer.to_representation) не считаем повторно
+        if metrics is None or metrics.serializer_depth:
+            return fget(self)
+
+        metrics.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return fget(self)
+        finally:
+            metrics.serializer_depth -= 1
+            metrics.serializer_time += time.perf_counter() - start
+
+    data._monitoring_timed = True
+    return property(data)
+
+
+def instrument_serializers():
+    """
+    Оборачивает Serializer.data и ListSerializer.data, чтобы измерять время сериализации
+    """
+    for serializer_class in (Serializer, ListSerializer):
+        fget = serializer_class.data.fget
+        if not getattr(fget, '_monitoring_timed', False):
+            serializer_class.data = _timed_data(fget)
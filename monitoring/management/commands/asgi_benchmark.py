@@ -0,0 +1,112 @@
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.http_load import Server, error_rate, python_module, run_level, server_env
+
+STACKS = {
+    # Синхронный стек: один процесс gunicorn, --threads потоков (gthread)
+    'wsgi': python_module(
+        'gunicorn', 'TheQutt.wsgi:application', '--workers', '1', '--threads', '{threads}',
+        '--bind', '127.0.0.1:{{port}}', '--log-level', 'warning',
+    ),
+    'asgi': python_module(
+        'uvicorn', 'TheQutt.asgi:application', '--workers', '1', '--port', '{{port}}',
+        '--no-access-log', '--log-level', 'warning',
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает, сколько одновременных соединений держит один worker: uvicorn + TheQutt.asgi '
+        '(асинхронные read-эндпоинты) против gunicorn + TheQutt.wsgi. База засевается seed_scale '
+        'во временный файл SQLite, серверы запускаются в отдельных процессах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', default='1,16,64,256', help='Уровни параллельности через запятую')
+        parser.add_argument('--requests-per-client', type=int, default=10)
+        parser.add_argument('--slow-ms', type=int, default=100, help='Задержка медленного клиента между строкой запроса и заголовками')
+        parser.add_argument('--threads', type=int, default=4, help='Потоков у синхронного worker')
+        parser.add_argument('--shops', type=int, default=100)
+        parser.add_argument('--stacks', default='wsgi,asgi', help='Стеки через запятую')
+        parser.add_argument(
+            '--admission', action='store_true', help='Не выключать контроль допуска (ADMISSION_CONTROL) на серверах',
+        )
+        parser.add_argument(
+            '--max-error-rate', type=float, default=0.01,
+            help='Доля ответов не 2xx на уровне, после которой команда завершается ошибкой',
+        )
+        parser.add_argument('--output', '-o', help='Файл для результата в JSON')
+
+    def handle(self, *args, **options):
+        stacks = options['stacks'].split(',')
+        if not set(stacks) <= set(STACKS):
+            raise CommandError(f'--stacks must be a subset of {", ".join(STACKS)}')
+        levels = [int(level) for level in options['concurrency'].split(',')]
+
+        results = {}
+        with tempfile.TemporaryDirectory() as directory:
+            env = server_env(
+                DATABASE_URL=f'sqlite:///{os.path.join(directory, "bench.sqlite3")}',
+                ADMISSION_CONTROL='1' if options['admission'] else '0',
+            )
+            env.pop('DATABASE_REPLICA_URL', None)
+            self.seed(env, options['shops'])
+            paths = self.paths(options['shops'])
+
+            for stack in stacks:
+                command = [part.format(threads=options['threads']) for part in STACKS[stack]]
+                with Server(command, env=env, cwd=settings.BASE_DIR) as server:
+                    for slow_ms in (0, options['slow_ms']):
+                        for level in levels:
+                            name = f'{stack}/{"slow" if slow_ms else "fast"}/c{level}'
+                            results[name] = run_level(
+                                server.port, paths, level, options['requests_per_client'], slow_ms=slow_ms,
+                            )
+                            self.report(name, results[name])
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        failed = [name for name, result in results.items() if error_rate(result) > options['max_error_rate']]
+        if failed:
+            raise CommandError(
+                f'Non-2xx responses above {options["max_error_rate"]:.0%} in: {", ".join(failed)}; '
+                f'their latency does not measure the views'
+            )
+
+    def seed(self, env, shops):
+        manage = os.path.join(settings.BASE_DIR, 'manage.py')
+        for command in (
+            ['migrate', '--verbosity', '0'],
+            ['seed_scale', '--shops', str(shops), '--users', '100', '--orders', '0', '--products-per-shop', '10'],
+        ):
+            process = subprocess.run([sys.executable, manage, *command], env=env, capture_output=True, text=True)
+            if process.returncode:
+                raise CommandError(f'{command[0]} failed:\n{process.stderr}')
+
+    @staticmethod
+    def paths(shops):
+        rng = random.Random(42)
+        ids = [rng.randint(1, shops) for _ in range(50)]
+        return [f'/products/shops/{shop_id}/with-products/' for shop_id in ids] + [
+            f'/products/products/{shop_id * 10}/' for shop_id in ids
+        ]
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<18} {result["requests_per_s"]:>8} req/s  p50 {result["p50_ms"]:>8.1f}ms  '
+            f'p95 {result["p95_ms"]:>8.1f}ms  p99 {result["p99_ms"]:>8.1f}ms  errors {result["errors"]:>4}'
+            f'/{result["requests"]}'
+        )
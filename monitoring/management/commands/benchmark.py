@@ -0,0 +1,121 @@
+import json
+import platform
+import subprocess
+import sys
+
+import django
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from monitoring import benchmarks
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True, cwd=settings.BASE_DIR
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Микробенчмарки сериализаторов и прав и HTTP-сценарий (карта -> магазин -> заказ -> подтверждение) '
+        'на отдельной тестовой базе. Результат пишется в JSON для сравнения между коммитами.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='10,100,1000', help='Размеры данных (число магазинов) через запятую')
+        parser.add_argument('--repeat', type=int, default=30, help='Повторов каждого микробенчмарка')
+        parser.add_argument('--iterations', type=int, default=50, help='Прогонов HTTP-сценария на каждом размере')
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--order-id-rows', type=int, default=50000,
+                            help='Заказов для сравнения uuid4 и UUIDv7 в первичном ключе, 0 — пропустить')
+        parser.add_argument('--middleware-requests', type=int, default=500,
+                            help='Запросов для сравнения полного и облегченного набора middleware, 0 — пропустить')
+        parser.add_argument('--output', '-o', help='Файл для результата в JSON')
+        parser.add_argument('--compare', help='JSON предыдущего прогона для сравнения')
+        parser.add_argument('--threshold', type=float, default=10.0, help='Допустимый рост латентности, %%')
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = [int(size) for size in options['sizes'].split(',')]
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers')
+
+        with benchmarks.scratch_database(quiet=options['verbosity'] < 2):
+            results = benchmarks.run_suite(sizes, options['repeat'], options['iterations'], options['seed'])
+            if options['order_id_rows']:
+                results['order_ids'] = benchmarks.benchmark_order_ids(options['order_id_rows'])
+            if options['middleware_requests']:
+                results['middleware'] = benchmarks.benchmark_middleware(options['middleware_requests'])
+
+        results['meta'] = {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'sizes': sizes,
+            'repeat': options['repeat'],
+            'iterations': options['iterations'],
+            'seed': options['seed'],
+            'order_id_rows': options['order_id_rows'],
+            'middleware_requests': options['middleware_requests'],
+        }
+        self.report(results)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f'Results written to {options["output"]}')
+
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = benchmarks.compare(baseline, results, options['threshold'])
+            for path, old, new, change in regressions:
+                change = f'+{change}%' if change is not None else 'more queries'
+                self.stdout.write(self.style.WARNING(f'REGRESSION {path}: {old} -> {new} ({change})'))
+            if not regressions:
+                self.stdout.write(self.style.SUCCESS('No regressions'))
+            elif options['fail_on_regression']:
+                sys.exit(1)
+
+    def report(self, results):
+        for size, cases in results['serializers'].items():
+            self.stdout.write(f'\n== size {size}')
+            for group in ('serializers', 'permissions'):
+                for name, stats in results[group][size].items():
+                    self.stdout.write(
+                        f'{name:<28} p50 {stats["p50_ms"]:>9.3f}ms  p95 {stats["p95_ms"]:>9.3f}ms  '
+                        f'p99 {stats["p99_ms"]:>9.3f}ms  queries {stats["queries_max"]}'
+                    )
+            scenario = results['scenario'][size]
+            for name, stats in scenario['steps'].items():
+                self.stdout.write(
+                    f'{name:<42} p50 {stats["p50_ms"]:>8.2f}ms  p95 {stats["p95_ms"]:>8.2f}ms  '
+                    f'p99 {stats["p99_ms"]:>8.2f}ms  queries {stats["queries_max"]}  errors {stats["errors"]}'
+                )
+            self.stdout.write(f'scenario throughput: {scenario["throughput_rps"]} req/s')
+
+        if 'order_ids' in results:
+            self.stdout.write('\n== order ids')
+            for name, stats in results['order_ids'].items():
+                size = stats['pk_index_bytes']
+                size = f'{size / 1024:.0f} KiB' if size is not None else 'n/a'
+                self.stdout.write(
+                    f'{name:<8} {stats["rows_per_s"]:>8} rows/s  batch p50 {stats["p50_ms"]:>8.2f}ms  '
+                    f'p95 {stats["p95_ms"]:>8.2f}ms  pk index {size}'
+                )
+
+        if 'middleware' in results:
+            self.stdout.write('\n== middleware (full -> lean)')
+            for path, stats in results['middleware'].items():
+                self.stdout.write(
+                    f'{path:<28} p50 {stats["full"]["p50_ms"]:>7.3f}ms -> {stats["lean"]["p50_ms"]:>7.3f}ms  '
+                    f'saved {stats["saved_us"]:>7.1f}us/request'
+                )
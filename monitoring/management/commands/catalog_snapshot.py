@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from products import snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        'Собирает снимок каталога (CATALOG_SNAPSHOT_PATH), который workers читают через mmap. '
+        'С --interval проверяет каталог каждые N секунд и пересобирает снимок после изменений '
+        'и не реже чем раз в CATALOG_SNAPSHOT["REFRESH"] секунд.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Проверять каждые N секунд, 0 — собрать один раз')
+        parser.add_argument('--path', help='Файл снимка вместо CATALOG_SNAPSHOT["PATH"]')
+
+    def handle(self, *args, **options):
+        path = options['path'] or snapshot.get_setting('PATH')
+        if not path:
+            raise CommandError('Catalog snapshot is not configured: set CATALOG_SNAPSHOT_PATH or pass --path')
+
+        built_generation, built_at = None, 0.0
+        while True:
+            generation = snapshot.current_generation(path)
+            if generation != built_generation or time.time() - built_at >= snapshot.get_setting('REFRESH'):
+                built_generation, built_at = self.build(path), time.time()
+            if not options['interval']:
+                break
+            # Соединение не должно висеть между сборками дольше CONN_MAX_AGE
+            close_old_connections()
+            time.sleep(options['interval'])
+
+    def build(self, path):
+        started = time.perf_counter()
+        generation, size = snapshot.build_snapshot(path)
+        self.stdout.write(
+            f'Catalog snapshot {path}: generation {generation}, {size / 1024:.0f} KiB '
+            f'in {(time.perf_counter() - started) * 1000:.0f}ms'
+        )
+        return generation
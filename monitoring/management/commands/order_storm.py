@@ -0,0 +1,51 @@
+import json
+import sys
+
+from django.core.management.base import BaseCommand
+
+from monitoring import benchmarks, stress
+
+
+class Command(BaseCommand):
+    help = (
+        'Шторм параллельных заказов на горячие товары через OrderListCreateView на временной базе: '
+        'проверяет инварианты склада и сообщает пропускную способность и ожидания блокировок'
+    )
+
+    def add_arguments(self, parser):
+        defaults = stress.StormConfig()
+        parser.add_argument('--workers', type=int, default=defaults.workers)
+        parser.add_argument('--orders-per-worker', type=int, default=defaults.orders_per_worker)
+        parser.add_argument('--hot-products', type=int, default=defaults.hot_products)
+        parser.add_argument('--stock', type=int, default=defaults.stock, help='Начальный остаток каждого товара')
+        parser.add_argument('--max-quantity', type=int, default=defaults.max_quantity)
+        parser.add_argument('--max-retries', type=int, default=defaults.max_retries)
+        parser.add_argument('--cancel-rate', type=float, default=defaults.cancel_rate, help='Доля заказов, которые сразу отменяются')
+        parser.add_argument('--readers', type=int, default=defaults.readers, help='Параллельных читателей каталога')
+        parser.add_argument('--reads-per-reader', type=int, default=defaults.reads_per_reader)
+        parser.add_argument('--mode', choices=['threads', 'processes'], default=defaults.mode)
+        parser.add_argument('--seed', type=int, default=defaults.seed)
+        parser.add_argument('--output', '-o', help='Файл для отчета в JSON')
+
+    def handle(self, *args, **options):
+        config = stress.StormConfig(**{
+            name: options[name] for name in (
+                'workers', 'orders_per_worker', 'hot_products', 'stock', 'max_quantity', 'max_retries', 'cancel_rate',
+                'readers', 'reads_per_reader', 'mode', 'seed',
+            )
+        })
+        with benchmarks.scratch_database(shared=True, quiet=options['verbosity'] < 2):
+            report = stress.run_storm(config)
+
+        self.stdout.write(json.dumps(report, indent=2, sort_keys=True))
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2, sort_keys=True)
+                f.write('\n')
+
+        if report['invariants']['ok']:
+            self.stdout.write(self.style.SUCCESS('Invariants hold'))
+        else:
+            for violation in report['invariants']['violations']:
+                self.stderr.write(self.style.ERROR(violation))
+            sys.exit(1)
@@ -0,0 +1,279 @@
+"""
+Синтетические данные масштаба продакшена для нагрузочных тестов.
+
+Данные детерминированы: один и тот же --seed на пустой базе дает те же
+строки (кроме первичных ключей автоинкремента). Популярность магазинов,
+товаров и активность покупателей распределены по Zipf: немногие магазины
+получают большую часть заказов, как в реальности.
+"""
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from map.models import Location
+from orders.ids import uuid7_at
+from orders.models import Order, OrderItem
+from products.models import Product, Shop, ShopCategory
+from users.models import CustomUser
+
+CATEGORIES = [
+    'restaurant', 'cafe', 'bakery', 'fast food', 'pizza place', 'coffee shop',
+    'dessert shop', 'food truck', 'bar', 'sushi restaurant', 'italian restaurant', 'asian restaurant',
+]
+# Центры городов и разброс в градусах: магазины кучкуются вокруг центров
+CITIES = [
+    ('New York', 40.7306, -73.9866, 0.08),
+    ('Boston', 42.3601, -71.0589, 0.05),
+    ('Philadelphia', 39.9526, -75.1652, 0.06),
+    ('Chicago', 41.8781, -87.6298, 0.09),
+    ('San Francisco', 37.7749, -122.4194, 0.05),
+    ('Austin', 30.2672, -97.7431, 0.07),
+]
+ADJECTIVES = ['Classic', 'Spicy', 'Fresh', 'Smoked', 'Crispy', 'Sweet', 'Grilled', 'Homemade', 'Vegan', 'Double']
+DISHES = [
+    'Burger', 'Latte', 'Croissant', 'Pizza', 'Ramen', 'Salad', 'Taco', 'Cheesecake', 'Bagel', 'Sushi Roll',
+    'Pasta', 'Sandwich', 'Espresso', 'Donut', 'Burrito', 'Smoothie',
+]
+FIRST_NAMES = ['Alex', 'Sam', 'Jordan', 'Taylor', 'Morgan', 'Casey', 'Riley', 'Jamie', 'Avery', 'Quinn']
+LAST_NAMES = ['Smith', 'Johnson', 'Lee', 'Brown', 'Garcia', 'Miller', 'Davis', 'Wilson', 'Moore', 'Clark']
+STATUSES = [
+    (Order.StatusChoices.DELIVERED, 60),
+    (Order.StatusChoices.PENDING, 12),
+    (Order.StatusChoices.CONFIRMED, 8),
+    (Order.StatusChoices.PREPARING, 6),
+    (Order.StatusChoices.READY, 4),
+    (Order.StatusChoices.CANCELLED, 10),
+]
+# Точка отсчета для дат, чтобы они не зависели от момента запуска
+EPOCH = datetime(2025, 1, 1, tzinfo=dt_timezone.utc)
+HISTORY_DAYS = 365
+
+
+def zipf_cum_weights(n, exponent):
+    """
+    Накопленные веса Zipf для рангов 1..n, для random.choices(cum_weights=...)
+    """
+    total = 0.0
+    cum_weights = []
+    for rank in range(1, n + 1):
+        total += 1 / rank ** exponent
+        cum_weights.append(total)
+    return cum_weights
+
+
+@contextmanager
+def explicit_timestamps(*fields):
+    """
+    Отключает auto_now_add, чтобы сохранить сгенерированные даты
+    """
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+class Command(BaseCommand):
+    help = 'Заполняет базу детерминированными синтетическими данными (Zipf-популярность, bulk_create чанками)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shops', type=int, default=1000)
+        parser.add_argument('--products-per-shop', type=int, default=20)
+        parser.add_argument('--users', type=int, default=10000)
+        parser.add_argument('--orders', type=int, default=100000)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--max-items', type=int, default=4, help='Максимум позиций в заказе')
+        parser.add_argument('--zipf', type=float, default=1.1, help='Показатель распределения Zipf')
+        parser.add_argument('--chunk-size', type=int, default=5000)
+        parser.add_argument('--password', default='seedpass123', help='Пароль всех сгенерированных пользователей')
+
+    def handle(self, *args, **options):
+        if options['shops'] and not options['users']:
+            raise CommandError('Shops need owners: --users must be positive')
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError(f'{connection.vendor} does not return primary keys from bulk_create')
+
+        self.rng = random.Random(options['seed'])
+        self.chunk_size = options['chunk_size']
+        self.zipf = options['zipf']
+        self.domain = f'seed{options["seed"]}.example.com'
+        if CustomUser.objects.filter(email__endswith='@' + self.domain).exists():
+            raise CommandError(f'Data for seed {options["seed"]} already exists')
+
+        started = time.perf_counter()
+        with transaction.atomic(), explicit_timestamps(
+            CustomUser._meta.get_field('date_joined'),
+            Location._meta.get_field('created_at'),
+            Order._meta.get_field('created_at'),
+        ):
+            user_ids = self.create_users(options['users'], options['password'])
+            category_ids = self.create_categories()
+            shop_ids = self.create_shops(options['shops'], user_ids, category_ids)
+            products = self.create_products(shop_ids, options['products_per_shop'])
+            self.create_orders(options['orders'], options['max_items'], user_ids, shop_ids, products)
+
+        self.stdout.write(self.style.SUCCESS(f'Seeded in {time.perf_counter() - started:.1f}s'))
+
+    def bulk_insert(self, model, objects, total):
+        """
+        bulk_create чанками; возвращает первичные ключи в порядке вставки
+        """
+        started = time.perf_counter()
+        pks = []
+        chunk = []
+        for obj in objects:
+            chunk.append(obj)
+            if len(chunk) >= self.chunk_size:
+                pks.extend(o.pk for o in model.objects.bulk_create(chunk))
+                chunk = []
+        if chunk:
+            pks.extend(o.pk for o in model.objects.bulk_create(chunk))
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{model._meta.label}: {total} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):.0f} rows/s)')
+        return pks
+
+    def timestamp(self):
+        return EPOCH + timedelta(seconds=self.rng.randrange(HISTORY_DAYS * 24 * 3600))
+
+    def popular(self, items):
+        """
+        Перемешивает items и возвращает их с весами Zipf, чтобы популярность не совпадала с порядком вставки
+        """
+        items = list(items)
+        self.rng.shuffle(items)
+        return items, zipf_cum_weights(len(items), self.zipf)
+
+    def create_users(self, count, password):
+        # Хеш считается один раз: PBKDF2 на каждого пользователя занял бы часы
+        password_hash = make_password(password, salt=self.domain.replace('.', ''))
+
+        def users():
+            for i in range(count):
+                yield CustomUser(
+                    email=f'user{i}@{self.domain}',
+                    first_name=self.rng.choice(FIRST_NAMES),
+                    last_name=self.rng.choice(LAST_NAMES),
+                    password=password_hash,
+                    date_joined=self.timestamp(),
+                )
+
+        return self.bulk_insert(CustomUser, users(), count)
+
+    def create_categories(self):
+        existing = dict(ShopCategory.objects.filter(name__in=CATEGORIES).values_list('name', 'id'))
+        missing = [ShopCategory(name=name) for name in CATEGORIES if name not in existing]
+        for category in ShopCategory.objects.bulk_create(missing):
+            existing[category.name] = category.pk
+        return [existing[name] for name in CATEGORIES]
+
+    def create_shops(self, count, user_ids, category_ids):
+        # Одни владельцы держат сети магазинов, большинство — один магазин
+        owners, owner_weights = self.popular(user_ids)
+        city_weights = zipf_cum_weights(len(CITIES), 1.0)
+        cities = self.rng.choices(CITIES, cum_weights=city_weights, k=count)
+
+        def locations():
+            for i, (city, latitude, longitude, spread) in enumerate(cities):
+                yield Location(
+                    name=f'{city} #{i}',
+                    description=f'Synthetic location in {city}',
+                    latitude=round(self.rng.gauss(latitude, spread), 6),
+                    longitude=round(self.rng.gauss(longitude, spread), 6),
+                    created_at=self.timestamp(),
+                )
+
+        location_ids = self.bulk_insert(Location, locations(), count)
+
+        def shops():
+            for i, location_id in enumerate(location_ids):
+                category_id = self.rng.choice(category_ids)
+                yield Shop(
+                    name=f'Shop {i}',
+                    category_id=category_id,
+                    address=f'{self.rng.randint(1, 999)} {self.rng.choice(LAST_NAMES)} St',
+                    description='Synthetic shop',
+                    location_id=location_id,
+                    opening_hours='09:00-21:00',
+                    owner_id=self.rng.choices(owners, cum_weights=owner_weights)[0],
+                )
+
+        return self.bulk_insert(Shop, shops(), count)
+
+    def create_products(self, shop_ids, per_shop):
+        """
+        Возвращает {shop_id: [(product_id, price), ...]} в порядке популярности
+        """
+        specs = []
+
+        def products():
+            for shop_id in shop_ids:
+                for j in range(per_shop):
+                    price = round(math.exp(self.rng.gauss(2.3, 0.6)), 2)
+                    specs.append((shop_id, price))
+                    yield Product(
+                        name=f'{self.rng.choice(ADJECTIVES)} {self.rng.choice(DISHES)} #{j}',
+                        description='Synthetic product',
+                        quantity=self.rng.randint(0, 500),
+                        price=price,
+                        shop_id=shop_id,
+                    )
+
+        product_ids = self.bulk_insert(Product, products(), len(shop_ids) * per_shop)
+        by_shop = {}
+        for product_id, (shop_id, price) in zip(product_ids, specs):
+            by_shop.setdefault(shop_id, []).append((product_id, price))
+        for shop_id, items in by_shop.items():
+            by_shop[shop_id] = self.popular(items)
+        return by_shop
+
+    def create_orders(self, count, max_items, user_ids, shop_ids, products):
+        shop_ids = [shop_id for shop_id in shop_ids if shop_id in products]
+        if not count or not shop_ids or not user_ids:
+            return
+        customers, customer_weights = self.popular(user_ids)
+        shops, shop_weights = self.popular(shop_ids)
+        statuses = [status for status, _ in STATUSES]
+        status_weights = [weight for _, weight in STATUSES]
+
+        # Заказы и их позиции пишутся вместе по чанкам, чтобы не держать все позиции в памяти
+        started = time.perf_counter()
+        item_count = 0
+        for chunk_start in range(0, count, self.chunk_size):
+            orders, items = [], []
+            for _ in range(min(self.chunk_size, count - chunk_start)):
+                created_at = self.timestamp()
+                order = Order(
+                    order_id=uuid7_at(created_at, self.rng),
+                    user_id=self.rng.choices(customers, cum_weights=customer_weights)[0],
+                    created_at=created_at,
+                    status=self.rng.choices(statuses, weights=status_weights)[0],
+                )
+                orders.append(order)
+                shop_id = self.rng.choices(shops, cum_weights=shop_weights)[0]
+                shop_products, product_weights = products[shop_id]
+                picked = set(self.rng.choices(
+                    range(len(shop_products)), cum_weights=product_weights, k=self.rng.randint(1, max_items)
+                ))
+                for index in sorted(picked):
+                    items.append(OrderItem(
+                        order_id=order.order_id, product_id=shop_products[index][0], shop_id=shop_id,
+                        quantity=self.rng.randint(1, 3),
+                    ))
+            Order.objects.bulk_create(orders)
+            OrderItem.objects.bulk_create(items, batch_size=self.chunk_size)
+            item_count += len(items)
+
+        elapsed = time.perf_counter() - started
+        self.stdout.write(
+            f'orders.Order: {count} rows, orders.OrderItem: {item_count} rows in {elapsed:.1f}s '
+            f'({(count + item_count) / max(elapsed, 1e-9):.0f} rows/s)'
+        )
@@ -0,0 +1,74 @@
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+PROFILES = {
+    'default': {},
+    'hardened': {'SQLITE_PROFILE': 'hardened'},
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает SQLite по умолчанию и профиль SQLITE_PROFILE=hardened под смешанной нагрузкой: '
+        'шторм заказов (order_storm) с параллельными читателями каталога, в потоках и процессах'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--orders-per-worker', type=int, default=25)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--reads-per-reader', type=int, default=50)
+        parser.add_argument('--modes', default='threads,processes', help='Режимы через запятую')
+        parser.add_argument('--output', '-o', help='Файл для результата в JSON')
+
+    def handle(self, *args, **options):
+        modes = options['modes'].split(',')
+        if not set(modes) <= {'threads', 'processes'}:
+            raise CommandError('--modes must be threads and/or processes')
+
+        results = {}
+        for profile, env in PROFILES.items():
+            for mode in modes:
+                report = self.storm(env, mode, options)
+                results[f'{profile}/{mode}'] = report
+                self.report(f'{profile}/{mode}', report)
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+                f.write('\n')
+            self.stdout.write(f'Results written to {options["output"]}')
+
+    def storm(self, env, mode, options):
+        """
+        order_storm в отдельном процессе: профиль SQLite задается окружением при загрузке настроек
+        """
+        with tempfile.NamedTemporaryFile(suffix='.json') as output:
+            command = [
+                sys.executable, os.path.join(settings.BASE_DIR, 'manage.py'), 'order_storm',
+                '--mode', mode, '--output', output.name,
+                '--workers', str(options['workers']), '--orders-per-worker', str(options['orders_per_worker']),
+                '--readers', str(options['readers']), '--reads-per-reader', str(options['reads_per_reader']),
+            ]
+            environ = {key: value for key, value in os.environ.items() if key != 'SQLITE_PROFILE'}
+            process = subprocess.run(command, env=dict(environ, **env), capture_output=True, text=True)
+            if process.returncode not in (0, 1):
+                raise CommandError(f'order_storm failed:\n{process.stderr}')
+            with open(output.name) as f:
+                return json.load(f)
+
+    def report(self, name, report):
+        latency, reads = report['latency'], report['reads']
+        status = self.style.SUCCESS('ok') if report['invariants']['ok'] else self.style.ERROR('VIOLATED')
+        self.stdout.write(
+            f'{name:<20} {report["orders_per_s"]:>7} orders/s  write p95 {latency["p95_ms"]:>8.1f}ms  '
+            f'read p50 {reads["p50_ms"]:>7.1f}ms  p95 {reads["p95_ms"]:>8.1f}ms  '
+            f'lock errors {report["lock_errors"]:>3}  gave up {report["gave_up"]:>3}  '
+            f'read errors {reads["errors"]:>3}  invariants {status}'
+        )
@@ -0,0 +1,50 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring.startup import profile_startup
+
+
+class Command(BaseCommand):
+    help = (
+        'Профиль старта процесса: время этапов (settings, django.setup, URLconf, WSGI) и импорта '
+        'каждого модуля в чистом интерпретаторе. С --budget-ms завершается ошибкой при превышении бюджета'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=25, help='Сколько самых дорогих модулей показать')
+        parser.add_argument('--budget-ms', type=float, help='Бюджет на весь старт в миллисекундах')
+        parser.add_argument('--production', action='store_true', help='Профиль с DJANGO_DEBUG=0')
+        parser.add_argument('--output', '-o', help='Файл для полного отчета в JSON')
+
+    def handle(self, *args, **options):
+        env = {'DJANGO_DEBUG': '0'} if options['production'] else None
+        try:
+            report = profile_startup(settings.BASE_DIR, env)
+        except RuntimeError as e:
+            raise CommandError(f'Startup failed:\n{e}')
+
+        self.stdout.write(f'Startup {report["total_ms"]:.1f}ms, {report["modules"]} modules imported')
+        for stage, elapsed in report['stages_ms'].items():
+            self.stdout.write(f'  {stage:<10} {elapsed:>8.1f}ms')
+
+        self.stdout.write(f'\nSlowest imports (cumulative, self), top {options["top"]}:')
+        slowest = sorted(report['imports'], key=lambda row: row['cumulative_us'], reverse=True)
+        for row in slowest[:options['top']]:
+            self.stdout.write(
+                f'  {row["cumulative_us"] / 1000:>8.1f}ms {row["self_us"] / 1000:>8.1f}ms  {row["module"]}'
+            )
+
+        self.stdout.write('\nSelf time by package:')
+        for name, elapsed in list(report['packages_ms'].items())[:options['top']]:
+            self.stdout.write(f'  {elapsed:>8.1f}ms  {name}')
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+                f.write('\n')
+            self.stdout.write(f'Report written to {options["output"]}')
+
+        if options['budget_ms'] is not None and report['total_ms'] > options['budget_ms']:
+            raise CommandError(f'Startup took {report["total_ms"]:.1f}ms, budget is {options["budget_ms"]:.1f}ms')
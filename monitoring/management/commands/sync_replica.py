@@ -0,0 +1,39 @@
+import sqlite3
+import time
+from contextlib import closing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from TheQutt.replicas import get_setting
+
+
+class Command(BaseCommand):
+    help = (
+        'Копирует основную SQLite-базу в SQLite-реплику. Локальная замена репликации: '
+        'с --interval реплика отстает от основной базы, как настоящая.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0, help='Повторять каждые N секунд, 0 — один раз')
+
+    def handle(self, *args, **options):
+        alias = get_setting('ALIAS')
+        if alias not in connections:
+            raise CommandError('Replica is not configured: set DATABASE_REPLICA_URL')
+        primary, replica = connections[DEFAULT_DB_ALIAS], connections[alias]
+        if primary.vendor != 'sqlite' or replica.vendor != 'sqlite':
+            raise CommandError('Only SQLite primary and replica can be synced; use database replication otherwise')
+
+        while True:
+            self.sync(primary, replica.settings_dict['NAME'])
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+
+    def sync(self, primary, path):
+        started = time.perf_counter()
+        primary.ensure_connection()
+        with closing(sqlite3.connect(path)) as target:
+            primary.connection.backup(target)
+        self.stdout.write(f'Replica {path} synced in {(time.perf_counter() - started) * 1000:.0f}ms')
@@ -0,0 +1,237 @@
+"""
+Метрики запросов в формате Prometheus.
+
+Каждый воркер копит метрики в своем MetricsRegistry. Если задан
+METRICS['DIR'], воркер периодически сохраняет снимок в файл
+metrics-<pid>.json, а /metrics в любом воркере суммирует свой снимок
+со снимками остальных. Снимок завершившегося воркера удаляет master
+gunicorn (child_exit), а оставшиеся от прошлого запуска — при старте
+(TheQutt/gunicorn_conf.py); счетчики ушедшего воркера выпадают из суммы,
+и Prometheus видит это как сброс счетчика.
+"""
+import json
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.conf import settings
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+
+DESCRIPTIONS = {
+    'http_requests_total': ('counter', 'Total HTTP requests by route, method and status.'),
+    'http_request_duration_seconds': ('histogram', 'Request latency by route and method.'),
+    'http_response_bytes_total': ('counter', 'Total response body bytes by route and method.'),
+    'db_queries_per_request': ('histogram', 'SQL queries executed per request.'),
+    'db_query_duration_seconds_total': ('counter', 'Total time spent in SQL queries.'),
+    'serializer_duration_seconds_total': ('counter', 'Total time spent in DRF serializer .data.'),
+    'cache_invalidation_published_total': ('counter', 'Cache invalidation events published by entity.'),
+    'cache_invalidation_applied_total': ('counter', 'Cache invalidation events from other workers applied by entity.'),
+    'admission_shed_total': ('counter', 'Requests rejected with 503 by admission control by route class and reason.'),
+    'admission_wait_seconds': ('histogram', 'Time requests waited for an admission slot by route class.'),
+    'singleflight_total': ('counter', 'Single-flight cache lookups by outcome.'),
+    'cache_invalidation_lag_seconds': ('histogram', 'Delay between publishing an invalidation event and applying it.'),
+}
+
+DEFAULTS = {
+    'ENABLED': True,
+    'DIR': None,
+    'FLUSH_INTERVAL': 5,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'METRICS', {}).get(name, DEFAULTS[name])
+
+
+@dataclass
+class RequestMetrics:
+    queries: int = 0
+    db_time: float = 0.0
+    serializer_time: float = 0.0
+    serializer_depth: int = 0
+
+
+current_request = ContextVar('current_request_metrics', default=None)
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def inc(self, name, labels, value=1):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value, buckets):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['counts'][i] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+
+    def clear(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [
+                    [name, list(labels), dict(h, counts=list(h['counts']))]
+                    for (name, labels), h in self.histograms.items()
+                ],
+            }
+
+
+def merge_snapshots(snapshots):
+    counters, histograms = {}, {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, h in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.get(key)
+            if merged is None:
+                histograms[key] = dict(h, counts=list(h['counts']))
+            else:
+                merged['counts'] = [a + b for a, b in zip(merged['counts'], h['counts'])]
+                merged['sum'] += h['sum']
+                merged['count'] += h['count']
+    return counters, histograms
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render_prometheus(counters, histograms):
+    lines = []
+    names = sorted({name for name, _ in counters} | {name for name, _ in histograms})
+    for name in names:
+        kind, description = DESCRIPTIONS.get(name, ('untyped', name))
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for (metric, labels), value in sorted(counters.items()):
+            if metric == name:
+                lines.append(f'{name}{_labels(labels)} {value}')
+        for (metric, labels), h in sorted(histograms.items()):
+            if metric != name:
+                continue
+            for bound, count in zip(h['buckets'], h['counts']):
+                lines.append(f'{name}_bucket{_labels(labels, [("le", bound)])} {count}')
+            lines.append(f'{name}_bucket{_labels(labels, [("le", "+Inf")])} {h["count"]}')
+            lines.append(f'{name}_sum{_labels(labels)} {h["sum"]}')
+            lines.append(f'{name}_count{_labels(labels)} {h["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+class FileAggregator:
+    """
+    Обмен снимками метрик между воркерами через файлы в общем каталоге
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._flushed_at = 0.0
+
+    @property
+    def path(self):
+        return self.path_for(os.getpid())
+
+    def path_for(self, pid):
+        return os.path.join(self.directory, f'metrics-{pid}.json')
+
+    def maybe_flush(self, registry):
+        now = time.monotonic()
+        if now - self._flushed_at < get_setting('FLUSH_INTERVAL'):
+            return
+        self._flushed_at = now
+        self.flush(registry)
+
+    def flush(self, registry):
+        os.makedirs(self.directory, exist_ok=True)
+        tmp_path = f'{self.path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(registry.snapshot(), f)
+        os.replace(tmp_path, self.path)
+
+    def remove(self, pid):
+        """
+        Удаляет снимок завершившегося воркера
+        """
+        for path in (self.path_for(pid), f'{self.path_for(pid)}.tmp'):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def clear(self):
+        """
+        Удаляет все снимки, например оставшиеся от прошлого запуска
+        """
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if name.startswith('metrics-') and name.endswith(('.json', '.json.tmp')):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    pass
+
+    def read_others(self):
+        snapshots = []
+        own = os.path.basename(self.path)
+        for name in os.listdir(self.directory) if os.path.isdir(self.directory) else []:
+            if not name.startswith('metrics-') or not name.endswith('.json') or name == own:
+                continue
+            try:
+                with open(os.path.join(self.directory, name)) as f:
+                    snapshots.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+        return snapshots
+
+
+registry = MetricsRegistry()
+_aggregator = None
+
+
+def get_aggregator():
+    global _aggregator
+    directory = get_setting('DIR')
+    if not directory:
+        return None
+    if _aggregator is None or _aggregator.directory != str(directory):
+        _aggregator = FileAggregator(str(directory))
+    return _aggregator
+
+
+def collect():
+    """
+    Текст /metrics: метрики этого воркера плюс снимки остальных воркеров
+    """
+    snapshots = [registry.snapshot()]
+    aggregator = get_aggregator()
+    if aggregator is not None:
+        snapshots.extend(aggregator.read_others())
+    return render_prometheus(*merge_snapshots(snapshots))
@@ -0,0 +1,174 @@
+import random
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from .metrics import (
+    LATENCY_BUCKETS, QUERY_COUNT_BUCKETS, RequestMetrics, current_request, get_aggregator, get_setting, registry
+)
+from . import profiling, query_patterns, slow_queries
+
+
+class MetricsMiddleware:
+    """
+    Записывает для каждого маршрута время ответа, число и время SQL-запросов,
+    время сериализации и размер ответа.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not get_setting('ENABLED'):
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        with self.recording() as metrics:
+            response = self.get_response(request)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    async def __acall__(self, request):
+        if not get_setting('ENABLED'):
+            return await self.get_response(request)
+
+        start = time.perf_counter()
+        with self.recording() as metrics:
+            response = await self.get_response(request)
+        self.record(request, response, metrics, time.perf_counter() - start)
+        return response
+
+    @contextmanager
+    def recording(self):
+        # Запросы к БД считает QueryRecorder, установленный на каждое соединение (monitoring.apps)
+        metrics = RequestMetrics()
+        token = current_request.set(metrics)
+        try:
+            yield metrics
+        finally:
+            current_request.reset(token)
+
+    def record(self, request, response, metrics, duration):
+        match = getattr(request, 'resolver_match', None)
+        labels = {'route': match.route if match else 'unmatched', 'method': request.method}
+
+        registry.inc('http_requests_total', dict(labels, status=response.status_code))
+        registry.observe('http_request_duration_seconds', labels, duration, LATENCY_BUCKETS)
+        registry.observe('db_queries_per_request', labels, metrics.queries, QUERY_COUNT_BUCKETS)
+        registry.inc('db_query_duration_seconds_total', labels, metrics.db_time)
+        registry.inc('serializer_duration_seconds_total', labels, metrics.serializer_time)
+        if not response.streaming:
+            registry.inc('http_response_bytes_total', labels, len(response.content))
+
+        aggregator = get_aggregator()
+        if aggregator is not None:
+            aggregator.maybe_flush(registry)
+
+
+class SlowQueryMiddleware:
+    """
+    Включает SlowQueryRecorder на время запроса, если SLOW_QUERY_LOG['ENABLED']
+    """
+
+    def __init__(self, get_response):
+        if not slow_queries.get_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(
+                    slow_queries.SlowQueryRecorder(connection, request.path)
+                ))
+            return self.get_response(request)
+
+
+class NPlusOneMiddleware:
+    """
+    Пишет в лог повторяющиеся SQL-запросы (N+1), если N_PLUS_ONE_DETECTION['ENABLED']
+    """
+
+    def __init__(self, get_response):
+        if not query_patterns.get_setting('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        recorder = query_patterns.QueryPatternRecorder()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+
+        for repeated in recorder.repeated():
+            query_patterns.logger.warning('Possible N+1 on %s %s: %s', request.method, request.path, repeated)
+        return response
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует запрос по заголовку X-Profile (только staff) или случайной выборкой; только под WSGI
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        requested = self.requested(request)
+        # Пользователь определяется до старта профайлера: заголовок не-staff игнорируется
+        if requested and not profiling.is_staff_request(request):
+            requested = ''
+        sampled = self.sampled(requested)
+        if not requested and not sampled:
+            return self.get_response(request)
+
+        profiler = self.start(requested)
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.stop()
+        return self.save(request, response, profiler)
+
+    async def __acall__(self, request):
+        # Профайлер видит только поток event loop, а код view под ASGI выполняется в потоках
+        # sync_to_async: профиль вышел бы пустым, поэтому асинхронный путь не профилируется
+        response = await self.get_response(request)
+        if self.requested(request):
+            response['X-Profile-Error'] = 'Profiling is not supported on the ASGI path, use a WSGI worker'
+        return response
+
+    @staticmethod
+    def requested(request):
+        return request.headers.get('X-Profile', '').lower()
+
+    @staticmethod
+    def sampled(requested):
+        return not requested and random.random() < profiling.get_setting('SAMPLE_RATE')
+
+    @staticmethod
+    def start(requested):
+        profile_format = requested if requested in profiling.FORMATS else profiling.get_setting('FORMAT')
+        profiler = profiling.make_profiler(profile_format)
+        profiler.start()
+        return profiler
+
+    @staticmethod
+    def save(request, response, profiler):
+        response['X-Profile-Id'] = profiling.save_profile(profiler, f'{request.method} {request.path}')
+        return response
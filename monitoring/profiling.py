@@ -0,0 +1,152 @@
+"""
+Профилирование отдельных запросов.
+
+Профиль снимается, если staff-пользователь прислал заголовок
+``X-Profile: 1`` (или ``pstats`` / ``speedscope``), либо случайно с
+вероятностью PROFILING['SAMPLE_RATE']. Middleware стоит до аутентификации,
+поэтому staff проверяется по JWT еще до старта профайлера: заголовок от
+остальных игнорируется. Файл сохраняется в PROFILING['DIR'],
+а его id возвращается в заголовке ``X-Profile-Id``.
+
+Формат pstats снимается cProfile, формат speedscope — сэмплирующим потоком,
+который раз в INTERVAL секунд читает стек потока запроса.
+
+Оба профайлера видят только поток, в котором запущены. Под ASGI view
+выполняется не в потоке event loop, поэтому там запросы не профилируются,
+а на X-Profile приходит заголовок ``X-Profile-Error``.
+"""
+import cProfile
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+DEFAULTS = {
+    'DIR': 'profiles',
+    'FORMAT': 'pstats',
+    'SAMPLE_RATE': 0.0,
+    'INTERVAL': 0.001,
+}
+FORMATS = ('pstats', 'speedscope')
+
+
+def get_setting(name):
+    return getattr(settings, 'PROFILING', {}).get(name, DEFAULTS[name])
+
+
+def is_staff_request(request):
+    """
+    Прислал ли запрос staff-пользователь: по JWT или по force_authenticate (подзапросы /batch/, тесты)
+    """
+    user = getattr(request, '_force_auth_user', None)
+    if user is None:
+        try:
+            result = JWTAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        user = result[0] if result else None
+    return user is not None and user.is_staff
+
+
+class CProfileProfiler:
+    extension = 'prof'
+
+    def __init__(self):
+        self.profiler = cProfile.Profile()
+
+    def start(self):
+        self.profiler.enable()
+
+    def stop(self):
+        self.profiler.disable()
+
+    def save(self, path, name):
+        self.profiler.dump_stats(path)
+
+
+class SamplingProfiler:
+    extension = 'speedscope.json'
+
+    def __init__(self, interval=None):
+        self.interval = interval or get_setting('INTERVAL')
+        self.target = threading.get_ident()
+        self.samples = []
+        self.weights = []
+        self.frames = {}
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        self._started = time.perf_counter()
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+        self._elapsed = time.perf_counter() - self._started
+
+    def _frame_index(self, frame):
+        code = frame.f_code
+        key = (code.co_name, code.co_filename, code.co_firstlineno)
+        if key not in self.frames:
+            self.frames[key] = len(self.frames)
+        return self.frames[key]
+
+    def _run(self):
+        last = time.perf_counter()
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(self.target)
+            now = time.perf_counter()
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(self._frame_index(frame))
+                frame = frame.f_back
+            stack.reverse()
+            self.samples.append(stack)
+            self.weights.append(now - last)
+            last = now
+
+    def save(self, path, name):
+        frames = [{'name': n, 'file': f, 'line': line} for (n, f, line) in self.frames]
+        data = {
+            '$schema': 'https://www.speedscope.app/file-format-schema.json',
+            'name': name,
+            'exporter': 'TheQutt monitoring',
+            'shared': {'frames': frames},
+            'profiles': [{
+                'type': 'sampled',
+                'name': name,
+                'unit': 'seconds',
+                'startValue': 0,
+                'endValue': self._elapsed,
+                'samples': self.samples,
+                'weights': self.weights,
+            }],
+        }
+        with open(path, 'w') as f:
+            json.dump(data, f)
+
+
+def make_profiler(profile_format):
+    if profile_format == 'speedscope':
+        return SamplingProfiler()
+    return CProfileProfiler()
+
+
+def save_profile(profiler, name):
+    """
+    Сохраняет профиль и возвращает его id
+    """
+    directory = str(get_setting('DIR'))
+    os.makedirs(directory, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    profiler.save(os.path.join(directory, f'{profile_id}.{profiler.extension}'), name)
+    return profile_id
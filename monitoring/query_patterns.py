@@ -0,0 +1,105 @@
+"""
+Поиск N+1 по форме SQL-запросов.
+
+Запросы сводятся к форме: пробелы схлопываются, литералы заменяются на ?,
+списки в IN (...) — на один элемент. Если одна форма выполнилась за запрос
+THRESHOLD и более раз, это почти всегда N+1. Для повторов дополнительно
+определяется поле сериализатора, из которого пришел запрос.
+"""
+import logging
+import re
+import sys
+from collections import Counter, defaultdict
+from dataclasses import dataclass
+
+from django.conf import settings
+from rest_framework.serializers import Serializer
+
+from .slow_queries import project_frames
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD': 3,
+}
+
+_WHITESPACE = re.compile(r'\s+')
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN \((?:[^()]*)\)', re.IGNORECASE)
+_TO_REPRESENTATION = Serializer.to_representation.__code__
+
+
+def get_setting(name):
+    return getattr(settings, 'N_PLUS_ONE_DETECTION', {}).get(name, DEFAULTS[name])
+
+
+def normalize_sql(sql):
+    """
+    Форма запроса без конкретных значений
+    """
+    sql = _WHITESPACE.sub(' ', sql).strip()
+    sql = _STRING.sub('?', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = sql.replace('%s', '?')
+    return _IN_LIST.sub('IN (...)', sql)
+
+
+def serializer_origin():
+    """
+    Цепочка полей сериализаторов, внутри которых выполняется запрос,
+    например ``ShopSerializer.owner > ShopOwnerSerializer.shops``.
+    Вне сериализаторов — ближайший кадр из кода проекта.
+    """
+    path = []
+    frame = sys._getframe(1)
+    while frame is not None:
+        if frame.f_code is _TO_REPRESENTATION:
+            field = frame.f_locals.get('field')
+            if field is not None:
+                path.append(f'{type(frame.f_locals["self"]).__name__}.{field.field_name}')
+        frame = frame.f_back
+    if path:
+        return ' > '.join(reversed(path))
+    frames = project_frames(1)
+    return frames[0] if frames else None
+
+
+@dataclass
+class RepeatedQuery:
+    sql: str
+    count: int
+    origins: list
+
+    def __str__(self):
+        origins = ', '.join(origin for origin in self.origins if origin) or 'unknown'
+        return f'{self.count}x {self.sql}\n    from {origins}'
+
+
+class QueryPatternRecorder:
+    """
+    execute_wrapper: считает запросы по форме SQL. Источник определяется
+    только для повторов, чтобы не разбирать стек на каждый запрос.
+    """
+
+    def __init__(self, threshold=None):
+        self.threshold = threshold or get_setting('THRESHOLD')
+        self.queries = 0
+        self.patterns = Counter()
+        self.origins = defaultdict(Counter)
+
+    def __call__(self, execute, sql, params, many, context):
+        shape = normalize_sql(sql)
+        self.queries += 1
+        self.patterns[shape] += 1
+        if self.patterns[shape] > 1:
+            self.origins[shape][serializer_origin()] += 1
+        return execute(sql, params, many, context)
+
+    def repeated(self):
+        return [
+            RepeatedQuery(shape, count, [origin for origin, _ in self.origins[shape].most_common()])
+            for shape, count in self.patterns.most_common()
+            if count >= self.threshold
+        ]
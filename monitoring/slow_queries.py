@@ -0,0 +1,132 @@
+"""
+Журнал медленных SQL-запросов.
+
+Для запросов дольше SLOW_QUERY_LOG['THRESHOLD_MS'] сохраняются SQL,
+параметры, кадры стека из кода проекта и план выполнения (EXPLAIN) в
+кольцевом буфере на CAPACITY записей. Для быстрых запросов цена — один
+замер времени и сравнение.
+"""
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+from django.conf import settings
+from django.utils import timezone
+
+DEFAULTS = {
+    'ENABLED': False,
+    'THRESHOLD_MS': 100,
+    'CAPACITY': 200,
+    'EXPLAIN': True,
+    'STACK_DEPTH': 5,
+}
+
+EXPLAIN_PREFIXES = {
+    'sqlite': 'EXPLAIN QUERY PLAN ',
+    'postgresql': 'EXPLAIN ',
+    'mysql': 'EXPLAIN ',
+}
+EXPLAINABLE = ('SELECT', 'INSERT', 'UPDATE', 'DELETE', 'WITH')
+
+
+def get_setting(name):
+    return getattr(settings, 'SLOW_QUERY_LOG', {}).get(name, DEFAULTS[name])
+
+
+class SlowQueryLog:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.entries = deque(maxlen=get_setting('CAPACITY'))
+
+    def add(self, entry):
+        with self._lock:
+            if self.entries.maxlen != get_setting('CAPACITY'):
+                self.entries = deque(self.entries, maxlen=get_setting('CAPACITY'))
+            self.entries.append(entry)
+
+    def all(self):
+        with self._lock:
+            return list(reversed(self.entries))
+
+    def clear(self):
+        with self._lock:
+            self.entries.clear()
+
+
+slow_query_log = SlowQueryLog()
+_explaining = threading.local()
+
+
+def project_frames(depth):
+    """
+    Кадры стека из кода проекта (без Django, DRF и самого monitoring)
+    """
+    base_dir = str(settings.BASE_DIR)
+    monitoring_dir = os.path.dirname(__file__)
+    frames = []
+    frame = sys._getframe(1)
+    while frame is not None and len(frames) < depth:
+        filename = frame.f_code.co_filename
+        if (filename.startswith(base_dir) and not filename.startswith(monitoring_dir)
+                and 'site-packages' not in filename):
+            frames.append(f'{os.path.relpath(filename, base_dir)}:{frame.f_lineno} in {frame.f_code.co_name}')
+        frame = frame.f_back
+    return frames
+
+
+def explain(connection, sql, params):
+    prefix = EXPLAIN_PREFIXES.get(connection.vendor)
+    if prefix is None or not sql.lstrip().upper().startswith(EXPLAINABLE):
+        return None
+    if connection.needs_rollback:
+        return None
+
+    _explaining.active = True
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+    except Exception as e:
+        return f'EXPLAIN failed: {e}'
+    finally:
+        _explaining.active = False
+
+
+class SlowQueryRecorder:
+    """
+    execute_wrapper, записывающий медленные запросы в slow_query_log
+    """
+
+    def __init__(self, connection, path):
+        self.connection = connection
+        self.path = path
+        self.threshold = get_setting('THRESHOLD_MS') / 1000
+
+    def __call__(self, execute, sql, params, many, context):
+        if getattr(_explaining, 'active', False):
+            return execute(sql, params, many, context)
+
+        start = time.perf_counter()
+        result = execute(sql, params, many, context)
+        duration = time.perf_counter() - start
+        if duration >= self.threshold:
+            self.record(sql, params, many, duration)
+        return result
+
+    def record(self, sql, params, many, duration):
+        plan = None
+        if get_setting('EXPLAIN') and not many:
+            plan = explain(self.connection, sql, params)
+
+        slow_query_log.add({
+            'time': timezone.now(),
+            'path': self.path,
+            'database': self.connection.alias,
+            'duration_ms': round(duration * 1000, 2),
+            'sql': sql,
+            'params': repr(params)[:1000],
+            'stack': project_frames(get_setting('STACK_DEPTH')),
+            'plan': plan,
+        })
@@ -0,0 +1,85 @@
+"""
+Профиль старта процесса: время этапов загрузки Django и импорта каждого модуля.
+
+Замер идет в чистом дочернем интерпретаторе с -X importtime, иначе модули,
+уже импортированные текущим процессом, не попали бы в отчет.
+"""
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+# Этапы выполняются по порядку; время каждого — без предыдущих
+STARTUP_SCRIPT = '''
+import json, os, time
+timings = {}
+start = time.perf_counter()
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TheQutt.settings')
+from django.conf import settings
+settings.INSTALLED_APPS
+timings['settings'] = time.perf_counter() - start
+import django
+django.setup()
+timings['setup'] = time.perf_counter() - start
+from django.urls import get_resolver
+get_resolver().url_patterns
+timings['urls'] = time.perf_counter() - start
+from django.core.wsgi import get_wsgi_application
+get_wsgi_application()
+timings['wsgi'] = time.perf_counter() - start
+print(json.dumps(timings))
+'''
+
+
+def parse_importtime(stderr):
+    """
+    Строки «import time: self | cumulative | module» -> список словарей (время в микросекундах)
+    """
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        fields = line[len('import time:'):].split('|')
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue
+        name = fields[2].rstrip()
+        rows.append({
+            'module': name.strip(),
+            'self_us': int(fields[0]),
+            'cumulative_us': int(fields[1]),
+            'depth': (len(name) - len(name.lstrip())) // 2,
+        })
+    return rows
+
+
+def by_package(rows):
+    """
+    Собственное время импорта, сгруппированное по пакету верхнего уровня
+    """
+    totals = defaultdict(int)
+    for row in rows:
+        totals[row['module'].split('.')[0]] += row['self_us']
+    return dict(sorted(totals.items(), key=lambda item: item[1], reverse=True))
+
+
+def profile_startup(cwd, env=None):
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', STARTUP_SCRIPT],
+        cwd=cwd, env=dict(os.environ, **(env or {})), capture_output=True, text=True,
+    )
+    if process.returncode:
+        raise RuntimeError(process.stderr)
+    cumulative = json.loads(process.stdout.strip().splitlines()[-1])
+    stages, previous = {}, 0.0
+    for stage, elapsed in cumulative.items():
+        stages[stage] = round((elapsed - previous) * 1000, 1)
+        previous = elapsed
+    rows = parse_importtime(process.stderr)
+    return {
+        'total_ms': round(previous * 1000, 1),
+        'stages_ms': stages,
+        'modules': len(rows),
+        'imports': rows,
+        'packages_ms': {name: round(us / 1000, 1) for name, us in by_package(rows).items()},
+    }
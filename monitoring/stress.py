@@ -0,0 +1,291 @@
+"""
+Шторм заказов: много потоков или процессов одновременно оформляют заказы на
+несколько "горячих" товаров через настоящий OrderListCreateView.
+
+Часть созданных заказов (cancel_rate) покупатель сразу отменяет через
+OrderStatusUpdateView — отмена возвращает товары на склад.
+
+После шторма проверяются инварианты склада: остаток не ушел в минус, в
+неотмененных заказах не больше начального остатка, списано ровно столько,
+сколько лежит в неотмененных заказах, нет позиций без заказа и заказов без
+позиций. Ошибки блокировок БД
+(OperationalError: database is locked, deadlock, serialization failure)
+считаются и повторяются клиентом с экспоненциальной задержкой.
+
+Читатели (readers) параллельно с покупателями запрашивают магазин с
+товарами и карту: так видно, блокируют ли записи чтение.
+"""
+import multiprocessing
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+
+from django.db import OperationalError, connection, connections
+from django.db.models import Count, Sum
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from map.models import Location
+from orders.models import Order, OrderItem
+from products.models import Product, Shop, ShopCategory
+from users.models import CustomUser
+from users.tokens import RevocableRefreshToken
+from .benchmarks import summarize
+
+
+@dataclass
+class StormConfig:
+    workers: int = 8
+    orders_per_worker: int = 25
+    hot_products: int = 3
+    stock: int = 100
+    max_quantity: int = 2
+    max_retries: int = 5
+    cancel_rate: float = 0.2
+    readers: int = 0
+    reads_per_reader: int = 50
+    mode: str = 'threads'
+    seed: int = 42
+
+
+@dataclass
+class WorkerStats:
+    created: int = 0
+    cancelled: int = 0
+    out_of_stock: int = 0
+    failed: int = 0
+    lock_errors: int = 0
+    retries: int = 0
+    gave_up: int = 0
+    read_errors: int = 0
+    latencies: list = field(default_factory=list)
+    stock_update_times: list = field(default_factory=list)
+    read_latencies: list = field(default_factory=list)
+
+    def merge(self, other):
+        for name in ('created', 'cancelled', 'out_of_stock', 'failed', 'lock_errors', 'retries', 'gave_up', 'read_errors'):
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.latencies.extend(other.latencies)
+        self.stock_update_times.extend(other.stock_update_times)
+        self.read_latencies.extend(other.read_latencies)
+
+
+class StockUpdateTimer:
+    """
+    execute_wrapper: время UPDATE остатков. Под конкуренцией это в основном ожидание блокировки строки/базы.
+    """
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def __call__(self, execute, sql, params, many, context):
+        if not sql.startswith('UPDATE') or Product._meta.db_table not in sql:
+            return execute(sql, params, many, context)
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.stats.stock_update_times.append(time.perf_counter() - start)
+
+
+def prepare(config):
+    """
+    Создает магазин с горячими товарами и по покупателю на воркер
+    """
+    category = ShopCategory.objects.create(name='storm')
+    owner = CustomUser.objects.create_user(email='storm-owner@example.com')
+    shop = Shop.objects.create(
+        name='Storm shop', category=category, address='Storm st', description='Stress test',
+        location=Location.objects.create(name='Storm'), owner=owner,
+    )
+    products = Product.objects.bulk_create([
+        Product(name=f'Hot product {i}', description='Stress test', quantity=config.stock, price=1.0, shop=shop)
+        for i in range(config.hot_products)
+    ])
+    customers = CustomUser.objects.bulk_create([
+        CustomUser(email=f'storm{i}@example.com') for i in range(config.workers)
+    ])
+    return shop.pk, [product.pk for product in products], [customer.pk for customer in customers]
+
+
+def send_with_retries(stats, rng, config, send):
+    """
+    Выполняет запрос, повторяя его при ошибках блокировок БД; None, если попытки кончились
+    """
+    for attempt in range(config.max_retries + 1):
+        start = time.perf_counter()
+        try:
+            response = send()
+        except OperationalError:
+            stats.latencies.append(time.perf_counter() - start)
+            stats.lock_errors += 1
+            if attempt == config.max_retries:
+                stats.gave_up += 1
+                return None
+            stats.retries += 1
+            time.sleep(rng.uniform(0, 0.01 * 2 ** attempt))
+            continue
+        stats.latencies.append(time.perf_counter() - start)
+        return response
+
+
+def place_orders(worker_id, config, shop_id, product_ids, customer_id):
+    stats = WorkerStats()
+    rng = random.Random(config.seed * 1000 + worker_id)
+    client = APIClient()
+    token = RevocableRefreshToken.for_user(CustomUser.objects.get(pk=customer_id)).access_token
+    client.credentials(HTTP_AUTHORIZATION=f'Bearer {token}')
+    url = reverse('order-list-create')
+
+    with connection.execute_wrapper(StockUpdateTimer(stats)):
+        for _ in range(config.orders_per_worker):
+            items = [
+                {'product_id': product_id, 'shop_id': shop_id, 'quantity': rng.randint(1, config.max_quantity)}
+                for product_id in rng.sample(product_ids, rng.randint(1, len(product_ids)))
+            ]
+            response = send_with_retries(stats, rng, config, lambda: client.post(url, {'items': items}, format='json'))
+            if response is None:
+                continue
+            if response.status_code == 201:
+                stats.created += 1
+            elif response.status_code == 400 and 'items' in response.data:
+                stats.out_of_stock += 1
+                continue
+            else:
+                stats.failed += 1
+                continue
+
+            if rng.random() < config.cancel_rate:
+                status_url = reverse('order-status-update', args=[response.data['order_id']])
+                response = send_with_retries(
+                    stats, rng, config, lambda: client.patch(status_url, {'status': 'cancelled'}, format='json')
+                )
+                if response is not None and response.status_code == 200:
+                    stats.cancelled += 1
+                elif response is not None:
+                    stats.failed += 1
+    connection.close()
+    return stats
+
+
+def read_catalog(reader_id, config, shop_id):
+    stats = WorkerStats()
+    client = APIClient()
+    urls = [reverse('shop-with-products', args=[shop_id]), reverse('location-list')]
+    for i in range(config.reads_per_reader):
+        start = time.perf_counter()
+        try:
+            response = client.get(urls[(reader_id + i) % len(urls)])
+        except OperationalError:
+            stats.read_errors += 1
+        else:
+            if response.status_code != 200:
+                stats.read_errors += 1
+        stats.read_latencies.append(time.perf_counter() - start)
+    connection.close()
+    return stats
+
+
+def _process_worker(job):
+    func, args = job
+    return func(*args)
+
+
+def run_storm(config):
+    """
+    Запускает шторм на текущей базе и возвращает отчет с инвариантами
+    """
+    shop_id, product_ids, customer_ids = prepare(config)
+    jobs = [
+        (place_orders, (worker_id, config, shop_id, product_ids, customer_ids[worker_id]))
+        for worker_id in range(config.workers)
+    ] + [
+        (read_catalog, (reader_id, config, shop_id))
+        for reader_id in range(config.readers)
+    ]
+
+    total = WorkerStats()
+    started = time.perf_counter()
+    if config.mode == 'processes':
+        # Дочерние процессы не должны унаследовать открытые соединения родителя
+        connections.close_all()
+        with multiprocessing.get_context('fork').Pool(len(jobs)) as pool:
+            for stats in pool.map(_process_worker, jobs):
+                total.merge(stats)
+    else:
+        results = [None] * len(jobs)
+        lock = threading.Lock()
+
+        def run(index, job):
+            stats = _process_worker(job)
+            with lock:
+                results[index] = stats
+
+        threads = [threading.Thread(target=run, args=(i, job)) for i, job in enumerate(jobs)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for stats in results:
+            total.merge(stats)
+    elapsed = time.perf_counter() - started
+
+    return {
+        'config': {
+            'database': connection.vendor,
+            'engine': connection.settings_dict['ENGINE'],
+            'transaction_mode': connection.settings_dict['OPTIONS'].get('transaction_mode'),
+            'mode': config.mode,
+            'workers': config.workers,
+            'orders_per_worker': config.orders_per_worker,
+            'hot_products': config.hot_products,
+            'stock': config.stock,
+            'cancel_rate': config.cancel_rate,
+            'readers': config.readers,
+            'reads_per_reader': config.reads_per_reader,
+        },
+        'elapsed_s': round(elapsed, 3),
+        'orders_created': total.created,
+        'orders_cancelled': total.cancelled,
+        'orders_rejected_out_of_stock': total.out_of_stock,
+        'orders_failed': total.failed,
+        'lock_errors': total.lock_errors,
+        'retries': total.retries,
+        'gave_up': total.gave_up,
+        'orders_per_s': round(total.created / elapsed, 1),
+        'requests_per_s': round(len(total.latencies) / elapsed, 1),
+        'latency': summarize(total.latencies),
+        'stock_update': summarize(total.stock_update_times),
+        'reads': dict(summarize(total.read_latencies), errors=total.read_errors),
+        'invariants': check_invariants(product_ids, config.stock),
+    }
+
+
+def check_invariants(product_ids, initial_stock):
+    products = Product.objects.filter(pk__in=product_ids)
+    # Отмененные заказы вернули товары на склад
+    ordered = dict(
+        OrderItem.objects.filter(product_id__in=product_ids).exclude(order__status=Order.StatusChoices.CANCELLED)
+        .values('product_id')
+        .annotate(total=Sum('quantity')).values_list('product_id', 'total')
+    )
+    violations = []
+    for product in products:
+        total = ordered.get(product.pk, 0)
+        if product.quantity < 0:
+            violations.append(f'{product.name}: negative stock {product.quantity}')
+        if total > initial_stock:
+            violations.append(f'{product.name}: oversold, ordered {total} of {initial_stock}')
+        if initial_stock - product.quantity != total:
+            violations.append(
+                f'{product.name}: stock decreased by {initial_stock - product.quantity}, but {total} ordered'
+            )
+
+    orphaned_items = OrderItem.objects.exclude(order_id__in=Order.objects.values('pk')).count()
+    if orphaned_items:
+        violations.append(f'{orphaned_items} order items without an order')
+    empty_orders = Order.objects.annotate(items=Count('orderitem_set')).filter(items=0).count()
+    if empty_orders:
+        violations.append(f'{empty_orders} orders without items')
+    return {'ok': not violations, 'violations': violations}
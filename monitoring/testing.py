@@ -0,0 +1,176 @@
+"""
+Бюджеты SQL-запросов и проверки планов выполнения для тестов.
+
+QueryBudgetMixin проверяет, что каждый URL из urls_module укладывается в свой
+бюджет запросов и не делает N+1 на данных нескольких размеров (sizes). Бюджет
+не должен зависеть от размера данных: если с ростом данных растет и число
+запросов, тест падает с формой повторяющегося SQL и полем сериализатора.
+
+QueryPlanMixin проверяет по EXPLAIN, что горячие запросы идут по индексам:
+без полного чтения таблицы и, для упорядоченных выборок, без отдельной сортировки.
+"""
+from contextlib import contextmanager
+from importlib import import_module
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.urls import URLResolver
+
+from map.models import Location
+from orders.models import Order, OrderItem
+from products.models import Product, Shop, ShopCategory
+from .query_patterns import QueryPatternRecorder
+from .slow_queries import explain
+
+User = get_user_model()
+
+PASSWORD = 'testpass123'
+
+
+@contextmanager
+def record_query_patterns(using=DEFAULT_DB_ALIAS, threshold=None):
+    recorder = QueryPatternRecorder(threshold)
+    with connections[using].execute_wrapper(recorder):
+        yield recorder
+
+
+def url_names(urlconf):
+    """
+    Имена всех маршрутов модуля urls, включая вложенные include()
+    """
+    names = set()
+
+    def walk(patterns):
+        for pattern in patterns:
+            if isinstance(pattern, URLResolver):
+                walk(pattern.url_patterns)
+            elif pattern.name:
+                names.add(pattern.name)
+
+    walk(import_module(urlconf).urlpatterns)
+    return names
+
+
+class CatalogDataset:
+    """
+    Каталог, который растет до заданного размера. На каждую единицу размера:
+    магазин владельца и магазин другого владельца с двумя товарами и
+    локацией, заказ покупателя из обоих магазинов.
+    """
+
+    def __init__(self):
+        self.size = 0
+        self.category = ShopCategory.objects.create(name='cafe')
+        self.owner = User.objects.create_user(email='owner@test.com', password=PASSWORD)
+        self.customer = User.objects.create_user(email='customer@test.com', password=PASSWORD)
+
+    def grow_to(self, size):
+        for i in range(self.size, size):
+            # Без пароля: хеширование заметно замедлило бы рост данных
+            other_owner = User.objects.create_user(email=f'owner{i}@test.com')
+            location = Location.objects.create(name=f'Location {i}', latitude=55.75, longitude=37.61)
+            shop = self.add_shop(f'Shop {i}', self.owner, location)
+            other_shop = self.add_shop(f'Other shop {i}', other_owner, location)
+
+            order = Order.objects.create(user=self.customer)
+            for product in list(shop.product_set.all()) + list(other_shop.product_set.all()[:1]):
+                OrderItem.objects.create(order=order, product=product, shop=product.shop, quantity=1)
+
+            self.shop, self.product, self.order, self.location = shop, product, order, location
+        self.size = size
+
+    def add_shop(self, name, owner, location):
+        shop = Shop.objects.create(
+            name=name, category=self.category, address='Test Address', description='Test',
+            location=location, owner=owner
+        )
+        for j in range(2):
+            Product.objects.create(name=f'{name} product {j}', description='Test', quantity=100, price=10.0, shop=shop)
+        return shop
+
+
+class QueryBudgetMixin:
+    """
+    Подмешивается к APITestCase. budgets — {имя маршрута: максимум запросов},
+    для каждого имени нужен метод request_<имя> (дефисы заменяются на _),
+    который выполняет запрос к маршруту и возвращает ответ.
+    """
+    urls_module = None
+    budgets = {}
+    # {имя маршрута: порог повторов} для маршрутов, где одинаковые запросы повторяются по числу
+    # строк заказа, а не по размеру данных
+    repeat_thresholds = {}
+    sizes = (1, 5, 15)
+    dataset_class = CatalogDataset
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.data = self.dataset_class()
+
+    @contextmanager
+    def assertQueryBudget(self, budget, threshold=None):
+        with record_query_patterns(threshold=threshold) as recorder:
+            yield recorder
+
+        repeated = recorder.repeated()
+        if recorder.queries > budget or repeated:
+            details = '\n'.join(str(query) for query in repeated) or 'no repeated queries'
+            self.fail(f'{recorder.queries} queries (budget {budget})\n{details}')
+
+    def test_budgets_cover_urls(self):
+        """Тест: у каждого маршрута есть бюджет запросов"""
+        self.assertEqual(url_names(self.urls_module) - set(self.budgets), set())
+
+    def test_query_budgets(self):
+        """Тест: число запросов каждого маршрута не растет вместе с данными"""
+        for size in self.sizes:
+            self.data.grow_to(size)
+            for name, budget in self.budgets.items():
+                # Сбрасываем throttling и кеш владельцев, чтобы считать холодный запрос
+                cache.clear()
+                with self.subTest(url=name, size=size):
+                    request = getattr(self, f"request_{name.replace('-', '_')}")
+                    with self.assertQueryBudget(budget, self.repeat_thresholds.get(name)):
+                        response = request()
+                    self.assertLess(response.status_code, 400, getattr(response, 'data', None))
+
+
+def query_plan(queryset):
+    """
+    План выполнения запроса queryset (EXPLAIN). В PostgreSQL последовательное
+    чтение отключается, чтобы на маленьких тестовых таблицах проверялось,
+    может ли запрос вообще использовать индекс.
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+    return explain(connection, sql, params)
+
+
+def plan_problems(plan, ordered=False):
+    """
+    Строки плана с полным чтением таблицы, а при ordered=True — и с отдельной сортировкой
+    """
+    problems = []
+    for line in plan.splitlines():
+        if 'SCAN ' in line and 'USING' not in line and 'CONSTANT ROW' not in line:
+            problems.append(line.strip())
+        elif 'Seq Scan' in line:
+            problems.append(line.strip())
+        elif ordered and ('TEMP B-TREE FOR ORDER BY' in line or line.strip().startswith('Sort')):
+            problems.append(line.strip())
+    return problems
+
+
+class QueryPlanMixin:
+    def assertUsesIndexes(self, queryset, ordered=False):
+        plan = query_plan(queryset)
+        if plan is None:
+            self.skipTest(f'EXPLAIN is not supported for {connections[queryset.db].vendor}')
+        problems = [plan] if plan.startswith('EXPLAIN failed') else plan_problems(plan, ordered)
+        if problems:
+            self.fail('Query plan degraded:\n' + '\n'.join(problems) + f'\n\nSQL: {queryset.query}\n\n{plan}')
@@ -0,0 +1,392 @@
+import asyncio
+import json
+import os
+from io import StringIO
+import pstats
+import shutil
+import tempfile
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from map.models import Location
+from orders.models import Order
+from products.models import Shop, ShopCategory
+from products.serializers import ShopSerializer
+from . import benchmarks, http_load, startup, stress
+from .metrics import MetricsRegistry, FileAggregator, merge_snapshots, registry, render_prometheus
+from .query_patterns import normalize_sql
+from .slow_queries import slow_query_log
+from .testing import record_query_patterns
+
+User = get_user_model()
+
+
+class MetricsEndpointTest(TestCase):
+    def setUp(self):
+        registry.clear()
+        Location.objects.create(name='Center', latitude=55.75, longitude=37.61)
+        self.client = APIClient()
+
+    def test_request_metrics_exposed(self):
+        """Тест: /metrics содержит латентность, число запросов к БД и размер ответа по маршруту"""
+        self.client.get('/map/locations/')
+        response = self.client.get(reverse('metrics'))
+        body = response.content.decode()
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('# TYPE http_request_duration_seconds histogram', body)
+        self.assertIn('http_requests_total{method="GET",route="map/locations/",status="200"}', body)
+        self.assertIn('db_queries_per_request_bucket{method="GET",route="map/locations/",le="1"} 1', body)
+        self.assertIn('serializer_duration_seconds_total{method="GET",route="map/locations/"}', body)
+        self.assertIn('http_response_bytes_total{method="GET",route="map/locations/"}', body)
+
+    async def test_async_request_queries_counted(self):
+        """Тест: запросы к БД асинхронного view (async ORM и sync_to_async) попадают в метрики"""
+        response = await self.async_client.get('/map/locations/')
+        self.assertEqual(response.status_code, 200)
+
+        queries = [
+            h for name, labels, h in registry.snapshot()['histograms']
+            if name == 'db_queries_per_request' and ('route', 'map/locations/') in labels
+        ]
+        self.assertEqual(queries[0]['count'], 1)
+        self.assertGreater(queries[0]['sum'], 0)
+
+
+class FileAggregatorTest(SimpleTestCase):
+    def test_snapshots_merged_across_workers(self):
+        """Тест: снимки разных воркеров суммируются"""
+        worker = MetricsRegistry()
+        worker.inc('http_requests_total', {'route': 'orders/', 'method': 'GET', 'status': 200}, 3)
+        worker.observe('http_request_duration_seconds', {'route': 'orders/', 'method': 'GET'}, 0.2, (0.1, 1.0))
+
+        with tempfile.TemporaryDirectory() as directory:
+            # Снимок "другого воркера" с чужим pid и собственный снимок, который читать не нужно
+            with open(os.path.join(directory, 'metrics-0.json'), 'w') as f:
+                json.dump(worker.snapshot(), f)
+            aggregator = FileAggregator(directory)
+            aggregator.flush(worker)
+            snapshots = aggregator.read_others()
+
+        counters, histograms = merge_snapshots(snapshots + [worker.snapshot()])
+        text = render_prometheus(counters, histograms)
+
+        self.assertIn('http_requests_total{method="GET",route="orders/",status="200"} 6', text)
+        self.assertIn('http_request_duration_seconds_bucket{method="GET",route="orders/",le="1.0"} 2', text)
+        self.assertIn('http_request_duration_seconds_count{method="GET",route="orders/"} 2', text)
+
+    def test_exited_worker_removed(self):
+        """Тест: master удаляет снимок завершившегося воркера, и /metrics его больше не суммирует"""
+        from TheQutt import gunicorn_conf
+
+        worker = MetricsRegistry()
+        worker.inc('http_requests_total', {'route': 'orders/', 'method': 'GET', 'status': 200})
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS={'DIR': directory}):
+            for pid in (1000001, 1000002):
+                with open(os.path.join(directory, f'metrics-{pid}.json'), 'w') as f:
+                    json.dump(worker.snapshot(), f)
+            aggregator = FileAggregator(directory)
+
+            gunicorn_conf.child_exit(mock.Mock(), mock.Mock(pid=1000001))
+            self.assertEqual(len(aggregator.read_others()), 1)
+
+            gunicorn_conf.clear_metrics()
+            self.assertEqual(aggregator.read_others(), [])
+
+
+@override_settings(SLOW_QUERY_LOG={'ENABLED': True, 'THRESHOLD_MS': 0})
+class SlowQueryLogTest(TestCase):
+    def setUp(self):
+        slow_query_log.clear()
+        Location.objects.create(name='Center', latitude=55.75, longitude=37.61)
+        self.client = APIClient()
+
+    def test_slow_query_recorded_with_plan(self):
+        """Тест: медленный запрос сохраняется вместе с SQL и планом выполнения"""
+        self.client.get('/map/locations/')
+
+        entry = next(e for e in slow_query_log.all() if 'map_location' in e['sql'])
+        self.assertEqual(entry['path'], '/map/locations/')
+        self.assertEqual(entry['database'], 'default')
+        self.assertIn('map_location', entry['plan'])
+
+    def test_browse_requires_staff(self):
+        """Тест: журнал доступен только staff-пользователям"""
+        self.client.get('/map/locations/')
+        user = User.objects.create_user(email='user@test.com', password='testpass123')
+        self.client.force_login(user)
+        self.assertEqual(self.client.get(reverse('slow-queries')).status_code, 302)
+
+        user.is_staff = True
+        user.save()
+        response = self.client.get(reverse('slow-queries'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'map_location')
+
+
+class ProfilingTest(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.staff = User.objects.create_user(email='staff@test.com', password='testpass123', is_staff=True)
+        self.client = APIClient()
+
+    def test_staff_request_profiled(self):
+        """Тест: staff с X-Profile получает id профиля, а файл pstats сохраняется"""
+        self.client.force_authenticate(user=self.staff)
+        with override_settings(PROFILING={'DIR': self.directory}):
+            response = self.client.get('/products/shops/', HTTP_X_PROFILE='1')
+
+        path = os.path.join(self.directory, f"{response['X-Profile-Id']}.prof")
+        stats = pstats.Stats(path)
+        self.assertTrue(stats.total_calls > 0)
+
+    def test_speedscope_format(self):
+        """Тест: X-Profile: speedscope сохраняет профиль в формате speedscope"""
+        self.client.force_authenticate(user=self.staff)
+        with override_settings(PROFILING={'DIR': self.directory, 'INTERVAL': 0.0005}):
+            response = self.client.get('/products/shops/', HTTP_X_PROFILE='speedscope')
+
+        with open(os.path.join(self.directory, f"{response['X-Profile-Id']}.speedscope.json")) as f:
+            data = json.load(f)
+        self.assertEqual(data['profiles'][0]['type'], 'sampled')
+        self.assertEqual(len(data['profiles'][0]['samples']), len(data['profiles'][0]['weights']))
+
+    def test_regular_user_not_profiled(self):
+        """Тест: профиль обычного пользователя не сохраняется"""
+        user = User.objects.create_user(email='user@test.com', password='testpass123')
+        self.client.force_authenticate(user=user)
+        with override_settings(PROFILING={'DIR': self.directory}):
+            response = self.client.get('/products/shops/', HTTP_X_PROFILE='1')
+
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertEqual(os.listdir(self.directory), [])
+
+    def test_anonymous_header_ignored(self):
+        """Тест: X-Profile без staff-токена не запускает профайлер"""
+        with override_settings(PROFILING={'DIR': self.directory}), \
+                mock.patch('monitoring.profiling.make_profiler') as make_profiler:
+            response = self.client.get('/products/shops/', HTTP_X_PROFILE='1')
+            self.client.get('/products/shops/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION='Bearer invalid')
+
+        make_profiler.assert_not_called()
+        self.assertNotIn('X-Profile-Id', response)
+
+    async def test_async_path_not_profiled(self):
+        """Тест: под ASGI профиль не снимается, а X-Profile получает X-Profile-Error вместо пустого профиля"""
+        token = await sync_to_async(AccessToken.for_user)(self.staff)
+        with override_settings(PROFILING={'DIR': self.directory, 'SAMPLE_RATE': 1.0}), \
+                mock.patch('monitoring.profiling.make_profiler') as make_profiler:
+            auth = {'Authorization': f'Bearer {token}'}
+            response = await self.async_client.get('/products/shops/', headers=dict(auth, **{'X-Profile': '1'}))
+            sampled = await self.async_client.get('/products/shops/', headers=auth)
+
+        make_profiler.assert_not_called()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('X-Profile-Id', response)
+        self.assertIn('X-Profile-Error', response)
+        self.assertNotIn('X-Profile-Id', sampled)
+
+    def test_staff_jwt_profiled(self):
+        """Тест: X-Profile учитывается со staff-токеном JWT"""
+        token = AccessToken.for_user(self.staff)
+        with override_settings(PROFILING={'DIR': self.directory}):
+            response = self.client.get('/products/shops/', HTTP_X_PROFILE='1', HTTP_AUTHORIZATION=f'Bearer {token}')
+
+        self.assertTrue(os.path.exists(os.path.join(self.directory, f"{response['X-Profile-Id']}.prof")))
+
+
+class QueryPatternsTest(TestCase):
+    def test_normalize_sql(self):
+        """Тест: запросы, отличающиеся только значениями, сводятся к одной форме"""
+        self.assertEqual(
+            normalize_sql("SELECT *  FROM shop WHERE id IN (%s, %s, %s) AND name = 'a'"),
+            normalize_sql('SELECT * FROM shop WHERE id IN (%s) AND name = %s'),
+        )
+
+    def test_repeated_query_attributed_to_serializer_field(self):
+        """Тест: N+1 находится вместе с полем сериализатора, из которого он пришел"""
+        category = ShopCategory.objects.create(name='cafe')
+        for i in range(3):
+            owner = User.objects.create_user(email=f'owner{i}@test.com')
+            Shop.objects.create(name=f'Shop {i}', category=category, address='Test', description='Test', owner=owner)
+
+        with record_query_patterns() as recorder:
+            ShopSerializer(Shop.objects.all(), many=True).data
+        origins = [origin for query in recorder.repeated() for origin in query.origins]
+        self.assertIn('ShopSerializer.owner', origins)
+
+        with record_query_patterns() as recorder:
+            ShopSerializer(Shop.objects.for_serializer(), many=True).data
+        self.assertEqual(recorder.repeated(), [])
+
+
+class SeedScaleTest(TestCase):
+    def seed(self, seed):
+        call_command(
+            'seed_scale', shops=5, products_per_shop=4, users=20, orders=30, seed=seed, chunk_size=7, stdout=StringIO()
+        )
+        return sorted(
+            (
+                str(order.order_id), order.user.email, order.status, order.created_at,
+                sorted((item.product.name, item.shop.name, item.shop.owner.email, item.quantity)
+                       for item in order.orderitem_set.all())
+            )
+            for order in Order.objects.select_related('user').prefetch_related(
+                'orderitem_set__product', 'orderitem_set__shop__owner'
+            )
+        )
+
+    def clear(self):
+        for model in (Order, Shop, Location, User):
+            model.objects.all().delete()
+
+    def test_same_seed_same_data(self):
+        """Тест: один и тот же seed дает те же данные, другой seed — другие"""
+        first = self.seed(1)
+        self.assertEqual(len(first), 30)
+        self.clear()
+        self.assertEqual(self.seed(1), first)
+        self.clear()
+        self.assertNotEqual(self.seed(2), first)
+
+
+class BenchmarkSuiteTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_suite_runs_without_errors(self):
+        """Тест: бенчмарки проходят на маленьком каталоге, сценарий без ошибок и N+1"""
+        results = benchmarks.run_suite([3], repeat=2, iterations=2, seed_value=1)
+
+        self.assertEqual(set(results['serializers']['3']), {
+            'ShopSerializer', 'ProductSerializer', 'OrderReadSerializer', 'ShopOwnerOrderSerializer'
+        })
+        self.assertTrue(all(stats['queries_max'] == 0 for stats in results['serializers']['3'].values()))
+        steps = results['scenario']['3']['steps']
+        self.assertEqual(len(steps), 4)
+        self.assertTrue(all(stats['errors'] == 0 for stats in steps.values()))
+
+    def test_order_id_benchmark(self):
+        """Тест: бенчмарк id заказов вставляет строки с каждым генератором и убирает их за собой"""
+        results = benchmarks.benchmark_order_ids(rows=30, batch_size=10)
+
+        self.assertEqual(set(results), {'uuid4', 'uuid7'})
+        self.assertTrue(all(stats['rows'] == 30 and stats['count'] == 3 for stats in results.values()))
+        self.assertFalse(Order.objects.exists())
+
+    def test_middleware_benchmark(self):
+        """Тест: сравнение middleware меряет полный и облегченный набор на каждом пути"""
+        results = benchmarks.benchmark_middleware(repeat=3)
+
+        self.assertEqual(len(results), 2)
+        for stats in results.values():
+            self.assertEqual(stats['full']['count'], 3)
+            self.assertEqual(stats['lean']['count'], 3)
+            self.assertIn('saved_us', stats)
+
+    def test_compare_reports_regressions(self):
+        """Тест: сравнение находит рост латентности выше порога и рост числа запросов"""
+        baseline = {'scenario': {'10': {'steps': {'GET /': {'p95_ms': 10.0, 'p50_ms': 5.0, 'queries_max': 2}}}}}
+        current = {'scenario': {'10': {'steps': {'GET /': {'p95_ms': 12.0, 'p50_ms': 5.2, 'queries_max': 3}}}}}
+
+        regressions = benchmarks.compare(baseline, current, threshold=10)
+
+        self.assertEqual([path for path, *_ in regressions], [
+            'scenario.10.steps.GET /.p95_ms', 'scenario.10.steps.GET /.queries_max'
+        ])
+
+
+class HttpLoadTest(SimpleTestCase):
+    def test_non_2xx_counted_as_errors(self):
+        """Тест: ответы не 2xx считаются ошибками и не попадают в латентность"""
+        async def run():
+            async def handle(reader, writer):
+                request_line = await reader.readline()
+                await reader.readuntil(b'\r\n\r\n')
+                status = b'200 OK' if b' /ok ' in request_line else b'503 Service Unavailable'
+                writer.write(b'HTTP/1.1 ' + status + b'\r\nContent-Length: 0\r\nConnection: close\r\n\r\n')
+                await writer.drain()
+                writer.close()
+
+            server = await asyncio.start_server(handle, '127.0.0.1', 0)
+            port = server.sockets[0].getsockname()[1]
+            async with server:
+                return await http_load._run_level(port, ['/ok', '/busy'], 2, 2, slow_ms=0, timeout=5)
+
+        result = asyncio.run(run())
+
+        self.assertEqual((result['requests'], result['errors'], result['count']), (4, 2, 2))
+        self.assertEqual(http_load.error_rate(result), 0.5)
+        self.assertEqual(http_load.server_env()['ADMISSION_CONTROL'], '0')
+
+
+class OrderStormTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_storm_does_not_oversell(self):
+        """Тест: параллельные заказы не продают больше остатка, инварианты склада соблюдены"""
+        config = stress.StormConfig(
+            workers=3, orders_per_worker=6, hot_products=2, stock=10, max_quantity=2, readers=2, reads_per_reader=4
+        )
+        with self.assertLogs('django.request', 'WARNING'):
+            report = stress.run_storm(config)
+
+        self.assertEqual(report['invariants'], {'ok': True, 'violations': []})
+        self.assertEqual(report['orders_failed'], 0)
+        self.assertGreater(report['orders_created'], 0)
+        # Ошибки чтения не проверяются: тестовая база в памяти с общим кэшем блокирует таблицы целиком
+        self.assertEqual(report['reads']['count'], 8)
+        self.assertGreater(report['orders_rejected_out_of_stock'], 0)
+
+    def test_cancellations_return_stock(self):
+        """Тест: отмененные в шторме заказы возвращают товары на склад"""
+        config = stress.StormConfig(workers=2, orders_per_worker=6, hot_products=2, stock=50, cancel_rate=0.5)
+        report = stress.run_storm(config)
+
+        self.assertEqual(report['invariants'], {'ok': True, 'violations': []})
+        self.assertGreater(report['orders_cancelled'], 0)
+
+
+class StartupProfileTest(SimpleTestCase):
+    def test_parse_importtime(self):
+        """Тест: строки -X importtime разбираются с глубиной вложенности и группируются по пакетам"""
+        rows = startup.parse_importtime(
+            'import time: self [us] | cumulative | imported package\n'
+            'import time:       120 |        120 |   django.utils.version\n'
+            'import time:       300 |        420 | django\n'
+            'import time:        50 |         50 | yaml\n'
+        )
+        self.assertEqual(rows[0], {'module': 'django.utils.version', 'self_us': 120, 'cumulative_us': 120, 'depth': 1})
+        self.assertEqual(startup.by_package(rows), {'django': 420, 'yaml': 50})
+
+    def test_command_reports_stages_and_budget(self):
+        """Тест: startup_profile пишет этапы старта и падает при превышении бюджета"""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        path = os.path.join(directory, 'startup.json')
+        out = StringIO()
+        call_command('startup_profile', '--top', '3', '--output', path, stdout=out)
+        with open(path) as f:
+            report = json.load(f)
+        self.assertEqual(list(report['stages_ms']), ['settings', 'setup', 'urls', 'wsgi'])
+        self.assertTrue(any(row['module'] == 'products.views' for row in report['imports']))
+        self.assertIn('Slowest imports', out.getvalue())
+
+        with self.assertRaisesMessage(CommandError, 'budget'):
+            call_command('startup_profile', '--budget-ms', '1', stdout=StringIO())
+
+    def test_dev_apps_only_in_debug(self):
+        """Тест: с DJANGO_DEBUG=0 приложения для разработки не устанавливаются"""
+        report = startup.profile_startup(settings.BASE_DIR, {'DJANGO_DEBUG': '0'})
+        self.assertFalse(any(row['module'].startswith('django_extensions') for row in report['imports']))
@@ -0,0 +1,32 @@
+from django.contrib import admin
+from django.contrib.admin.views.decorators import staff_member_required
+from django.http import HttpResponse
+from django.shortcuts import render
+
+from .metrics import collect
+from .slow_queries import get_setting, slow_query_log
+
+
+def metrics(request):
+    """
+    Метрики всех воркеров в текстовом формате Prometheus
+    """
+    return HttpResponse(collect(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+@staff_member_required
+def slow_queries(request):
+    """
+    Просмотр журнала медленных запросов этого воркера (только для staff)
+    """
+    if request.method == 'POST' and 'clear' in request.POST:
+        slow_query_log.clear()
+
+    context = {
+        **admin.site.each_context(request),
+        'title': 'Slow queries',
+        'entries': slow_query_log.all(),
+        'enabled': get_setting('ENABLED'),
+        'threshold_ms': get_setting('THRESHOLD_MS'),
+    }
+    return render(request, 'monitoring/slow_queries.html', context)
@@ -31,6 +31,7 @@ class OrderAdmin(admin.ModelAdmin):
         'status_color'
     ]
     list_filter = ['status', 'created_at']
+    ordering = ['-created_at']
     search_fields = ['order_id', 'user__email', 'user__first_name', 'user__last_name']
     readonly_fields = ['order_id', 'created_at', 'total_amount_display']
     inlines = [OrderItemInline]
@@ -0,0 +1,65 @@
+"""
+Идентификаторы заказов, упорядоченные по времени (UUID версии 7, RFC 9562).
+
+Старшие 48 бит — миллисекунды Unix-времени, поэтому новые заказы попадают в
+правый край индекса первичного ключа, а не в случайное место B-дерева, и
+сортировка по order_id совпадает с порядком создания. Формат остается обычным
+UUID, так что URL вида /orders/<uuid:order_id>/ не меняются.
+"""
+import secrets
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+
+_lock = threading.Lock()
+_last_ms = 0
+_counter = 0
+
+COUNTER_MAX = 0xFFF
+
+
+def build_uuid7(ms, counter, tail):
+    """
+    UUID из 48 бит времени, 12 бит rand_a и 62 бит rand_b с битами версии и варианта
+    """
+    return uuid.UUID(int=(
+        (ms & 0xFFFF_FFFF_FFFF) << 80
+        | 0x7 << 76
+        | (counter & COUNTER_MAX) << 64
+        | 0b10 << 62
+        | tail & ((1 << 62) - 1)
+    ))
+
+
+def uuid7():
+    """
+    Новый UUIDv7. Внутри одной миллисекунды rand_a работает как счетчик, поэтому
+    id одного процесса строго возрастают, даже если часы отошли назад.
+    """
+    global _last_ms, _counter
+    ms = time.time_ns() // 1_000_000
+    with _lock:
+        if ms > _last_ms:
+            # Счетчик стартует со случайного значения в нижней половине, чтобы оставался запас
+            _last_ms, _counter = ms, secrets.randbits(11)
+        else:
+            _counter += 1
+            if _counter > COUNTER_MAX:
+                _last_ms, _counter = _last_ms + 1, 0
+        ms, counter = _last_ms, _counter
+    return build_uuid7(ms, counter, secrets.randbits(62))
+
+
+def uuid7_at(moment, rng):
+    """
+    UUIDv7 для заданного момента со случайными битами из rng (для детерминированных данных)
+    """
+    return build_uuid7(int(moment.timestamp() * 1000), rng.getrandbits(12), rng.getrandbits(62))
+
+
+def uuid7_datetime(value):
+    """
+    Момент создания из UUIDv7 (с точностью до миллисекунды)
+    """
+    return datetime.fromtimestamp((value.int >> 80) / 1000, tz=timezone.utc)
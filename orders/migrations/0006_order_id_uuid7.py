@@ -0,0 +1,19 @@
+# Generated by Django 5.2.4 on 2026-10-18 22:53
+
+import orders.ids
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_composite_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='order_id',
+            field=models.UUIDField(default=orders.ids.uuid7, editable=False, primary_key=True, serialize=False),
+        ),
+    ]
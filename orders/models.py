@@ -1,7 +1,23 @@
-import uuid
 from django.db import models
 from products.models import Product, Shop
 from users.models import CustomUser
+from .ids import uuid7
+
+class OrderQuerySet(models.QuerySet):
+    def for_read_serializer(self):
+        """
+        Загружает все, что читает OrderReadSerializer
+        """
+        return self.select_related('user').prefetch_related('orderitem_set__product', 'orderitem_set__shop')
+
+    def for_shop_owner_serializer(self):
+        """
+        Загружает все, что читает ShopOwnerOrderSerializer, включая вложенный ShopSerializer
+        """
+        return self.select_related('user').prefetch_related(
+            models.Prefetch('orderitem_set__product', queryset=Product.objects.select_related('shop')),
+            models.Prefetch('orderitem_set__shop', queryset=Shop.objects.for_serializer()),
+        )
 
 class Order(models.Model):
     class StatusChoices(models.TextChoices):
@@ -12,8 +28,10 @@ class Order(models.Model):
         DELIVERED = "delivered", "Доставлен"
         CANCELLED = "cancelled", "Отменен"
 
-    order_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True)
+    # UUIDv7: новые заказы дописываются в конец индекса первичного ключа
+    order_id = models.UUIDField(primary_key=True, default=uuid7, editable=False)
+    # Индекс по user покрывает составной order_user_created_idx
+    user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, null=True, blank=True, db_index=False)
     created_at = models.DateTimeField(auto_now_add=True)
     status = models.CharField(
         choices=StatusChoices.choices,
@@ -21,6 +39,18 @@ class Order(models.Model):
         max_length=20,
     )
 
+    objects = OrderQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # Заказы покупателя, новые первыми
+            models.Index(fields=['user', '-created_at'], name='order_user_created_idx'),
+            # Фильтр по статусу в админке
+            models.Index(fields=['status', '-created_at'], name='order_status_created_idx'),
+            # Сортировка списков в админке и у владельца магазина
+            models.Index(fields=['-created_at'], name='order_created_idx'),
+        ]
+
     def __str__(self):
         return f"Order #{self.order_id} by {self.user.get_full_name()}"
 
@@ -29,10 +59,19 @@ class Order(models.Model):
         return self.orderitem_set.all()
 
 class OrderItem(models.Model):
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='orderitem_set')
+    # Индексы по order и shop покрывают составные индексы ниже
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='orderitem_set', db_index=False)
     quantity = models.PositiveIntegerField()
     product = models.ForeignKey(Product, on_delete=models.CASCADE)
-    shop = models.ForeignKey(Shop, on_delete=models.CASCADE)
+    shop = models.ForeignKey(Shop, on_delete=models.CASCADE, db_index=False)
+
+    class Meta:
+        indexes = [
+            # Заказы магазина (JOIN по shop_id с DISTINCT по заказу) читаются только из индекса
+            models.Index(fields=['shop', 'order'], name='orderitem_shop_order_idx'),
+            # Позиции заказа и магазины заказа (OrderUpdateView)
+            models.Index(fields=['order', 'shop'], name='orderitem_order_shop_idx'),
+        ]
 
     def __str__(self):
         return f"{self.quantity}x {self.product.name} from {self.shop.name}"
@@ -1,8 +1,12 @@
+import logging
+from django.db import transaction
+from django.db.models import F
 from rest_framework import serializers
 from .models import Order, OrderItem
 from products.serializers import ProductSerializer, ShopSerializer
-from products.models import *
-from users.serializers import CustomUserSerializer
+from products.models import Product, Shop
+
+logger = logging.getLogger(__name__)
 
 class OrderItemReadSerializer(serializers.ModelSerializer):
     product_name = serializers.CharField(source='product.name', read_only=True)
@@ -57,7 +61,7 @@ class OrderItemWriteSerializer(serializers.ModelSerializer):
         fields = ['product_id', 'shop_id', 'quantity']
 
     def validate(self, data):
-        print(f"OrderItemWriteSerializer validate called with: {data}")
+        logger.debug("OrderItemWriteSerializer validate called with: %s", data)
         
         # Проверяем, что все необходимые поля присутствуют
         if 'product' not in data:
@@ -71,91 +75,144 @@ class OrderItemWriteSerializer(serializers.ModelSerializer):
         if data['quantity'] <= 0:
             raise serializers.ValidationError("Quantity must be positive")
         
-        print(f"✅ OrderItemWriteSerializer validation passed")
+        logger.debug("OrderItemWriteSerializer validation passed")
         return data
 
     def to_internal_value(self, data):
-        print(f"OrderItemWriteSerializer to_internal_value called with: {data}")
+        logger.debug("OrderItemWriteSerializer to_internal_value called with: %s", data)
         result = super().to_internal_value(data)
-        print(f"OrderItemWriteSerializer to_internal_value result: {result}")
+        logger.debug("OrderItemWriteSerializer to_internal_value result: %s", result)
         return result
 
     def create(self, validated_data):
-        print(f"OrderItemWriteSerializer create called with: {validated_data}")
+        logger.debug("OrderItemWriteSerializer create called with: %s", validated_data)
         try:
             result = super().create(validated_data)
-            print(f"✅ OrderItemWriteSerializer create result: {result}")
+            logger.debug("OrderItemWriteSerializer create result: %s", result)
             return result
         except Exception as e:
-            print(f"❌ Error in OrderItemWriteSerializer.create: {e}")
-            print(f"❌ Error type: {type(e)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.debug("Error in OrderItemWriteSerializer.create: %s", e, exc_info=True)
             raise
 
 
+def reserve_stock(items_data):
+    """
+    Списывает остаток товаров заказа условным UPDATE (quantity >= заказанного),
+    поэтому параллельные заказы не уводят остаток в минус. Товары обновляются
+    в порядке id, чтобы встречные заказы не блокировали друг друга.
+    Вызывать внутри transaction.atomic: при нехватке товара списанное откатится.
+    """
+    for item_data in sorted(items_data, key=lambda item: item['product'].pk):
+        product = item_data['product']
+        updated = Product.objects.filter(pk=product.pk, quantity__gte=item_data['quantity']).update(
+            quantity=F('quantity') - item_data['quantity']
+        )
+        if not updated:
+            raise serializers.ValidationError({'items': [f'Not enough stock for product {product.name}']})
+
+
+# Товары выданных и уже отмененных заказов на склад не возвращаются
+KEEPS_STOCK = (Order.StatusChoices.CANCELLED, Order.StatusChoices.DELIVERED)
+
+
+def release_stock(order):
+    """
+    Возвращает на склад товары заказа (F('quantity') + n в порядке id, как reserve_stock).
+    Вызывать внутри transaction.atomic
+    """
+    quantities = {}
+    for product_id, quantity in OrderItem.objects.filter(order=order).values_list('product_id', 'quantity'):
+        quantities[product_id] = quantities.get(product_id, 0) + quantity
+    for product_id in sorted(quantities):
+        Product.objects.filter(pk=product_id).update(quantity=F('quantity') + quantities[product_id])
+
+
+def change_status(order, new_status):
+    """
+    Меняет статус заказа. Отмена возвращает товары на склад (кроме выданного заказа — KEEPS_STOCK),
+    выход из отмены снова их списывает. Статус меняется условным UPDATE от текущего значения
+    в базе, поэтому при параллельных запросах остаток двигает только тот, чей UPDATE прошел
+    """
+    cancelled = Order.StatusChoices.CANCELLED
+    with transaction.atomic():
+        orders = Order.objects.filter(pk=order.pk)
+        if new_status == cancelled:
+            if orders.exclude(status__in=KEEPS_STOCK).update(status=new_status):
+                release_stock(order)
+            else:
+                # Выданный заказ уже израсходовал товары, отмененный — уже вернул
+                orders.update(status=new_status)
+        elif not orders.exclude(status=cancelled).update(status=new_status):
+            # Заказ был отменен (или удален — тогда позиций нет и списывать нечего)
+            orders.update(status=new_status)
+            reserve_stock([
+                {'product': item.product, 'quantity': item.quantity}
+                for item in OrderItem.objects.filter(order=order).select_related('product')
+            ])
+    order.status = new_status
+    return order
+
+
 class OrderWriteSerializer(serializers.ModelSerializer):
     items = OrderItemWriteSerializer(many=True)
 
     class Meta:
         model = Order
-        fields = ['items']
+        fields = ['order_id', 'items']
+        read_only_fields = ['order_id']
 
     def create(self, validated_data):
-        print(f"OrderWriteSerializer create called with data: {validated_data}")
+        logger.debug("OrderWriteSerializer create called with data: %s", validated_data)
         items_data = validated_data.pop('items')
-        print(f"Items data: {items_data}")
+        logger.debug("Items data: %s", items_data)
 
         user = self.context.get('request').user if self.context.get('request') else None
-        print(f"User from context: {user}")
+        logger.debug("User from context: %s", user)
 
         validated_data.pop('user', None)
         
-        # Валидация данных перед созданием
-        for i, item_data in enumerate(items_data):
-            print(f"Validating item {i+1}: {item_data}")
-            if 'product' not in item_data:
-                print(f"❌ Missing product in item {i+1}")
-            if 'shop' not in item_data:
-                print(f"❌ Missing shop in item {i+1}")
-            if 'quantity' not in item_data:
-                print(f"❌ Missing quantity in item {i+1}")
+        # Валидация данных перед созданием (только диагностика в DEBUG)
+        if logger.isEnabledFor(logging.DEBUG):
+            for i, item_data in enumerate(items_data):
+                logger.debug("Validating item %s: %s", i+1, item_data)
+                for field in ('product', 'shop', 'quantity'):
+                    if field not in item_data:
+                        logger.debug("Missing %s in item %s", field, i+1)
         
         try:
-            order = Order.objects.create(
-                user=user,
-                **validated_data
-            )
-            print(f"✅ Order created: {order.order_id}")
-
-            for item_data in items_data:
-                print(f"Creating order item: {item_data}")
-                order_item = OrderItem.objects.create(order=order, **item_data)
-                print(f"✅ Order item created: {order_item.id}")
+            with transaction.atomic():
+                reserve_stock(items_data)
+                order = Order.objects.create(
+                    user=user,
+                    **validated_data
+                )
+                logger.debug("Order created: %s", order.order_id)
+
+                for item_data in items_data:
+                    logger.debug("Creating order item: %s", item_data)
+                    order_item = OrderItem.objects.create(order=order, **item_data)
+                    logger.debug("Order item created: %s", order_item.id)
 
             return order
         except Exception as e:
-            print(f"❌ Error in OrderWriteSerializer.create: {e}")
-            print(f"❌ Error type: {type(e)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.debug("Error in OrderWriteSerializer.create: %s", e, exc_info=True)
             raise
 
     def validate(self, data):
-        print(f"OrderWriteSerializer validate called with: {data}")
+        logger.debug("OrderWriteSerializer validate called with: %s", data)
         result = super().validate(data)
-        print(f"OrderWriteSerializer validate result: {result}")
+        logger.debug("OrderWriteSerializer validate result: %s", result)
         return result
 
     def validate_items(self, value):
-        print(f"OrderWriteSerializer validate_items called with: {value}")
+        logger.debug("OrderWriteSerializer validate_items called with: %s", value)
         
         if not value:
             raise serializers.ValidationError("Order must contain at least one item.")
         
         # Проверяем каждый элемент
         for i, item in enumerate(value):
-            print(f"Validating item {i+1}: {item}")
+            logger.debug("Validating item %s: %s", i+1, item)
             if not isinstance(item, dict):
                 raise serializers.ValidationError(f"Item {i+1} must be an object")
             
@@ -0,0 +1,12 @@
+from django.db.models.signals import pre_delete
+from django.dispatch import receiver
+
+from .models import Order
+from .serializers import KEEPS_STOCK, release_stock
+
+
+@receiver(pre_delete, sender=Order)
+def release_deleted_order_stock(sender, instance, **kwargs):
+    # pre_delete: позиции заказа еще не удалены каскадом
+    if instance.status not in KEEPS_STOCK:
+        release_stock(instance)
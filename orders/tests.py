@@ -1,8 +1,15 @@
-from django.test import TestCase
+import random
+from datetime import datetime, timezone
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase
 from django.urls import reverse
 from rest_framework.test import APITestCase, APIClient
 from rest_framework import status
 from django.contrib.auth import get_user_model
+from monitoring.testing import CatalogDataset, QueryBudgetMixin, QueryPlanMixin
+from users.tokens import RevocableRefreshToken
+from .ids import uuid7, uuid7_at, uuid7_datetime
 from .models import Order, OrderItem
 from products.models import Shop, ShopCategory, Product
 from map.models import Location
@@ -241,3 +248,229 @@ class MyShopOrderListCreateAPIViewTest(APITestCase):
         self.assertEqual(order_data['customer_info']['email'], 'customer@test.com')
         self.assertIn('shop_names', order_data)
         self.assertIn('Test Shop', order_data['shop_names'])
+
+
+class OrdersQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    urls_module = 'orders.urls'
+    budgets = {
+        'order-list-create': 4,
+        'order-detail': 4,
+        # Отмена и возврат из отмены двигают остаток: позиции заказа, UPDATE на каждый из 3 товаров, savepoint
+        'order-status-update': 11,
+        'order-update': 11,
+        'my-shop-orders': 9,
+        'shop-orders': 9,
+        'shop-orders-detail': 5,
+        'user-orders': 4,
+    }
+    # Остаток меняется отдельным UPDATE на каждый товар заказа в порядке id (3 товара в заказе CatalogDataset)
+    repeat_thresholds = {
+        'order-status-update': 4,
+        'order-update': 4,
+    }
+
+    def request_order_list_create(self):
+        self.client.force_authenticate(user=self.data.customer)
+        return self.client.get(reverse('order-list-create'))
+
+    def request_order_detail(self):
+        self.client.force_authenticate(user=self.data.customer)
+        return self.client.get(reverse('order-detail', args=[self.data.order.order_id]))
+
+    def request_order_status_update(self):
+        self.client.force_authenticate(user=self.data.customer)
+        return self.client.patch(
+            reverse('order-status-update', args=[self.data.order.order_id]), {'status': 'cancelled'}, format='json'
+        )
+
+    def request_order_update(self):
+        self.client.force_authenticate(user=self.data.owner)
+        return self.client.put(
+            reverse('order-update', args=[self.data.order.order_id]), {'status': 'confirmed'}, format='json'
+        )
+
+    def request_my_shop_orders(self):
+        self.client.force_authenticate(user=self.data.owner)
+        return self.client.get(reverse('my-shop-orders'))
+
+    def request_shop_orders(self):
+        self.client.force_authenticate(user=self.data.owner)
+        return self.client.get(reverse('shop-orders', args=[self.data.shop.id]))
+
+    def request_shop_orders_detail(self):
+        self.client.force_authenticate(user=self.data.owner)
+        return self.client.get(reverse('shop-orders-detail', args=[self.data.shop.id]))
+
+    def request_user_orders(self):
+        self.client.force_authenticate(user=self.data.customer)
+        return self.client.get(reverse('user-orders', args=[self.data.customer.id]))
+
+
+class OrderStockTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.customer = User.objects.create_user(email='customer@test.com', password='testpass123')
+        category = ShopCategory.objects.create(name='Test Category')
+        self.shop = Shop.objects.create(name='Test Shop', category=category, address='Test', description='Test')
+        self.first = Product.objects.create(name='First', description='Test', quantity=5, price=10.0, shop=self.shop)
+        self.second = Product.objects.create(name='Second', description='Test', quantity=1, price=10.0, shop=self.shop)
+        self.client.force_authenticate(user=self.customer)
+
+    def order(self, *items):
+        return self.client.post(reverse('order-list-create'), {'items': [
+            {'product_id': product.id, 'shop_id': self.shop.id, 'quantity': quantity} for product, quantity in items
+        ]}, format='json')
+
+    def test_order_reserves_stock(self):
+        """Тест: заказ списывает остаток товаров"""
+        response = self.order((self.first, 2), (self.second, 1))
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertIn('order_id', response.data)
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        self.assertEqual((self.first.quantity, self.second.quantity), (3, 0))
+
+    def test_out_of_stock_rolls_back_order(self):
+        """Тест: при нехватке одного товара заказ не создается и остатки не меняются"""
+        response = self.order((self.first, 2), (self.second, 2))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertFalse(Order.objects.exists())
+        self.first.refresh_from_db()
+        self.assertEqual(self.first.quantity, 5)
+
+    def stock(self):
+        self.first.refresh_from_db()
+        self.second.refresh_from_db()
+        return self.first.quantity, self.second.quantity
+
+    def test_cancel_returns_stock_once(self):
+        """Тест: отмена заказа возвращает товары на склад, повторная отмена — нет"""
+        order_id = self.order((self.first, 2), (self.second, 1)).data['order_id']
+        url = reverse('order-status-update', args=[order_id])
+
+        for _ in range(2):
+            response = self.client.patch(url, {'status': 'cancelled'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(self.stock(), (5, 1))
+
+    def test_cancel_delivered_keeps_stock(self):
+        """Тест: отмена выданного заказа не возвращает товары на склад"""
+        order_id = self.order((self.first, 2), (self.second, 1)).data['order_id']
+        url = reverse('order-status-update', args=[order_id])
+        self.assertEqual(self.client.patch(url, {'status': 'delivered'}, format='json').status_code, status.HTTP_200_OK)
+
+        response = self.client.patch(url, {'status': 'cancelled'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.StatusChoices.CANCELLED)
+        self.assertEqual(self.stock(), (3, 0))
+
+    def test_reopen_reserves_again(self):
+        """Тест: возврат отмененного заказа в работу снова списывает товары, если они есть"""
+        order_id = self.order((self.first, 2), (self.second, 1)).data['order_id']
+        url = reverse('order-status-update', args=[order_id])
+        self.client.patch(url, {'status': 'cancelled'}, format='json')
+
+        self.order((self.second, 1))
+        response = self.client.patch(url, {'status': 'pending'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(Order.objects.get(pk=order_id).status, Order.StatusChoices.CANCELLED)
+
+        self.second.quantity = 1
+        self.second.save()
+        self.assertEqual(self.client.patch(url, {'status': 'pending'}, format='json').status_code, status.HTTP_200_OK)
+        self.assertEqual(self.stock(), (3, 0))
+
+    def test_delete_returns_stock(self):
+        """Тест: удаление незавершенного заказа возвращает товары на склад"""
+        order_id = self.order((self.first, 2), (self.second, 1)).data['order_id']
+        Order.objects.get(pk=order_id).delete()
+        self.assertEqual(self.stock(), (5, 1))
+
+
+class OrderQueryPlanTest(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.data = CatalogDataset()
+        self.data.grow_to(3)
+
+    def test_user_orders_use_index(self):
+        """Тест: заказы пользователя читаются по (user, -created_at) без сортировки"""
+        self.assertUsesIndexes(Order.objects.filter(user=self.data.customer).order_by('-created_at'), ordered=True)
+
+    def test_status_filter_uses_index(self):
+        """Тест: фильтр по статусу в админке идет по (status, -created_at) без сортировки"""
+        self.assertUsesIndexes(Order.objects.filter(status=Order.StatusChoices.PENDING).order_by('-created_at'),
+                               ordered=True)
+
+    def test_recent_orders_use_index(self):
+        """Тест: список заказов в админке идет по -created_at без сортировки"""
+        self.assertUsesIndexes(Order.objects.order_by('-created_at'), ordered=True)
+
+    def test_shop_orders_use_index(self):
+        """Тест: заказы магазинов владельца ищутся по (shop, order)"""
+        self.assertUsesIndexes(
+            Order.objects.filter(orderitem_set__shop_id__in=[self.data.shop.pk]).distinct().order_by('-created_at')
+        )
+
+    def test_order_shops_use_index(self):
+        """Тест: магазины заказа (IsShopOwner) читаются по (order, shop)"""
+        self.assertUsesIndexes(self.data.order.orderitem_set.values_list('shop_id', flat=True).distinct())
+
+
+class OrderIdTest(SimpleTestCase):
+    def test_uuid7_layout(self):
+        """Тест: id заказа — UUID версии 7 с вариантом RFC 9562 и текущим временем"""
+        before = datetime.now(timezone.utc).replace(microsecond=0)
+        value = uuid7()
+
+        self.assertEqual(value.version, 7)
+        self.assertEqual(value.variant, 'specified in RFC 4122')
+        self.assertGreaterEqual(uuid7_datetime(value), before)
+
+    def test_uuid7_is_monotonic(self):
+        """Тест: id, созданные подряд (в том числе в одну миллисекунду), строго возрастают"""
+        values = [uuid7() for _ in range(10000)]
+        self.assertEqual(values, sorted(set(values)))
+        self.assertEqual([value.hex for value in values], sorted(value.hex for value in values))
+
+    def test_uuid7_at_is_deterministic(self):
+        """Тест: id для заданного момента зависит только от момента и rng"""
+        moment = datetime(2025, 1, 1, 12, 30, tzinfo=timezone.utc)
+
+        self.assertEqual(uuid7_at(moment, random.Random(1)), uuid7_at(moment, random.Random(1)))
+        self.assertEqual(uuid7_datetime(uuid7_at(moment, random.Random(1))), moment)
+
+    def test_order_uses_uuid7(self):
+        """Тест: новый заказ по умолчанию получает UUIDv7"""
+        self.assertEqual(Order().order_id.version, 7)
+
+
+class AsyncOrderDetailTest(APITestCase):
+    def setUp(self):
+        self.data = CatalogDataset()
+        self.data.grow_to(1)
+        self.url = reverse('order-detail', args=[self.data.order.order_id])
+
+    def authenticate(self, user):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {RevocableRefreshToken.for_user(user).access_token}')
+
+    def test_owner_reads_order(self):
+        """Тест: покупатель с JWT получает заказ из асинхронного view в том же виде, что и из DRF"""
+        self.authenticate(self.data.customer)
+        with self.assertNumQueries(5):
+            response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), self.client.get(self.url, {'format': 'json'}).json())
+
+    def test_foreign_order_not_found(self):
+        """Тест: чужой заказ — 404"""
+        self.authenticate(self.data.owner)
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_anonymous_rejected_by_drf(self):
+        """Тест: без токена и с невалидным токеном отвечает DRF с 401"""
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer invalid')
+        self.assertEqual(self.client.get(self.url).status_code, status.HTTP_401_UNAUTHORIZED)
@@ -1,7 +1,7 @@
 from django.urls import path
 from .views import (
     OrderListCreateView, 
-    OrderDetailView, 
+    AsyncOrderDetailView,
     OrderStatusUpdateView, 
     MyShopOrderListCreateAPIView,
     OrderUpdateView,
@@ -10,7 +10,7 @@ from .views import (
 
 urlpatterns = [
     path('', OrderListCreateView.as_view(), name='order-list-create'),
-    path('<uuid:order_id>/', OrderDetailView.as_view(), name='order-detail'),
+    path('<uuid:order_id>/', AsyncOrderDetailView.as_view(), name='order-detail'),
     path('<uuid:order_id>/status/', OrderStatusUpdateView.as_view(), name='order-status-update'),
     path('<uuid:order_id>/update/', OrderUpdateView.as_view(), name='order-update'),
     path('my-shop/', MyShopOrderListCreateAPIView.as_view(), name='my-shop-orders'),
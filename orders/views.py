@@ -1,10 +1,10 @@
 from rest_framework import generics, permissions, status, serializers
 from rest_framework.response import Response
 from rest_framework.decorators import api_view, permission_classes
-from django.shortcuts import get_object_or_404
 from .models import Order, OrderItem
-from .serializers import OrderReadSerializer, OrderWriteSerializer, ShopOwnerOrderSerializer
+from .serializers import OrderReadSerializer, OrderWriteSerializer, ShopOwnerOrderSerializer, change_status
 from products.models import Shop
+from TheQutt.async_views import AsyncReadView, aget_object_or_404
 import logging
 import traceback
 
@@ -21,7 +21,7 @@ class IsShopOwner(permissions.BasePermission):
             return False
         
         # Проверяем, что пользователь является владельцем хотя бы одного магазина
-        return Shop.objects.filter(owner=request.user).exists()
+        return bool(request.owned_shop_ids)
 
 
 @api_view(['GET'])
@@ -32,9 +32,12 @@ def shop_orders(request, shop_id):
     """
     try:
         # Проверяем, что пользователь является владельцем магазина
-        shop = get_object_or_404(Shop, id=shop_id)
-        
-        if shop.owner != request.user:
+        if shop_id not in request.owned_shop_ids:
+            if not Shop.objects.filter(id=shop_id).exists():
+                return Response(
+                    {'error': 'Shop not found'}, 
+                    status=status.HTTP_404_NOT_FOUND
+                )
             return Response(
                 {'error': 'You can only view orders for your own shops'}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -43,7 +46,7 @@ def shop_orders(request, shop_id):
         # Получаем заказы для этого магазина
         orders = Order.objects.filter(
             orderitem_set__shop_id=shop_id
-        ).distinct().prefetch_related('orderitem_set', 'orderitem_set__product', 'user')
+        ).distinct().for_read_serializer()
         
         serializer = OrderReadSerializer(orders, many=True)
         logger.info(f"User {request.user.email} requested orders for shop {shop_id}. Found {len(serializer.data)} orders.")
@@ -60,10 +63,12 @@ def shop_orders(request, shop_id):
 
 class OrderListCreateView(generics.ListCreateAPIView):
     permission_classes = [permissions.AllowAny]  # Разрешаем доступ всем
+    throttle_scope = 'orders'
+    throttle_methods = ['POST']
 
     def get_queryset(self):
         if self.request.user.is_authenticated:
-            return Order.objects.filter(user=self.request.user).prefetch_related('orderitem_set__product', 'orderitem_set__shop')
+            return Order.objects.filter(user=self.request.user).order_by('-created_at').for_read_serializer()
         else:
             return Order.objects.none()
 
@@ -73,36 +78,33 @@ class OrderListCreateView(generics.ListCreateAPIView):
         return OrderReadSerializer
 
     def perform_create(self, serializer):
-        print(f"Creating order. User: {self.request.user}, Authenticated: {self.request.user.is_authenticated}")
+        logger.debug("Creating order. User: %s, Authenticated: %s", self.request.user, self.request.user.is_authenticated)
         if self.request.user.is_authenticated:
             order = serializer.save()
-            print(f"Order created successfully: {order.order_id}")
+            logger.debug("Order created successfully: %s", order.order_id)
             return order
         else:
-            print("User not authenticated, creating order without user")
+            logger.debug("User not authenticated, creating order without user")
             order = serializer.save()
-            print(f"Order created without user: {order.order_id}")
+            logger.debug("Order created without user: %s", order.order_id)
             return order
 
     def create(self, request, *args, **kwargs):
-        print(f"Create request received. Data: {request.data}")
-        print(f"User: {request.user}, Authenticated: {request.user.is_authenticated}")
+        logger.debug("Create request received. Data: %s", request.data)
+        logger.debug("User: %s, Authenticated: %s", request.user, request.user.is_authenticated)
         
         # Детальное логирование данных
-        if 'items' in request.data:
-            print(f"Items count: {len(request.data['items'])}")
+        if logger.isEnabledFor(logging.DEBUG) and 'items' in request.data:
+            logger.debug("Items count: %s", len(request.data['items']))
             for i, item in enumerate(request.data['items']):
-                print(f"Item {i+1}: {item}")
+                logger.debug("Item %s: %s", i+1, item)
         
         try:
             response = super().create(request, *args, **kwargs)
-            print(f"✅ Order created successfully: {response.data}")
+            logger.debug("Order created successfully: %s", response.data)
             return response
         except Exception as e:
-            print(f"❌ Error creating order: {e}")
-            print(f"❌ Error type: {type(e)}")
-            import traceback
-            print(f"❌ Traceback: {traceback.format_exc()}")
+            logger.debug("Error creating order: %s", e, exc_info=True)
             raise
 
     def list(self, request, *args, **kwargs):
@@ -120,7 +122,18 @@ class OrderDetailView(generics.RetrieveAPIView):
     lookup_field = 'order_id'
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user).prefetch_related('orderitem_set__product', 'orderitem_set__shop')
+        return Order.objects.filter(user=self.request.user).for_read_serializer()
+
+
+class AsyncOrderDetailView(AsyncReadView):
+    sync_view_class = OrderDetailView
+    serializer_class = OrderReadSerializer
+    authentication_required = True
+
+    async def aget_data(self, request, order_id):
+        return await aget_object_or_404(
+            Order.objects.filter(user=request.user).for_read_serializer(), order_id=order_id
+        )
 
 
 class OrderStatusUpdateSerializer(serializers.Serializer):
@@ -133,7 +146,7 @@ class OrderStatusUpdateView(generics.UpdateAPIView):
     lookup_field = 'order_id'
 
     def get_queryset(self):
-        return Order.objects.filter(user=self.request.user)
+        return Order.objects.filter(user=self.request.user).for_read_serializer()
 
     def update(self, request, *args, **kwargs):
         order = self.get_object()
@@ -148,8 +161,7 @@ class OrderStatusUpdateView(generics.UpdateAPIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        order.status = new_status
-        order.save()
+        change_status(order, new_status)
         return Response(
             OrderReadSerializer(order, context=self.get_serializer_context()).data,
             status=status.HTTP_200_OK
@@ -159,15 +171,15 @@ class OrderUpdateView(generics.UpdateAPIView):
     queryset = Order.objects.all()
     serializer_class = OrderWriteSerializer
     permission_classes = [permissions.IsAuthenticated]
+    lookup_field = 'order_id'
     
     def update(self, request, *args, **kwargs):
         order = self.get_object()
         
         # Проверяем, что пользователь является владельцем магазина, к которому относится заказ
         shop_ids = order.orderitem_set.values_list('shop_id', flat=True).distinct()
-        user_shops = Shop.objects.filter(owner=request.user, id__in=shop_ids)
         
-        if not user_shops.exists():
+        if request.owned_shop_ids.isdisjoint(shop_ids):
             return Response(
                 {'error': 'You can only update orders for your own shops'}, 
                 status=status.HTTP_403_FORBIDDEN
@@ -175,8 +187,7 @@ class OrderUpdateView(generics.UpdateAPIView):
         
         # Обновляем только статус заказа
         if 'status' in request.data:
-            order.status = request.data['status']
-            order.save()
+            change_status(order, request.data['status'])
             logger.info(f"User {request.user.email} updated order {order.order_id} status to {order.status}")
             
             return Response({
@@ -204,17 +215,10 @@ class MyShopOrderListCreateAPIView(generics.ListCreateAPIView):
         if not self.request.user.is_authenticated:
             return Order.objects.none()
         
-        # Получаем все магазины пользователя
-        user_shops = Shop.objects.filter(owner=self.request.user)
-        
         # Получаем заказы, которые содержат товары из магазинов пользователя
         return Order.objects.filter(
-            orderitem_set__shop__in=user_shops
-        ).distinct().prefetch_related(
-            'orderitem_set__product', 
-            'orderitem_set__shop',
-            'user'
-        ).order_by('-created_at')
+            orderitem_set__shop_id__in=self.request.owned_shop_ids
+        ).distinct().for_shop_owner_serializer().order_by('-created_at')
     
     def get_serializer_class(self):
         """
@@ -229,7 +233,7 @@ class MyShopOrderListCreateAPIView(generics.ListCreateAPIView):
         Создание заказа с проверкой прав доступа
         """
         # Проверяем, что пользователь является владельцем магазина
-        if not Shop.objects.filter(owner=self.request.user).exists():
+        if not self.request.owned_shop_ids:
             raise serializers.ValidationError("Only shop owners can create orders")
         
         order = serializer.save()
@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import *
+from .models import Product, Shop, ShopCategory
 
 admin.site.register(Product)
 admin.site.register(Shop)
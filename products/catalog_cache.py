@@ -0,0 +1,67 @@
+"""
+Кэш JSON каталога для чтения из базы, когда снимок (products.snapshot)
+выключен или устарел. Значения заполняются через TheQutt.singleflight:
+после промаха магазин собирает один запрос, а не все пришедшие за ним
+одновременно.
+
+Ключи содержат версию каталога. Изменение каталога (сигналы моделей)
+увеличивает версию в своем процессе сразу и после коммита, а в остальных —
+через шину инвалидации (products.invalidation); старые значения перестают
+читаться и истекают сами. Остатки (quantity) заказы меняют через update()
+без сигналов, они отстают не больше чем на TIMEOUT.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from TheQutt import singleflight
+
+DEFAULTS = {
+    'TIMEOUT': 30,
+    'STALE_TIMEOUT': 0,
+}
+VERSION_KEY = 'catalog_cache:version'
+
+
+def get_setting(name):
+    return getattr(settings, 'CATALOG_CACHE', {}).get(name, DEFAULTS[name])
+
+
+def get_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        # Ключ мог вытеснить LocMemCache: новая версия не совпадет ни с одной прежней
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_version(entity_id=None, version=None):
+    """
+    Делает все значения каталога устаревшими; подписан на событие 'catalog' шины инвалидации
+    """
+    try:
+        cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+
+
+def get_json(section, record_id, compute):
+    """
+    JSON записи из кэша или отрендеренный результат compute()
+    """
+    def render():
+        return JSONRenderer().render(compute())
+
+    timeout = get_setting('TIMEOUT')
+    if not timeout:
+        return render()
+    key = f'catalog:{get_version()}:{section}:{record_id}'
+    return singleflight.get_or_compute(key, render, timeout, get_setting('STALE_TIMEOUT'))
+
+
+def json_response(section, record_id, compute):
+    return HttpResponse(get_json(section, record_id, compute), content_type='application/json')
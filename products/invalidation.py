@@ -0,0 +1,200 @@
+"""
+Шина инвалидации локальных кэшей между процессами.
+
+Кэши в памяти процесса (LocMemCache без REDIS_URL) не видят изменений,
+сделанных в других workers. Сигналы моделей после коммита публикуют
+событие (сущность, id) в таблицу InvalidationEvent; id события — его
+версия, она растет по всей шине. Каждый worker в фоновом потоке раз в
+POLL_INTERVAL читает события новее своей отметки (high-water mark) и
+вызывает обработчики, подписанные на сущность. Отметку worker ставит в
+start(), до первого запроса. Процесс, опубликовавший
+событие, применяет его сразу после коммита. Задержку от публикации до
+применения в других процессах пишет гистограмма
+cache_invalidation_lag_seconds (/metrics).
+
+Id выдается при вставке, а строка видна после коммита, поэтому событие
+с меньшим id может появиться позже большего. Каждый опрос заново читает
+события за последние GRACE, уже примененные пропускаются.
+
+Обработчики должны быть идемпотентны: событие значит "сбросить", а не
+"записать новое значение". Старые события удаляет
+manage.py purge_invalidation_events.
+"""
+import logging
+import os
+import threading
+from datetime import timedelta
+from functools import partial
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from monitoring.metrics import registry
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'ENABLED': True,
+    'POLL_INTERVAL': timedelta(seconds=1),
+    'GRACE': timedelta(seconds=5),
+    'RETENTION': timedelta(hours=1),
+    'PURGE_BATCH_SIZE': 10_000,
+}
+LAG_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def get_setting(name):
+    return getattr(settings, 'INVALIDATION_BUS', {}).get(name, DEFAULTS[name])
+
+
+class InvalidationBus:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._handlers = {}
+        self._high_water_mark = None
+        # id -> created_at событий из окна GRACE, уже примененных этим процессом
+        self._applied = {}
+        self._thread = None
+        self._pid = None
+        self._stopped = threading.Event()
+
+    def subscribe(self, entity, handler):
+        """
+        handler(entity_id, version) вызывается для каждого события сущности entity
+        """
+        self._handlers.setdefault(entity, []).append(handler)
+
+    def publish(self, entity, *entity_ids, using=None):
+        """
+        Публикует события после коммита текущей транзакции. Без подписчиков ничего не пишет:
+        у всех процессов одни и те же подписки
+        """
+        entity_ids = {entity_id for entity_id in entity_ids if entity_id is not None}
+        if not get_setting('ENABLED') or entity not in self._handlers or not entity_ids:
+            return
+        transaction.on_commit(partial(self._publish, entity, entity_ids), using=using, robust=True)
+
+    def _publish(self, entity, entity_ids):
+        from .models import InvalidationEvent
+
+        events = InvalidationEvent.objects.bulk_create(
+            InvalidationEvent(entity=entity, entity_id=entity_id) for entity_id in entity_ids
+        )
+        registry.inc('cache_invalidation_published_total', {'entity': entity}, len(events))
+        for event in events:
+            if event.pk is not None:
+                with self._lock:
+                    self._applied[event.pk] = event.created_at
+            self._dispatch(entity, event.entity_id, event.pk)
+
+    def _dispatch(self, entity, entity_id, version):
+        for handler in self._handlers.get(entity, ()):
+            try:
+                handler(entity_id, version)
+            except Exception:
+                logger.exception('Invalidation handler %r failed for %s:%s', handler, entity, entity_id)
+
+    def poll(self):
+        """
+        Применяет новые события других процессов; возвращает их число
+        """
+        from .models import InvalidationEvent
+
+        # С primary: задержка реплики не должна добавляться к задержке инвалидации
+        events = InvalidationEvent.objects.using(router.db_for_write(InvalidationEvent))
+        since = timezone.now() - get_setting('GRACE')
+        if self._high_water_mark is None:
+            # start() не смог прочитать отметку: события из окна GRACE применяются повторно, лишний сброс безопасен
+            with self._lock:
+                self._high_water_mark = events.aggregate(high=Max('id'))['high'] or 0
+
+        rows = events.filter(Q(id__gt=self._high_water_mark) | Q(created_at__gte=since)).order_by('id')
+        applied = 0
+        for pk, entity, entity_id, created_at in rows.values_list('id', 'entity', 'entity_id', 'created_at'):
+            with self._lock:
+                self._high_water_mark = max(self._high_water_mark, pk)
+                if pk in self._applied:
+                    continue
+                self._applied[pk] = created_at
+            self._dispatch(entity, entity_id, pk)
+            lag = max(0.0, (timezone.now() - created_at).total_seconds())
+            registry.observe('cache_invalidation_lag_seconds', {'entity': entity}, lag, LAG_BUCKETS)
+            registry.inc('cache_invalidation_applied_total', {'entity': entity})
+            applied += 1
+
+        with self._lock:
+            self._applied = {pk: created_at for pk, created_at in self._applied.items() if created_at >= since}
+        return applied
+
+    def catch_up(self):
+        """
+        Отметка нового процесса: его кэши пусты, поэтому уже видимые события применять не нужно.
+        Событие, закоммиченное позже, будет применено, даже если его id меньше отметки
+        """
+        from .models import InvalidationEvent
+
+        events = InvalidationEvent.objects.using(router.db_for_write(InvalidationEvent))
+        since = timezone.now() - get_setting('GRACE')
+        with self._lock:
+            self._applied.update(events.filter(created_at__gte=since).values_list('id', 'created_at'))
+            self._high_water_mark = events.aggregate(high=Max('id'))['high'] or 0
+
+    def start(self):
+        """
+        Запускает фоновый опрос в текущем процессе (после fork — заново); возвращает False, если уже запущен.
+        Отметка ставится до возврата, то есть до первого запроса worker
+        """
+        if not get_setting('ENABLED'):
+            return False
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return False
+        try:
+            self.catch_up()
+        except Exception:
+            logger.exception('Invalidation bus could not read the high-water mark, the first poll will set it')
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid():
+                return False
+            self._pid = os.getpid()
+            self._stopped = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(self._stopped,), name='invalidation-bus', daemon=True)
+            self._thread.start()
+        return True
+
+    def stop(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+            self._stopped.set()
+        if thread is not None and thread is not threading.current_thread():
+            thread.join()
+
+    def _run(self, stopped):
+        interval = get_setting('POLL_INTERVAL').total_seconds()
+        while not stopped.wait(interval):
+            try:
+                self.poll()
+            except Exception:
+                logger.exception('Invalidation bus poll failed')
+            finally:
+                close_old_connections()
+
+    def purge(self):
+        """
+        Удаляет события старше RETENTION пачками по PURGE_BATCH_SIZE
+        """
+        from .models import InvalidationEvent
+
+        batch_size = get_setting('PURGE_BATCH_SIZE')
+        old = InvalidationEvent.objects.filter(created_at__lt=timezone.now() - get_setting('RETENTION'))
+        deleted = 0
+        while True:
+            ids = list(old.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += InvalidationEvent.objects.filter(id__in=ids).delete()[0]
+
+
+bus = InvalidationBus()
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from products.invalidation import bus
+
+
+class Command(BaseCommand):
+    help = 'Удаляет события шины инвалидации старше INVALIDATION_BUS["RETENTION"]'
+
+    def handle(self, *args, **options):
+        deleted = bus.purge()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} invalidation events'))
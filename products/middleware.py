@@ -0,0 +1,25 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.utils.functional import SimpleLazyObject
+
+from .ownership import get_owned_shop_ids
+
+
+class OwnedShopsMiddleware:
+    """
+    Добавляет request.owned_shop_ids — id магазинов текущего пользователя.
+
+    Значение вычисляется лениво при первом обращении, то есть уже после
+    JWT-аутентификации в DRF, и дальше переиспользуется всеми проверками прав.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        request.owned_shop_ids = SimpleLazyObject(lambda: get_owned_shop_ids(request.user))
+        # В async-режиме get_response возвращает корутину, ее дождется Django
+        return self.get_response(request)
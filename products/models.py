@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils import timezone
 from map.models import Location
 from users.models import CustomUser
 
@@ -8,6 +9,15 @@ class ShopCategory(models.Model):
     def __str__(self):
         return self.name
 
+class ShopQuerySet(models.QuerySet):
+    def for_serializer(self):
+        """
+        Загружает все, что читает ShopSerializer: категорию, локацию, владельца и его магазины
+        """
+        return self.select_related('category', 'location', 'owner').prefetch_related(
+            models.Prefetch('owner__shops', queryset=Shop.objects.select_related('category'))
+        )
+
 class Shop(models.Model):
     name = models.CharField(max_length=255)
     category = models.ForeignKey(ShopCategory, on_delete=models.CASCADE)
@@ -16,7 +26,17 @@ class Shop(models.Model):
     location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='shops', null=True, blank=True)
     picture = models.ImageField(upload_to='shop_pictures/', null=True, blank=True)
     opening_hours = models.CharField(max_length=255, null=True, blank=True)
-    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='shops', null=True, blank=True)
+    # Индекс по owner покрывает составной shop_owner_id_idx
+    owner = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='shops', null=True, blank=True,
+                              db_index=False)
+
+    objects = ShopQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # id магазинов владельца (get_owned_shop_ids) читаются только из индекса
+            models.Index(fields=['owner', 'id'], name='shop_owner_id_idx'),
+        ]
 
     def __str__(self):
         return self.name
@@ -31,3 +51,16 @@ class Product(models.Model):
 
     def __str__(self):
         return self.name
+
+
+class InvalidationEvent(models.Model):
+    """
+    Событие шины инвалидации (products.invalidation): сбросить кэши сущности entity с id entity_id.
+    id события — его версия
+    """
+    entity = models.CharField(max_length=32)
+    entity_id = models.BigIntegerField()
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    def __str__(self):
+        return f'{self.entity}:{self.entity_id}@{self.pk}'
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.cache import cache
+
+CACHE_KEY = 'owned_shop_ids:{}'
+
+
+def get_owned_shop_ids(user):
+    """
+    Возвращает frozenset id магазинов пользователя (из кэша, если есть)
+    """
+    if not user.is_authenticated:
+        return frozenset()
+
+    key = CACHE_KEY.format(user.pk)
+    shop_ids = cache.get(key)
+    if shop_ids is None:
+        from .models import Shop
+
+        shop_ids = frozenset(Shop.objects.filter(owner_id=user.pk).values_list('id', flat=True))
+        cache.set(key, shop_ids, getattr(settings, 'OWNED_SHOPS_CACHE_TIMEOUT', 300))
+    return shop_ids
+
+
+def invalidate_owned_shop_ids(*user_ids):
+    cache.delete_many([CACHE_KEY.format(user_id) for user_id in user_ids if user_id is not None])
+
+
+def owns_shop(request, shop_id):
+    """
+    Проверяет, принадлежит ли магазин shop_id (int или строка из request.data) пользователю
+    """
+    try:
+        return int(shop_id) in request.owned_shop_ids
+    except (TypeError, ValueError):
+        return False
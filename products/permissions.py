@@ -1,5 +1,14 @@
 from rest_framework import permissions
 from products.models import Shop
+from products.ownership import owns_shop
+
+
+def owns_object(request, obj):
+    if isinstance(obj, Shop):
+        return obj.pk in request.owned_shop_ids
+    elif hasattr(obj, 'shop_id'):
+        return obj.shop_id in request.owned_shop_ids
+    return False
 
 
 class IsAdminUser(permissions.BasePermission):
@@ -19,11 +28,7 @@ class IsOwnerOfShop(permissions.BasePermission):
         return request.user.is_authenticated
     
     def has_object_permission(self, request, view, obj):
-        if hasattr(obj, 'owner'):
-            return obj.owner == request.user
-        elif hasattr(obj, 'shop'):
-            return obj.shop.owner == request.user
-        return False
+        return owns_object(request, obj)
 
 
 class IsShopOwnerOrReadOnly(permissions.BasePermission):
@@ -37,11 +42,7 @@ class IsShopOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        if hasattr(obj, 'owner'):
-            return obj.owner == request.user
-        elif hasattr(obj, 'shop'):
-            return obj.shop.owner == request.user
-        return False
+        return owns_object(request, obj)
 
 
 class IsProductOwnerOrReadOnly(permissions.BasePermission):
@@ -55,7 +56,7 @@ class IsProductOwnerOrReadOnly(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        return obj.shop.owner == request.user
+        return obj.shop_id in request.owned_shop_ids
 
 
 class IsShopOwnerForProduct(permissions.BasePermission):
@@ -70,11 +71,7 @@ class IsShopOwnerForProduct(permissions.BasePermission):
         if request.method == 'POST':
             shop_id = request.data.get('shop')
             if shop_id:
-                try:
-                    shop = Shop.objects.get(id=shop_id)
-                    return shop.owner == request.user
-                except Shop.DoesNotExist:
-                    return False
+                return owns_shop(request, shop_id)
         
         return True
     
@@ -82,7 +79,7 @@ class IsShopOwnerForProduct(permissions.BasePermission):
         if request.method in permissions.SAFE_METHODS:
             return True
 
-        return obj.shop.owner == request.user
+        return obj.shop_id in request.owned_shop_ids
 
 
 class IsAdminOrReadOnly(permissions.BasePermission):
@@ -124,7 +124,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
     def validate_shop(self, value):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            if value.owner != request.user:
+            if value.pk not in request.owned_shop_ids:
                 raise serializers.ValidationError("You can only add products to your own shops")
         return value
 
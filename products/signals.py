@@ -0,0 +1,82 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from map.models import Location
+from users.models import CustomUser
+from .models import Product, Shop, ShopCategory
+from .invalidation import bus
+from .ownership import get_owned_shop_ids, invalidate_owned_shop_ids
+from .serializers import ShopOwnerSerializer
+from . import catalog_cache, snapshot
+
+
+def drop_owned_shop_ids(user_id, version):
+    invalidate_owned_shop_ids(user_id)
+
+
+bus.subscribe('owned_shops', drop_owned_shop_ids)
+bus.subscribe('catalog', catalog_cache.bump_version)
+
+
+@receiver(pre_save, sender=Shop)
+def remember_previous_owner(sender, instance, **kwargs):
+    if instance.pk:
+        instance._previous_owner_id = (
+            Shop.objects.filter(pk=instance.pk).values_list('owner_id', flat=True).first()
+        )
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+def invalidate_shop_owner(sender, instance, using, **kwargs):
+    owner_ids = (instance.owner_id, getattr(instance, '_previous_owner_id', None))
+    # Свой кэш — сразу, чтобы изменение было видно и внутри транзакции; кэши других workers — через шину
+    invalidate_owned_shop_ids(*owner_ids)
+    bus.publish('owned_shops', *owner_ids, using=using)
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+def publish_invalidation(sender, instance, using, **kwargs):
+    # Пишет событие, только если на сущность кто-то подписан (bus.subscribe)
+    bus.publish(sender._meta.model_name, instance.pk, using=using)
+
+
+# Поля пользователя, которые ShopOwnerSerializer выводит в каталоге (shops — вычисляемое поле)
+OWNER_FIELDS = frozenset(ShopOwnerSerializer.Meta.fields) - {'shops'}
+
+
+def owner_fields_changed(instance, created=False, update_fields=None, **kwargs):
+    """
+    Могло ли сохранение пользователя изменить каталог: last_login, пароль и т.п. с update_fields его не меняют
+    """
+    if created or (update_fields is not None and not OWNER_FIELDS & set(update_fields)):
+        return False
+    return bool(get_owned_shop_ids(instance))
+
+
+@receiver(post_save, sender=Shop)
+@receiver(post_delete, sender=Shop)
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=ShopCategory)
+@receiver(post_delete, sender=ShopCategory)
+@receiver(post_save, sender=Location)
+@receiver(post_delete, sender=Location)
+@receiver(post_save, sender=CustomUser)
+def catalog_changed(sender, instance, using, **kwargs):
+    # Владелец попадает в ShopSerializer, остальные пользователи каталог не меняют
+    if sender is CustomUser and not owner_fields_changed(instance, **kwargs):
+        return
+    # Версия кэша меняется сразу и еще раз после коммита (событие шины применяется и локально):
+    # иначе параллельный запрос успел бы закэшировать данные до коммита под новой версией
+    catalog_cache.bump_version()
+    bus.publish('catalog', 0, using=using)
+    if snapshot.get_setting('PATH'):
+        # Снимок устаревает, когда изменение видно другим процессам
+        transaction.on_commit(snapshot.mark_changed, using=using)
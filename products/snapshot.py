@@ -0,0 +1,250 @@
+"""
+Снимок каталога (магазины, товары, локации) в одном бинарном файле.
+
+Сборщик (manage.py catalog_snapshot) сериализует каталог теми же
+сериализаторами, что и view, и пишет готовый JSON каждой записи вместе с
+индексом по id. Workers отображают файл в память только для чтения
+(mmap) — страницы лежат в page cache один раз на всю машину, а ответ
+отдается без запросов к базе и без сериализации.
+
+Формат (little-endian):
+
+    заголовок   magic 'QCAT', версия u16, число секций u16, поколение u64, время сборки f64
+    секции      имя 32 байта, число записей u32, смещение индекса u64
+    индекс      отсортированные (id i64, смещение u64, длина u32)
+    данные      JSON-записи подряд
+
+Свежесть. Любое изменение каталога (сигналы моделей, после коммита)
+дописывает байт в файл <PATH>.generation — его размер и есть номер
+поколения, а дозапись атомарна между процессами. Снимок с другим
+поколением или старше MAX_AGE секунд не используется, view читают из
+базы. Остатки (quantity) заказы меняют через update() без сигналов,
+поэтому в снимке они отстают не больше чем на MAX_AGE.
+"""
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'PATH': None,
+    'MAX_AGE': 30,
+    'REFRESH': 5,
+}
+
+MAGIC = b'QCAT'
+FORMAT_VERSION = 1
+HEADER = struct.Struct('<4sHHQd')
+NAME_SIZE = 32
+SECTION = struct.Struct(f'<{NAME_SIZE}sIQ')
+INDEX_ENTRY = struct.Struct('<qQI')
+
+# Секции со списками хранят одну запись с id 0
+LIST_ID = 0
+
+
+def get_setting(name):
+    return getattr(settings, 'CATALOG_SNAPSHOT', {}).get(name, DEFAULTS[name])
+
+
+def generation_path(path):
+    return f'{path}.generation'
+
+
+def current_generation(path):
+    try:
+        return os.stat(generation_path(path)).st_size
+    except FileNotFoundError:
+        return 0
+
+
+def mark_changed():
+    path = get_setting('PATH')
+    if not path:
+        return
+    fd = os.open(generation_path(path), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, b'.')
+    finally:
+        os.close(fd)
+
+
+def catalog_sections():
+    """
+    {секция: {id: данные}} — то же, что отдают соответствующие view
+    """
+    from map.models import Location
+    from map.serializers import LocationSerializer
+    from .serializers import ProductSerializer, ShopSerializer, ShopWithProductsSerializer
+    from .views import ProductDetailAPIView, ShopListCreateAPIView, ShopWithProductsAPIView
+
+    shops = list(ShopListCreateAPIView.queryset.all())
+    products = list(ProductDetailAPIView.queryset.order_by('pk'))
+    locations = list(Location.objects.all())
+
+    products_by_shop = {}
+    for product in products:
+        products_by_shop.setdefault(product.shop_id, []).append(product)
+
+    shop_data = ShopSerializer(shops, many=True).data
+    return {
+        'shop': {shop.pk: data for shop, data in zip(shops, shop_data)},
+        'shop_with_products': {
+            shop.pk: ShopWithProductsSerializer(shop).data for shop in ShopWithProductsAPIView.queryset.all()
+        },
+        'product': {product.pk: data for product, data in zip(products, ProductSerializer(products, many=True).data)},
+        'location': {location.pk: LocationSerializer(location).data for location in locations},
+        'shop_list': {LIST_ID: shop_data},
+        'location_list': {LIST_ID: LocationSerializer(locations, many=True).data},
+        'shop_products': {
+            shop.pk: ProductSerializer(products_by_shop.get(shop.pk, []), many=True).data for shop in shops
+        },
+    }
+
+
+def write_snapshot(path, sections, generation):
+    """
+    Пишет снимок во временный файл и атомарно подменяет им path
+    """
+    renderer = JSONRenderer()
+    rendered = {
+        name: sorted((record_id, renderer.render(data)) for record_id, data in records.items())
+        for name, records in sections.items()
+    }
+
+    offset = HEADER.size + SECTION.size * len(rendered)
+    section_table, indexes = [], []
+    for name, records in rendered.items():
+        if len(name.encode()) > NAME_SIZE:
+            raise ValueError(f'Section name is too long: {name}')
+        section_table.append(SECTION.pack(name.encode(), len(records), offset))
+        offset += INDEX_ENTRY.size * len(records)
+
+    for name, records in rendered.items():
+        index = []
+        for record_id, body in records:
+            index.append(INDEX_ENTRY.pack(record_id, offset, len(body)))
+            offset += len(body)
+        indexes.append(b''.join(index))
+
+    temporary = f'{path}.tmp{os.getpid()}'
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, FORMAT_VERSION, len(rendered), generation, time.time()))
+        f.writelines(section_table)
+        f.writelines(indexes)
+        for records in rendered.values():
+            f.writelines(body for _, body in records)
+    os.replace(temporary, path)
+    return offset
+
+
+def build_snapshot(path=None):
+    """
+    Собирает снимок; возвращает (поколение, размер в байтах)
+    """
+    path = path or get_setting('PATH')
+    # Поколение читается до запросов: изменение во время сборки сделает снимок устаревшим
+    generation = current_generation(path)
+    size = write_snapshot(path, catalog_sections(), generation)
+    return generation, size
+
+
+class CatalogSnapshot:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self.stat = os.fstat(f.fileno())
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, self.generation, self.built_at = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.map.close()
+            raise ValueError(f'{path} is not a catalog snapshot')
+        self.sections = {}
+        for i in range(count):
+            name, records, index_offset = SECTION.unpack_from(self.map, HEADER.size + i * SECTION.size)
+            self.sections[name.rstrip(b'\0').decode()] = (records, index_offset)
+
+    def get(self, section, record_id):
+        try:
+            records, index_offset = self.sections[section]
+        except KeyError:
+            return None
+        # Двоичный поиск прямо по индексу в mmap: процессы не копируют его к себе в память
+        low, high = 0, records
+        while low < high:
+            middle = (low + high) // 2
+            entry_id, offset, length = INDEX_ENTRY.unpack_from(self.map, index_offset + middle * INDEX_ENTRY.size)
+            if entry_id == record_id:
+                return self.map[offset:offset + length]
+            if entry_id < record_id:
+                low = middle + 1
+            else:
+                high = middle
+        return None
+
+    def is_fresh(self, path):
+        return (
+            self.generation == current_generation(path)
+            and time.time() - self.built_at <= get_setting('MAX_AGE')
+        )
+
+
+_loaded = None
+_lock = threading.Lock()
+
+
+def get_snapshot():
+    """
+    Снимок текущего процесса, если он включен, есть на диске и свежий; иначе None
+    """
+    global _loaded
+    path = get_setting('PATH')
+    if not path:
+        return None
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+
+    snapshot = _loaded
+    if snapshot is None or (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+        with _lock:
+            snapshot = _loaded
+            if snapshot is None or (snapshot.stat.st_ino, snapshot.stat.st_mtime_ns) != (stat.st_ino, stat.st_mtime_ns):
+                try:
+                    snapshot = CatalogSnapshot(path)
+                except (OSError, ValueError, struct.error):
+                    logger.warning('Could not load catalog snapshot %s', path, exc_info=True)
+                    return None
+                # Старое отображение закроется вместе с объектом, когда его перестанут использовать
+                _loaded = snapshot
+    return snapshot if snapshot.is_fresh(path) else None
+
+
+def snapshot_record(section, record_id):
+    """
+    Готовый JSON записи из свежего снимка или None
+    """
+    snapshot = get_snapshot()
+    return snapshot.get(section, record_id) if snapshot else None
+
+
+class SnapshotMixin:
+    """
+    Для view каталога: ответ из снимка по id из URL (snapshot_key) или None
+    """
+    snapshot_section = None
+    snapshot_key = 'pk'
+
+    def cached_response(self, **kwargs):
+        body = snapshot_record(self.snapshot_section, int(kwargs.get(self.snapshot_key, LIST_ID)))
+        if body is None:
+            return None
+        return HttpResponse(body, content_type='application/json')
@@ -1,3 +1,439 @@
-from django.test import TestCase
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from monitoring.metrics import registry
+from monitoring.testing import CatalogDataset, QueryBudgetMixin, QueryPlanMixin
+from .invalidation import InvalidationBus, bus
+from .models import InvalidationEvent, Shop, ShopCategory, Product
+from .ownership import CACHE_KEY, get_owned_shop_ids
+from .signals import drop_owned_shop_ids
+from . import catalog_cache, snapshot
+
+User = get_user_model()
+
+
+class OwnedShopIdsTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.shop_owner = User.objects.create_user(
+            email='shopowner@test.com',
+            password='testpass123',
+            first_name='Shop',
+            last_name='Owner'
+        )
+        self.other_user = User.objects.create_user(
+            email='other@test.com',
+            password='testpass123',
+            first_name='Other',
+            last_name='User'
+        )
+        self.category = ShopCategory.objects.create(name='Test Category')
+        self.shop = Shop.objects.create(
+            name='Test Shop',
+            category=self.category,
+            address='Test Address',
+            description='Test Description',
+            owner=self.shop_owner
+        )
+        self.client = APIClient()
+
+    def test_owned_shop_ids_cached(self):
+        """Тест: список магазинов пользователя берется из кэша после первого запроса"""
+        self.assertEqual(get_owned_shop_ids(self.shop_owner), {self.shop.id})
+        with self.assertNumQueries(0):
+            self.assertEqual(get_owned_shop_ids(self.shop_owner), {self.shop.id})
+
+    def test_owner_change_invalidates_cache(self):
+        """Тест: смена владельца магазина сбрасывает кэш у старого и нового владельца"""
+        get_owned_shop_ids(self.shop_owner)
+        get_owned_shop_ids(self.other_user)
+
+        self.shop.owner = self.other_user
+        self.shop.save()
+
+        self.assertEqual(get_owned_shop_ids(self.shop_owner), set())
+        self.assertEqual(get_owned_shop_ids(self.other_user), {self.shop.id})
+
+    def test_owner_can_add_product(self):
+        """Тест: владелец магазина может добавить продукт"""
+        self.client.force_authenticate(user=self.shop_owner)
+        data = {'name': 'Bread', 'description': 'Fresh', 'quantity': 5, 'price': 2.5, 'shop': self.shop.id}
+        response = self.client.post(reverse('product-list-create'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Product.objects.filter(shop=self.shop).count(), 1)
+
+    def test_other_user_cannot_add_product(self):
+        """Тест: пользователь не может добавить продукт в чужой магазин"""
+        self.client.force_authenticate(user=self.other_user)
+        data = {'name': 'Bread', 'description': 'Fresh', 'quantity': 5, 'price': 2.5, 'shop': self.shop.id}
+        response = self.client.post(reverse('product-list-create'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_add_product_to_missing_shop(self):
+        """Тест: добавление продукта в несуществующий магазин возвращает 404"""
+        self.client.force_authenticate(user=self.shop_owner)
+        data = {'name': 'Bread', 'description': 'Fresh', 'quantity': 5, 'price': 2.5, 'shop': 9999}
+        response = self.client.post(reverse('product-list-create'), data, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductsQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    urls_module = 'products.urls'
+    budgets = {
+        'shop-list-create': 2,
+        'shop-detail': 2,
+        'shop-products': 1,
+        'shop-with-products': 2,
+        'product-list-create': 1,
+        'product-detail': 1,
+        'shop-owners': 2,
+        'my-shops': 2,
+        'upload-product-image': 0,
+    }
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(user=self.data.owner)
+
+    def request_shop_list_create(self):
+        return self.client.get(reverse('shop-list-create'))
+
+    def request_shop_detail(self):
+        return self.client.get(reverse('shop-detail', args=[self.data.shop.id]))
+
+    def request_shop_products(self):
+        return self.client.get(reverse('shop-products', args=[self.data.shop.id]))
+
+    def request_shop_with_products(self):
+        return self.client.get(reverse('shop-with-products', args=[self.data.shop.id]))
+
+    def request_product_list_create(self):
+        return self.client.get(reverse('product-list-create'))
+
+    def request_product_detail(self):
+        return self.client.get(reverse('product-detail', args=[self.data.product.id]))
+
+    def request_shop_owners(self):
+        return self.client.get(reverse('shop-owners'))
+
+    def request_my_shops(self):
+        return self.client.get(reverse('my-shops'))
+
+    def request_upload_product_image(self):
+        media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media_root)
+        picture = SimpleUploadedFile('product.png', b'\x89PNG\r\n\x1a\n', content_type='image/png')
+        with override_settings(MEDIA_ROOT=media_root):
+            return self.client.post(reverse('upload-product-image'), {'picture': picture}, format='multipart')
+
+
+class ShopQueryPlanTest(QueryPlanMixin, TestCase):
+    def setUp(self):
+        self.data = CatalogDataset()
+        self.data.grow_to(3)
+
+    def test_owned_shop_ids_use_index(self):
+        """Тест: id магазинов владельца читаются только из индекса (owner, id)"""
+        self.assertUsesIndexes(Shop.objects.filter(owner=self.data.owner).values_list('id', flat=True))
+
+    def test_shop_products_use_index(self):
+        """Тест: товары магазина ищутся по shop_id"""
+        self.assertUsesIndexes(Product.objects.filter(shop=self.data.shop))
+
+
+class AsyncReadViewTest(APITestCase):
+    def setUp(self):
+        self.data = CatalogDataset()
+        self.data.grow_to(2)
+
+    def test_async_matches_drf(self):
+        """Тест: асинхронные GET отдают то же, что синхронные DRF-view (?format=json)"""
+        for url in [
+            reverse('shop-detail', args=[self.data.shop.id]),
+            reverse('shop-with-products', args=[self.data.shop.id]),
+            reverse('product-detail', args=[self.data.product.id]),
+        ]:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                self.assertEqual(response.json(), self.client.get(url, {'format': 'json'}).json())
+
+    def test_not_found_matches_drf(self):
+        """Тест: 404 асинхронного view совпадает с ответом DRF"""
+        url = reverse('shop-detail', args=[0])
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.json(), self.client.get(url, {'format': 'json'}).json())
+
+    def test_other_methods_and_browsable_api_delegated(self):
+        """Тест: изменяющие методы и браузерный API обрабатывает синхронный DRF-view"""
+        url = reverse('product-detail', args=[self.data.product.id])
+
+        self.assertEqual(self.client.delete(url).status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.get(url, HTTP_ACCEPT='text/html')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('text/html', response['Content-Type'])
+
+    def test_invalid_token_rejected(self):
+        """Тест: открытый асинхронный view отвечает на невалидный токен 401, как DRF"""
+        url = reverse('shop-detail', args=[self.data.shop.id])
+        response = self.client.get(url, HTTP_AUTHORIZATION='Bearer invalid')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertIn('WWW-Authenticate', response)
+        self.assertEqual(response.json(), self.client.get(url, {'format': 'json'}, HTTP_AUTHORIZATION='Bearer invalid').json())
+
+        self.client.force_authenticate(self.data.customer)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+
+
+class CatalogSnapshotTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, 'catalog.snap')
+        self.enterContext(override_settings(CATALOG_SNAPSHOT={'PATH': self.path, 'MAX_AGE': 30, 'REFRESH': 5}))
+        self.data = CatalogDataset()
+        self.data.grow_to(2)
+        snapshot.build_snapshot()
+
+    def urls(self):
+        return [
+            reverse('shop-detail', args=[self.data.shop.id]),
+            reverse('shop-with-products', args=[self.data.shop.id]),
+            reverse('product-detail', args=[self.data.product.id]),
+            reverse('shop-products', args=[self.data.shop.id]),
+            reverse('location-detail', args=[self.data.location.id]),
+            reverse('location-list'),
+        ]
+
+    def test_serves_from_snapshot(self):
+        """Тест: каталог отдается из снимка без запросов к базе и совпадает с ответом из базы"""
+        for url in self.urls():
+            with self.subTest(url=url):
+                with self.assertNumQueries(0):
+                    response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertEqual(response['Content-Type'], 'application/json')
+                with override_settings(CATALOG_SNAPSHOT={}):
+                    self.assertEqual(response.json(), self.client.get(url).json())
+
+    def test_shop_list_requires_authentication(self):
+        """Тест: список магазинов из снимка отдается только после проверки JWT"""
+        url = reverse('shop-list-create')
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_401_UNAUTHORIZED)
+
+        self.client.force_authenticate(self.data.customer)
+        with self.assertNumQueries(0):
+            response = self.client.get(url)
+        with override_settings(CATALOG_SNAPSHOT={}):
+            self.assertEqual(response.json(), self.client.get(url).json())
+
+    def test_change_makes_snapshot_stale(self):
+        """Тест: после изменения каталога view читают из базы, пока снимок не пересобран"""
+        url = reverse('shop-detail', args=[self.data.shop.id])
+        with self.captureOnCommitCallbacks(execute=True):
+            Shop.objects.filter(pk=self.data.shop.pk).update(name='Renamed')
+            Shop.objects.get(pk=self.data.shop.pk).save()
+
+        self.assertEqual(self.client.get(url).json()['name'], 'Renamed')
+
+        snapshot.build_snapshot()
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url).json()['name'], 'Renamed')
+
+    def test_old_snapshot_not_used(self):
+        """Тест: снимок старше MAX_AGE не используется"""
+        self.assertIsNotNone(snapshot.get_snapshot())
+        with mock.patch('products.snapshot.time.time', return_value=time.time() + 31):
+            self.assertIsNone(snapshot.get_snapshot())
+
+    def test_missing_record_falls_back(self):
+        """Тест: записи, которой нет в снимке, ищется в базе (404 как у DRF)"""
+        response = self.client.get(reverse('product-detail', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(snapshot.snapshot_record('no-such-section', 1), None)
+
+    def test_command_builds_snapshot(self):
+        """Тест: catalog_snapshot собирает снимок в указанный файл"""
+        path = f'{self.path}.manual'
+        call_command('catalog_snapshot', '--path', path, stdout=StringIO())
+        self.assertEqual(snapshot.CatalogSnapshot(path).get('shop', self.data.shop.id), snapshot.snapshot_record('shop', self.data.shop.id))
+
+
+class InvalidationBusTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        self.owner = User.objects.create_user(email='owner@test.com', password='testpass123')
+        self.category = ShopCategory.objects.create(name='Test Category')
+        # Второй worker: свои подписки и своя отметка
+        self.worker = InvalidationBus()
+        self.worker.subscribe('owned_shops', drop_owned_shop_ids)
+        self.worker.catch_up()
+
+    def create_shop(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Shop.objects.create(
+                name='Shop', category=self.category, address='Address', description='Description', owner=self.owner,
+            )
+
+    def test_publish_after_commit(self):
+        """Тест: изменение магазина публикует событие владельца после коммита и применяется локально"""
+        with self.captureOnCommitCallbacks() as callbacks:
+            Shop.objects.create(
+                name='Shop', category=self.category, address='Address', description='Description', owner=self.owner,
+            )
+            self.assertFalse(InvalidationEvent.objects.exists())
+            cache.set(CACHE_KEY.format(self.owner.pk), frozenset())
+        for callback in callbacks:
+            callback()
+
+        self.assertEqual(
+            list(InvalidationEvent.objects.filter(entity='owned_shops').values_list('entity_id', flat=True)),
+            [self.owner.pk],
+        )
+        self.assertIsNone(cache.get(CACHE_KEY.format(self.owner.pk)))
+
+    def test_no_subscribers_no_events(self):
+        """Тест: на сущности без подписчиков события не пишутся"""
+        with self.captureOnCommitCallbacks(execute=True):
+            bus.publish('product', 1)
+        self.assertFalse(InvalidationEvent.objects.filter(entity='product').exists())
+
+    def test_other_worker_applies_event(self):
+        """Тест: другой worker сбрасывает свой кэш при опросе один раз и пишет задержку"""
+        self.create_shop()
+        # Кэш второго worker заполнен до изменения
+        cache.set(CACHE_KEY.format(self.owner.pk), frozenset())
+
+        self.assertEqual(self.worker.poll(), InvalidationEvent.objects.count())
+        self.assertIsNone(cache.get(CACHE_KEY.format(self.owner.pk)))
+        self.assertEqual(self.worker.poll(), 0)
+
+        snapshot = registry.snapshot()
+        lag = [
+            h for name, labels, h in snapshot['histograms']
+            if name == 'cache_invalidation_lag_seconds' and ('entity', 'owned_shops') in labels
+        ]
+        self.assertEqual(lag[0]['count'], 1)
+
+    def test_late_commit_within_grace(self):
+        """Тест: событие с меньшим id, закоммиченное после опроса, применяется"""
+        handled = []
+        self.worker.subscribe('shop', lambda entity_id, version: handled.append(version))
+        later = InvalidationEvent.objects.create(id=100, entity='shop', entity_id=1)
+        self.worker.poll()
+        earlier = InvalidationEvent.objects.create(id=50, entity='shop', entity_id=2)
+        self.worker.poll()
+        self.assertEqual(handled, [later.pk, earlier.pk])
+
+    def test_new_worker_skips_history(self):
+        """Тест: новый процесс не применяет события, опубликованные до его старта"""
+        self.create_shop()
+        handled = []
+        worker = InvalidationBus()
+        worker.subscribe('owned_shops', lambda entity_id, version: handled.append(entity_id))
+        worker.catch_up()
+        self.assertEqual(worker.poll(), 0)
+        self.assertEqual(handled, [])
+
+    def test_start_sets_mark_before_first_poll(self):
+        """Тест: отметка ставится в start(), событие сразу после старта применяется первым опросом"""
+        self.create_shop()
+        handled = []
+        worker = InvalidationBus()
+        worker.subscribe('owned_shops', lambda entity_id, version: handled.append(entity_id))
+        with mock.patch('products.invalidation.threading.Thread'):
+            self.assertTrue(worker.start())
+        existing = InvalidationEvent.objects.count()
+
+        self.create_shop()
+        self.assertEqual(worker.poll(), InvalidationEvent.objects.count() - existing)
+        self.assertEqual(handled, [self.owner.pk])
+
+    def test_poll_without_mark_reapplies_grace(self):
+        """Тест: без отметки из start() первый опрос применяет события окна GRACE, а не пропускает их"""
+        self.create_shop()
+        handled = []
+        worker = InvalidationBus()
+        worker.subscribe('owned_shops', lambda entity_id, version: handled.append(entity_id))
+        self.assertEqual(worker.poll(), InvalidationEvent.objects.count())
+        self.assertEqual(handled, [self.owner.pk])
+
+    def test_purge(self):
+        """Тест: purge_invalidation_events удаляет только события старше RETENTION"""
+        InvalidationEvent.objects.create(entity='shop', entity_id=1, created_at=timezone.now() - timedelta(hours=2))
+        fresh = InvalidationEvent.objects.create(entity='shop', entity_id=2)
+        call_command('purge_invalidation_events', stdout=StringIO())
+        self.assertEqual(list(InvalidationEvent.objects.all()), [fresh])
+
+
+class CatalogCacheTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.data = CatalogDataset()
+        self.data.grow_to(2)
+
+    def test_repeated_reads_use_cache(self):
+        """Тест: повторное чтение магазина с товарами и списка магазинов идет из кэша"""
+        self.client.force_authenticate(self.data.customer)
+        for url in (reverse('shop-with-products', args=[self.data.shop.id]), reverse('shop-list-create')):
+            with self.subTest(url=url):
+                first = self.client.get(url)
+                self.assertEqual(first.status_code, status.HTTP_200_OK)
+                with self.assertNumQueries(0):
+                    second = self.client.get(url)
+                self.assertEqual(second.json(), first.json())
+                with override_settings(CATALOG_CACHE={'TIMEOUT': 0}):
+                    self.assertEqual(self.client.get(url).json(), first.json())
+
+    def test_change_invalidates(self):
+        """Тест: после изменения каталога ответ собирается заново"""
+        url = reverse('shop-with-products', args=[self.data.shop.id])
+        self.client.get(url)
+        self.data.shop.name = 'Renamed'
+        self.data.shop.save()
+        self.assertEqual(self.client.get(url).json()['name'], 'Renamed')
+
+    def test_owner_login_keeps_catalog(self):
+        """Тест: last_login и пароль владельца не сбрасывают каталог, а его имя — сбрасывает"""
+        owner = self.data.shop.owner
+        version = catalog_cache.get_version()
+        with mock.patch('products.signals.get_owned_shop_ids') as owned, \
+                self.captureOnCommitCallbacks(execute=True):
+            owner.last_login = timezone.now()
+            owner.save(update_fields=['last_login'])
+            owner.set_password('newpass123')
+            owner.save(update_fields=['password'])
+        owned.assert_not_called()
+        self.assertEqual(catalog_cache.get_version(), version)
+
+        owner.first_name = 'Renamed'
+        owner.save(update_fields=['first_name'])
+        self.assertNotEqual(catalog_cache.get_version(), version)
+
+    def test_missing_shop(self):
+        """Тест: несуществующий магазин — 404, как у DRF"""
+        response = self.client.get(reverse('shop-with-products', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
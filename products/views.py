@@ -1,23 +1,21 @@
 import logging
-from django.shortcuts import render
-from rest_framework import permissions
-from rest_framework.generics import *
-from rest_framework.permissions import IsAuthenticated
+from asgiref.sync import sync_to_async
+from django.shortcuts import get_object_or_404
+from django.db.models import Prefetch
+from rest_framework import permissions, status
+from rest_framework.generics import ListCreateAPIView, RetrieveAPIView
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.response import Response
 from users.models import CustomUser
-from users.serializers import CustomUserSerializer
 
-from .models import *
+from .models import Product, Shop
 from .serializers import ShopSerializer, ShopCreateSerializer, ProductSerializer, ProductCreateSerializer, ShopWithProductsSerializer, \
     ShopOwnerSerializer
-from .permissions import IsAdminOrReadOnly, IsShopOwnerOrReadOnly
-
-import os
-from django.conf import settings
-from django.core.files.storage import default_storage
-from django.core.files.base import ContentFile
-import uuid
+from .permissions import IsAdminOrReadOnly
+from .ownership import owns_shop
+from .snapshot import LIST_ID, SnapshotMixin
+from . import catalog_cache
+from TheQutt.async_views import AsyncReadView, aget_object_or_404
 
 logger = logging.getLogger(__name__)
 
@@ -26,13 +24,24 @@ class ShopOwnersListCreateView(ListCreateAPIView):
     permission_classes = [IsAdminOrReadOnly]
     
     def get_queryset(self):
-        return CustomUser.objects.filter(shops__isnull=False).distinct()
+        return CustomUser.objects.filter(shops__isnull=False).distinct().prefetch_related(
+            Prefetch('shops', queryset=Shop.objects.select_related('category'))
+        )
 
 
-class ShopListCreateAPIView(ListCreateAPIView):
-    queryset = Shop.objects.all()
+class ShopListCreateAPIView(SnapshotMixin, ListCreateAPIView):
+    queryset = Shop.objects.for_serializer()
     serializer_class = ShopSerializer
     permission_classes = [permissions.IsAuthenticated]
+    snapshot_section = 'shop_list'
+
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        return self.cached_response() or catalog_cache.json_response('shop_list', LIST_ID, self.list_data)
+
+    def list_data(self):
+        return self.get_serializer(self.filter_queryset(self.get_queryset()), many=True).data
     
     def get_serializer_class(self):
         if self.request.method == 'POST':
@@ -40,39 +49,39 @@ class ShopListCreateAPIView(ListCreateAPIView):
         return ShopSerializer
     
     def get(self, request, *args, **kwargs):
-        logger.info(f"ShopListCreateAPIView.get called by user: {request.user}")
-        logger.info(f"Request headers: {request.headers}")
-        logger.info(f"Request method: {request.method}")
-        logger.info(f"Request user authenticated: {request.user.is_authenticated}")
-        
         response = super().get(request, *args, **kwargs)
-        logger.info(f"Response status: {response.status_code}")
-        logger.info(f"Response data count: {len(response.data) if response.data else 0}")
-        
-        # Детальное логирование данных магазинов
-        if response.data:
-            logger.info("=== SHOP DETAILS ===")
-            for i, shop in enumerate(response.data):
-                logger.info(f"Shop {i+1}: ID={shop.get('id')}, Name={shop.get('name')}, Location={shop.get('location')}")
-                if shop.get('location'):
-                    logger.info(f"  Coordinates: lat={shop['location'].get('latitude')}, lng={shop['location'].get('longitude')}")
-                else:
-                    logger.info(f"  Location missing")
+        # Ответ из снимка каталога уже отрендерен и не содержит data
+        data = getattr(response, 'data', None)
+        logger.debug(
+            "ShopListCreateAPIView.get by %s: status=%s, shops=%s",
+            request.user, response.status_code, len(data) if data else 0
+        )
+
+        # Детальное логирование данных магазинов (только если включен DEBUG)
+        if data and logger.isEnabledFor(logging.DEBUG):
+            for shop in data:
+                location = shop.get('location')
+                logger.debug(
+                    "Shop ID=%s, Name=%s, lat=%s, lng=%s",
+                    shop.get('id'), shop.get('name'),
+                    location.get('latitude') if location else None,
+                    location.get('longitude') if location else None,
+                )
         
         return response
 
 class ShopDetailAPIView(RetrieveAPIView):
-    queryset = Shop.objects.all()
+    queryset = Shop.objects.for_serializer()
     serializer_class = ShopSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 class ShopWithProductsAPIView(RetrieveAPIView):
-    queryset = Shop.objects.prefetch_related('product_set')
+    queryset = Shop.objects.select_related('category', 'location').prefetch_related('product_set')
     serializer_class = ShopWithProductsSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
 class ProductListCreateAPIView(ListCreateAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('shop')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
@@ -84,34 +93,68 @@ class ProductListCreateAPIView(ListCreateAPIView):
     def create(self, request, *args, **kwargs):
         # Проверяем, что пользователь является владельцем магазина
         shop_id = request.data.get('shop')
-        if shop_id:
-            try:
-                shop = Shop.objects.get(id=shop_id)
-                if shop.owner != request.user:
-                    return Response(
-                        {'error': 'You can only add products to your own shops'}, 
-                        status=status.HTTP_403_FORBIDDEN
-                    )
-            except Shop.DoesNotExist:
+        if shop_id and not owns_shop(request, shop_id):
+            if not Shop.objects.filter(id=shop_id).exists():
                 return Response(
                     {'error': 'Shop not found'}, 
                     status=status.HTTP_404_NOT_FOUND
                 )
+            return Response(
+                {'error': 'You can only add products to your own shops'}, 
+                status=status.HTTP_403_FORBIDDEN
+            )
         
         return super().create(request, *args, **kwargs)
 
 class ProductDetailAPIView(RetrieveAPIView):
-    queryset = Product.objects.all()
+    queryset = Product.objects.select_related('shop')
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class ShopProductsAPIView(ListCreateAPIView):
+class AsyncShopDetailView(SnapshotMixin, AsyncReadView):
+    sync_view_class = ShopDetailAPIView
+    snapshot_section = 'shop'
+    serializer_class = ShopSerializer
+
+    async def aget_data(self, request, pk):
+        return await aget_object_or_404(Shop.objects.for_serializer(), pk=pk)
+
+class AsyncShopWithProductsView(SnapshotMixin, AsyncReadView):
+    sync_view_class = ShopWithProductsAPIView
+    snapshot_section = 'shop_with_products'
+    serializer_class = ShopWithProductsSerializer
+
+    async def aget_data(self, request, pk):
+        return await aget_object_or_404(ShopWithProductsAPIView.queryset.all(), pk=pk)
+
+    async def aget_response(self, request, pk):
+        def compute():
+            return self.serializer_class(get_object_or_404(ShopWithProductsAPIView.queryset.all(), pk=pk)).data
+
+        # В потоке запроса (thread_sensitive): ожидание single-flight не занимает event loop
+        return await sync_to_async(catalog_cache.json_response)('shop_with_products', pk, compute)
+
+class AsyncProductDetailView(SnapshotMixin, AsyncReadView):
+    sync_view_class = ProductDetailAPIView
+    snapshot_section = 'product'
+    serializer_class = ProductSerializer
+
+    async def aget_data(self, request, pk):
+        return await aget_object_or_404(ProductDetailAPIView.queryset.all(), pk=pk)
+
+class ShopProductsAPIView(SnapshotMixin, ListCreateAPIView):
     serializer_class = ProductSerializer
     permission_classes = [permissions.IsAuthenticatedOrReadOnly]
+    snapshot_section = 'shop_products'
+    snapshot_key = 'shop_id'
     
     def get_queryset(self):
         shop_id = self.kwargs.get('shop_id')
-        return Product.objects.filter(shop_id=shop_id)
+        return Product.objects.filter(shop_id=shop_id).select_related('shop')
+
+    def list(self, request, *args, **kwargs):
+        response = self.cached_response(**kwargs) if request.accepted_renderer.format == 'json' else None
+        return response or super().list(request, *args, **kwargs)
 
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
@@ -120,7 +163,7 @@ def my_shops(request):
     Получить магазины текущего пользователя
     """
     try:
-        user_shops = Shop.objects.filter(owner=request.user)
+        user_shops = Shop.objects.filter(owner=request.user).for_serializer()
         serializer = ShopSerializer(user_shops, many=True)
         logger.info(f"User {request.user.email} requested their shops. Found {len(serializer.data)} shops.")
         return Response(serializer.data)
@@ -137,6 +180,12 @@ def upload_product_image(request):
     """
     Загрузить изображение для продукта
     """
+    # Работа с файлами нужна только здесь, поэтому импорт при первом вызове, а не при старте процесса
+    import os
+    import uuid
+    from django.core.files.base import ContentFile
+    from django.core.files.storage import default_storage
+
     try:
         if 'picture' not in request.FILES:
             return Response(
@@ -0,0 +1,100 @@
+import atexit
+import logging
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections
+from django.db.models import Case, Value, When
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+DEFAULTS = {
+    'MODE': 'immediate',
+    'BATCH_SIZE': 100,
+    'FLUSH_INTERVAL': timedelta(seconds=30),
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'LAST_LOGIN_UPDATE', {}).get(name, DEFAULTS[name])
+
+
+class LastLoginBuffer:
+    """
+    Копит время входа пользователей и записывает его одним UPDATE на всю пачку
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self._timer = None
+
+    def __len__(self):
+        return len(self._pending)
+
+    def add(self, user_id, when):
+        with self._lock:
+            self._pending[user_id] = when
+            full = len(self._pending) >= get_setting('BATCH_SIZE')
+            if not full and self._timer is None:
+                interval = get_setting('FLUSH_INTERVAL').total_seconds()
+                self._timer = threading.Timer(interval, self._flush_in_timer)
+                self._timer.daemon = True
+                self._timer.start()
+        if full:
+            self.flush()
+
+    def _flush_in_timer(self):
+        try:
+            self.flush()
+        finally:
+            # Каждый Timer — новый поток со своим соединением: закрываем, иначе оно остается открытым
+            connections.close_all()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return 0
+
+        from .models import CustomUser
+
+        try:
+            return CustomUser.objects.filter(pk__in=pending.keys()).update(
+                last_login=Case(
+                    *[When(pk=pk, then=Value(when)) for pk, when in pending.items()],
+                    default='last_login',
+                )
+            )
+        except Exception as e:
+            logger.error(f"Failed to flush last_login for {len(pending)} users: {e}")
+            return 0
+
+
+buffer = LastLoginBuffer()
+# Накопленное не теряется при выходе процесса; gunicorn вызывает flush и в worker_exit (TheQutt/gunicorn_conf.py)
+atexit.register(buffer.flush)
+
+
+def record_login(user):
+    """
+    Обновляет last_login согласно настройке LAST_LOGIN_UPDATE['MODE']:
+    'immediate' — сразу, 'batched' — через буфер, 'disabled' — не обновляет
+    """
+    mode = get_setting('MODE')
+    now = timezone.now()
+
+    if mode == 'disabled':
+        return
+    if mode == 'batched':
+        user.last_login = now
+        buffer.add(user.pk, now)
+        return
+
+    user.last_login = now
+    user.save(update_fields=['last_login'])
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from users.revocation import revocation_store
+
+
+class Command(BaseCommand):
+    help = 'Удаляет отозванные refresh-токены, срок действия которых уже истек'
+
+    def handle(self, *args, **options):
+        deleted = revocation_store.purge_expired()
+        self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} expired revoked tokens'))
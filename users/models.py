@@ -1,6 +1,7 @@
 from django.contrib.auth.base_user import AbstractBaseUser
 from django.contrib.auth.models import UserManager, PermissionsMixin
 from django.db import models
+from django.utils import timezone
 
 
 class CustomUserManager(UserManager):
@@ -53,4 +54,17 @@ class CustomUser(AbstractBaseUser, PermissionsMixin):
         return self.email.split('@')[0]
 
     def __str__(self):
-        return self.email
\ No newline at end of file
+        return self.email
+
+class RevokedToken(models.Model):
+    jti = models.CharField(max_length=255, unique=True)
+    expires_at = models.DateTimeField(db_index=True)
+    # Окно GRACE при синхронизации: строка с меньшим id может стать видна позже большего
+    revoked_at = models.DateTimeField(default=timezone.now, db_index=True)
+
+    class Meta:
+        verbose_name = 'Revoked token'
+        verbose_name_plural = 'Revoked tokens'
+
+    def __str__(self):
+        return self.jti
@@ -0,0 +1,168 @@
+import hashlib
+import math
+import threading
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+DEFAULTS = {
+    'BLOOM_CAPACITY': 1_000_000,
+    'BLOOM_ERROR_RATE': 0.001,
+    'SYNC_INTERVAL': timedelta(seconds=5),
+    'GRACE': timedelta(seconds=5),
+    'REBUILD_INTERVAL': timedelta(hours=1),
+    'PURGE_BATCH_SIZE': 10_000,
+}
+
+
+def get_setting(name):
+    return getattr(settings, 'TOKEN_REVOCATION', {}).get(name, DEFAULTS[name])
+
+
+class BloomFilter:
+    """
+    Bloom-фильтр: "нет" — точно нет, "да" — возможно (нужно проверить в БД)
+    """
+
+    def __init__(self, capacity, error_rate):
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for pos in self._positions(key):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, key):
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(key))
+
+
+class RevocationStore:
+    """
+    Хранилище отозванных refresh-токенов (по jti).
+
+    Таблица RevokedToken — источник истины, а локальный Bloom-фильтр отвечает
+    на частый вопрос "токен не отозван?" без обращения к БД. Новые записи
+    других воркеров подтягиваются раз в SYNC_INTERVAL по id и заново за
+    последние GRACE (id выдается при вставке, а строка видна после коммита),
+    фильтр целиком перестраивается раз в REBUILD_INTERVAL, чтобы выбросить
+    истекшие jti. Новый фильтр строится целиком и только потом подменяет
+    старый. Обновляет фильтр один поток; остальные в это время не ждут, а
+    проверяют токен в БД, раз фильтр может отставать.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._filter = None
+        self._high_water_mark = 0
+        self._synced_at = 0.0
+        self._rebuilt_at = 0.0
+
+    def rebuild(self):
+        from .models import RevokedToken
+
+        rows = RevokedToken.objects.filter(expires_at__gt=timezone.now()).values_list('id', 'jti')
+        capacity = max(get_setting('BLOOM_CAPACITY'), 2 * rows.count())
+        bloom = BloomFilter(capacity, get_setting('BLOOM_ERROR_RATE'))
+        high_water_mark = 0
+        for pk, jti in rows.iterator():
+            bloom.add(jti)
+            high_water_mark = max(high_water_mark, pk)
+
+        with self._lock:
+            self._filter = bloom
+            self._high_water_mark = high_water_mark
+            self._synced_at = self._rebuilt_at = time.monotonic()
+
+    def sync(self):
+        from .models import RevokedToken
+
+        since = timezone.now() - get_setting('GRACE')
+        rows = RevokedToken.objects.filter(
+            Q(id__gt=self._high_water_mark) | Q(revoked_at__gte=since)
+        ).values_list('id', 'jti')
+        with self._lock:
+            for pk, jti in rows:
+                self._filter.add(jti)
+                self._high_water_mark = max(self._high_water_mark, pk)
+            self._synced_at = time.monotonic()
+
+    def _due(self):
+        now = time.monotonic()
+        if self._filter is None or now - self._rebuilt_at >= get_setting('REBUILD_INTERVAL').total_seconds():
+            return 'rebuild'
+        if now - self._synced_at >= get_setting('SYNC_INTERVAL').total_seconds():
+            return 'sync'
+        return None
+
+    def _refresh(self):
+        """
+        Подтягивает изменения, если пора; False — фильтр сейчас обновляет другой поток и он может отставать
+        """
+        if self._due() is None:
+            return True
+        # Без фильтра ждать обязательно, иначе — нет
+        if not self._refresh_lock.acquire(blocking=self._filter is None):
+            return False
+        try:
+            due = self._due()
+            if due == 'rebuild':
+                self.rebuild()
+            elif due == 'sync':
+                self.sync()
+        finally:
+            self._refresh_lock.release()
+        return True
+
+    def is_revoked(self, jti):
+        from .models import RevokedToken
+
+        if self._refresh() and jti not in self._filter:
+            return False
+        return RevokedToken.objects.filter(jti=jti).exists()
+
+    def revoke(self, jti, expires_at):
+        """
+        Отзывает токен. Возвращает False, если он уже был отозван
+        (например, параллельным запросом в другом воркере).
+        """
+        from .models import RevokedToken
+
+        self._refresh()
+        try:
+            with transaction.atomic():
+                RevokedToken.objects.create(jti=jti, expires_at=expires_at)
+        except IntegrityError:
+            return False
+        finally:
+            self._filter.add(jti)
+        return True
+
+    def purge_expired(self):
+        """
+        Удаляет записи с истекшим сроком действия пачками по PURGE_BATCH_SIZE
+        """
+        from .models import RevokedToken
+
+        batch_size = get_setting('PURGE_BATCH_SIZE')
+        expired = RevokedToken.objects.filter(expires_at__lte=timezone.now())
+        deleted = 0
+        while True:
+            ids = list(expired.values_list('id', flat=True)[:batch_size])
+            if not ids:
+                return deleted
+            deleted += RevokedToken.objects.filter(id__in=ids).delete()[0]
+
+
+revocation_store = RevocationStore()
@@ -1,5 +1,8 @@
 from rest_framework import serializers
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from .last_login import record_login
 from .models import CustomUser
+from .tokens import RevocableRefreshToken
 
 class CustomUserSerializer(serializers.ModelSerializer):
     class Meta:
@@ -38,4 +41,30 @@ class UserProfileSerializer(serializers.ModelSerializer):
     class Meta:
         model = CustomUser
         fields = ['email', 'first_name', 'last_name', 'profile_picture']
-        read_only_fields = ['email']
\ No newline at end of file
+        read_only_fields = ['email']
+
+class CustomTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """
+    Одна проверка пароля на вход: токены и данные пользователя строятся из одного authenticate()
+    """
+    token_class = RevocableRefreshToken
+
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        user = self.user
+        record_login(user)
+
+        data['user'] = {
+            'id': user.id,
+            'email': user.email,
+            'first_name': user.first_name,
+            'last_name': user.last_name,
+            'is_staff': user.is_staff,
+            'date_joined': user.date_joined.isoformat(),
+            'profile_picture': user.profile_picture.url if user.profile_picture else None,
+        }
+        return data
+
+
+class CustomTokenRefreshSerializer(TokenRefreshSerializer):
+    token_class = RevocableRefreshToken
@@ -1,3 +1,248 @@
-from django.test import TestCase
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import SimpleTestCase, override_settings
+from django.utils import timezone
+from django.urls import reverse
+from rest_framework.test import APITestCase, APIClient
+from rest_framework import status
+from django.contrib.auth import get_user_model
+from unittest import mock
+
+from monitoring.testing import PASSWORD, QueryBudgetMixin
+from .last_login import buffer
+from .models import RevokedToken
+from .revocation import BloomFilter, revocation_store
+from .tokens import RevocableRefreshToken
+
+User = get_user_model()
+
+
+class TokenObtainPairViewTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            email='user@test.com',
+            password='testpass123',
+            first_name='Regular',
+            last_name='User'
+        )
+        self.client = APIClient()
+        self.url = reverse('token_obtain_pair')
+        self.credentials = {'email': 'user@test.com', 'password': 'testpass123'}
+
+    def tearDown(self):
+        buffer.flush()
+
+    def test_login_returns_tokens_and_user(self):
+        """Тест: вход возвращает пару токенов и данные пользователя"""
+        response = self.client.post(self.url, self.credentials, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access', response.data)
+        self.assertIn('refresh', response.data)
+        self.assertEqual(response.data['user']['email'], 'user@test.com')
+        self.assertIsNone(response.data['user']['profile_picture'])
+
+    def test_password_checked_once(self):
+        """Тест: пароль проверяется один раз за вход"""
+        with mock.patch.object(User, 'check_password', autospec=True, return_value=True) as check:
+            response = self.client.post(self.url, self.credentials, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(check.call_count, 1)
+
+    def test_wrong_password_rejected(self):
+        """Тест: неверный пароль возвращает 401"""
+        response = self.client.post(self.url, {'email': 'user@test.com', 'password': 'wrong'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    @override_settings(LAST_LOGIN_UPDATE={'MODE': 'batched', 'BATCH_SIZE': 100})
+    def test_batched_last_login(self):
+        """Тест: в режиме batched last_login записывается при сбросе буфера"""
+        with self.assertNumQueries(1):
+            self.client.post(self.url, self.credentials, format='json')
+
+        self.user.refresh_from_db()
+        self.assertIsNone(self.user.last_login)
+
+        self.assertEqual(buffer.flush(), 1)
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+    @override_settings(LAST_LOGIN_UPDATE={'MODE': 'batched', 'BATCH_SIZE': 100})
+    def test_batched_last_login_flushed_on_worker_exit(self):
+        """Тест: накопленные last_login записываются при выходе worker gunicorn"""
+        from TheQutt import gunicorn_conf
+
+        self.client.post(self.url, self.credentials, format='json')
+        with mock.patch('django.db.connections.close_all') as close_all:
+            gunicorn_conf.worker_exit(mock.Mock(), mock.Mock())
+        close_all.assert_called_once()
+
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+        self.assertEqual(len(buffer), 0)
+
+    def test_timer_flush_closes_connection(self):
+        """Тест: сброс по таймеру закрывает соединение своего потока"""
+        with mock.patch('users.last_login.connections') as connections:
+            buffer._flush_in_timer()
+        connections.close_all.assert_called_once()
+
+    @override_settings(LAST_LOGIN_UPDATE={'MODE': 'immediate'})
+    def test_immediate_last_login(self):
+        """Тест: в режиме immediate last_login записывается сразу"""
+        self.client.post(self.url, self.credentials, format='json')
+
+        self.user.refresh_from_db()
+        self.assertIsNotNone(self.user.last_login)
+
+
+class RefreshTokenRevocationTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        User.objects.create_user(
+            email='user@test.com',
+            password='testpass123',
+            first_name='Regular',
+            last_name='User'
+        )
+        self.client = APIClient()
+        response = self.client.post(
+            reverse('token_obtain_pair'),
+            {'email': 'user@test.com', 'password': 'testpass123'},
+            format='json'
+        )
+        self.refresh = response.data['refresh']
+        revocation_store.rebuild()
+
+    def test_rotated_refresh_token_is_revoked(self):
+        """Тест: после ротации старый refresh-токен больше не принимается"""
+        url = reverse('token_refresh')
+        response = self.client.post(url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        rotated = response.data['refresh']
+
+        response = self.client.post(url, {'refresh': self.refresh}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        response = self.client.post(url, {'refresh': rotated}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_not_revoked_check_without_queries(self):
+        """Тест: проверка неотозванного токена не обращается к БД"""
+        with self.assertNumQueries(0):
+            self.assertFalse(revocation_store.is_revoked('unknown-jti'))
+
+    def force_sync(self):
+        revocation_store._synced_at = 0.0
+
+    def test_late_commit_within_grace(self):
+        """Тест: отзыв с меньшим id, ставший виден после синхронизации, подтягивается следующей"""
+        expires_at = timezone.now() + timedelta(days=1)
+        RevokedToken.objects.create(id=1000, jti='later', expires_at=expires_at)
+        self.force_sync()
+        self.assertTrue(revocation_store.is_revoked('later'))
+
+        RevokedToken.objects.create(id=500, jti='earlier', expires_at=expires_at)
+        self.force_sync()
+        self.assertTrue(revocation_store.is_revoked('earlier'))
+
+    def test_exact_check_while_refreshing(self):
+        """Тест: пока фильтр обновляет другой поток, отзыв из другого воркера проверяется в БД"""
+        RevokedToken.objects.create(jti='other-worker', expires_at=timezone.now() + timedelta(days=1))
+        self.force_sync()
+        with revocation_store._refresh_lock:
+            self.assertTrue(revocation_store.is_revoked('other-worker'))
+            with self.assertNumQueries(1):
+                self.assertFalse(revocation_store.is_revoked('unknown-jti'))
+
+    def test_purge_expired(self):
+        """Тест: purge_revoked_tokens удаляет только истекшие записи"""
+        now = timezone.now()
+        RevokedToken.objects.create(jti='expired', expires_at=now - timedelta(days=1))
+        RevokedToken.objects.create(jti='active', expires_at=now + timedelta(days=1))
+
+        call_command('purge_revoked_tokens', stdout=StringIO())
+
+        self.assertEqual(list(RevokedToken.objects.values_list('jti', flat=True)), ['active'])
+
+
+class BloomFilterTest(SimpleTestCase):
+    def test_no_false_negatives(self):
+        """Тест: все добавленные ключи находятся в фильтре"""
+        bloom = BloomFilter(1000, 0.01)
+        keys = [f'jti-{i}' for i in range(1000)]
+        for key in keys:
+            bloom.add(key)
+
+        self.assertTrue(all(key in bloom for key in keys))
+        false_positives = sum(f'other-{i}' in bloom for i in range(1000))
+        self.assertLess(false_positives, 50)
+
+
+@override_settings(REST_FRAMEWORK={'DEFAULT_THROTTLE_RATES': {'login': '2/min', 'register': '2/min'}})
+class TokenBucketThrottleTest(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def test_login_throttled_before_authentication(self):
+        """Тест: после исчерпания ведра вход отклоняется с 429 без обращения к БД"""
+        url = reverse('token_obtain_pair')
+        credentials = {'email': 'nobody@test.com', 'password': 'wrong'}
+        for _ in range(2):
+            response = self.client.post(url, credentials, format='json')
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        with self.assertNumQueries(0):
+            response = self.client.post(url, credentials, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertTrue(0 < int(response['Retry-After']) <= 30)
+
+    def test_buckets_are_per_endpoint(self):
+        """Тест: у регистрации и входа отдельные ведра"""
+        for _ in range(2):
+            self.client.post(reverse('token_obtain_pair'), {}, format='json')
+
+        response = self.client.post(reverse('register'), {}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class UsersQueryBudgetTest(QueryBudgetMixin, APITestCase):
+    urls_module = 'users.urls'
+    budgets = {
+        'register': 3,
+        'token_obtain_pair': 1,
+        'token_refresh': 5,
+        'profile': 0,
+    }
+
+    def setUp(self):
+        super().setUp()
+        # Иначе last_login из буфера запишется при выходе уже в рабочую базу
+        self.addCleanup(buffer.flush)
+
+    def request_register(self):
+        email = f'new{User.objects.count()}@test.com'
+        return self.client.post(reverse('register'), {
+            'email': email, 'password': PASSWORD, 'password2': PASSWORD, 'first_name': 'New', 'last_name': 'User'
+        }, format='json')
+
+    def request_token_obtain_pair(self):
+        return self.client.post(
+            reverse('token_obtain_pair'), {'email': self.data.customer.email, 'password': PASSWORD}, format='json'
+        )
+
+    def request_token_refresh(self):
+        refresh = RevocableRefreshToken.for_user(self.data.customer)
+        return self.client.post(reverse('token_refresh'), {'refresh': str(refresh)}, format='json')
+
+    def request_profile(self):
+        self.client.force_authenticate(user=self.data.customer)
+        return self.client.get(reverse('profile'))
@@ -0,0 +1,39 @@
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+from rest_framework_simplejwt.utils import datetime_from_epoch
+
+from .revocation import revocation_store
+
+
+class RevocableRefreshToken(RefreshToken):
+    """
+    Refresh-токен, который проверяется и отзывается через revocation_store
+    """
+
+    def verify(self):
+        super().verify()
+
+        if revocation_store.is_revoked(self[api_settings.JTI_CLAIM]):
+            raise TokenError(_('Token is blacklisted'))
+
+    def blacklist(self):
+        if not revocation_store.revoke(self[api_settings.JTI_CLAIM], datetime_from_epoch(self['exp'])):
+            raise TokenError(_('Token is blacklisted'))
+
+
+def token_user_id(request):
+    """
+    id пользователя из access-токена запроса: только проверка подписи, без запроса к БД
+    """
+    auth = JWTAuthentication()
+    header = auth.get_header(request)
+    raw_token = auth.get_raw_token(header) if header else None
+    if not raw_token:
+        return None
+    try:
+        return auth.get_validated_token(raw_token)[api_settings.USER_ID_CLAIM]
+    except (InvalidToken, TokenError, KeyError):
+        return None